@@ -1,69 +1,341 @@
+import abc
 import google.generativeai as genai
 import json
+import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-def classify_transactions_gemini(descriptions, categories, api_key):
+import pandas as pd
+
+import ml_patterns
+import utils
+from llm_cache import LLMCache
+from rate_limiter import TokenBucket, split_quota
+
+# Modelo Flash é rápido e barato (ou free tier)
+# Tentando versão Lite para evitar Rate Limit e 404
+GEMINI_MODELS = ('gemini-2.0-flash-lite-001', 'gemini-flash-latest')
+
+# Lotes: cada prompt leva no máximo ~CHUNK_TOKEN_BUDGET tokens de descrições
+# (a resposta repete as descrições, então o orçamento vale para as duas pontas)
+CHUNK_TOKEN_BUDGET = int(os.environ.get("AI_CHUNK_TOKENS", "2000"))
+MAX_CHUNK_ITEMS = 150
+AI_MAX_WORKERS = int(os.environ.get("AI_MAX_WORKERS", "4"))
+AI_REQUESTS_PER_MINUTE = int(os.environ.get("AI_REQUESTS_PER_MINUTE", "15"))
+MAX_RETRIES = 4
+RETRY_INITIAL_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+
+# Cota de requisições da API (compartilhada por todas as threads do processo).
+# O limite por minuto do Gemini é rígido e sem margem: a rajada sai da reposição
+_ai_rate, _ai_burst = split_quota(AI_REQUESTS_PER_MINUTE, strict=True)
+_gemini_limiter = TokenBucket(_ai_rate, per=60.0, capacity=_ai_burst)
+
+# Cache persistente das respostas (AI_CACHE=0 desliga)
+AI_CACHE_ENABLED = os.environ.get("AI_CACHE", "1") != "0"
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+# genai.configure é global: configura uma vez por chave e reaproveita o modelo
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _get_model(api_key):
+    """GenerativeModel cacheado por chave de API."""
+    with _models_lock:
+        model = _models.get(api_key)
+        if model is None:
+            genai.configure(api_key=api_key)
+            try:
+                model = genai.GenerativeModel(GEMINI_MODELS[0])
+            except Exception:
+                model = genai.GenerativeModel(GEMINI_MODELS[1])
+            _models.clear()
+            _models[api_key] = model
+        return model
+
+
+def get_llm_cache():
+    """Cache de respostas do processo (criado na primeira chamada), ou None se desligado."""
+    global _llm_cache
+    if not AI_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            try:
+                _llm_cache = LLMCache()
+            except Exception as e:
+                print(f"Aviso: cache da IA indisponível ({e}).")
+                return None
+        return _llm_cache
+
+
+def get_cache_stats():
+    """Acertos/erros do cache da IA neste processo (None se desligado)."""
+    cache = get_llm_cache()
+    return cache.stats() if cache is not None else None
+
+
+def normalize_description(description):
+    """Chave de comparação: espaços colapsados e minúsculas ("UBER  *Trip" == "uber *trip")."""
+    return " ".join(str(description).split()).lower()
+
+
+def estimate_tokens(text):
+    """Estimativa barata de tokens (~4 caracteres por token), sem chamar a API."""
+    return len(text) // 4 + 1
+
+
+def chunk_descriptions(descriptions, token_budget=CHUNK_TOKEN_BUDGET, max_items=MAX_CHUNK_ITEMS):
     """
-    Classifica uma lista de descrições usando o Google Gemini.
-    Retorna um dicionário {descrição: categoria}.
+    Divide as descrições em lotes de até `token_budget` tokens estimados
+    (cada item conta como sua string JSON) e até `max_items` itens.
+    Uma descrição maior que o orçamento vai sozinha no seu lote.
     """
-    if not api_key:
-        return {}
-    
-    genai.configure(api_key=api_key)
-    
-    
-    # Modelo Flash é rápido e barato (ou free tier)
-    # Tentando versão Lite para evitar Rate Limit e 404
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-lite-001')
-    except:
-        model = genai.GenerativeModel('gemini-flash-latest')
-    
-    
+    chunks, current, used = [], [], 0
+    for description in descriptions:
+        cost = estimate_tokens(json.dumps(description, ensure_ascii=False)) + 1
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            chunks.append(current)
+            current, used = [], 0
+        current.append(description)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _build_prompt(descriptions, categories):
     # Prompt Otimizado com Contexto
-    prompt = f"""
-    Você é um assistente financeiro pessoal inteligente. 
+    return f"""
+    Você é um assistente financeiro pessoal inteligente.
     Seu objetivo é classificar transações financeiras com base no nome do estabelecimento ou descrição.
-    
+
     Categorias Oficiais: {', '.join(categories)}
-    
+
     Regras de Ouro:
     1. "Nowpark", "Estapar", "Sem Parar", "Park", "Estacionamento" devem ir para Transporte (Combustível/Estacionamento/Manutenção).
     2. Uber, 99, Táxi vão para Transporte (Uber/99).
     3. Ifood, Restaurantes, Bares vão para Lazer/Restaurantes.
     4. Farmácias vão para Saúde/Farmácia.
     5. Supermercados, Sacolão vão para Alimentação (Mercado/Sacolão).
-    
+
     Se não souber ou for ambíguo, use "Outros".
     Responda APENAS com um objeto JSON válido (sem markdown, sem ```json) onde a chave é a descrição exata e o valor é a categoria escolhida.
-    
+
     Transações para classificar:
     {json.dumps(descriptions, ensure_ascii=False)}
     """
-    
-    # Tentativa com Retry Simples para evitar 429 (Rate Limit)
-    max_retries = 3
-    for attempt in range(max_retries):
+
+
+def _parse_response(text):
+    """Resposta do modelo -> dict (remove cercas de markdown ```json ... ```)."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:-3].strip()
+    elif text.startswith("```"):
+        text = text[3:-3].strip()
+    return json.loads(text)
+
+
+def _is_rate_limit(error):
+    return "429" in str(error) or "ResourceExhausted" in type(error).__name__
+
+
+# ============================================================
+# BACKENDS DE CLASSIFICAÇÃO
+# ============================================================
+# Um backend classifica UM lote: classify_chunk(descrições, categorias) ->
+# {descrição: categoria}. Limite de taxa = exceção com "429" na mensagem.
+# Deduplicação, cache, lotes, paralelismo e retry ficam em classify_transactions
+# e valem para qualquer backend.
+
+class ClassifierBackend(abc.ABC):
+    """Interface dos backends de classificação."""
+
+    name = "base"
+    # Respostas em cache são separadas por namespace ("" = respostas reais)
+    cache_namespace = ""
+
+    @abc.abstractmethod
+    def classify_chunk(self, descriptions, categories):
+        """Classifica um lote: {descrição: categoria}. 429 = exceção com "429" na mensagem."""
+
+
+class GeminiBackend(ClassifierBackend):
+    """Google Gemini (um prompt por lote)."""
+
+    name = "gemini"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def classify_chunk(self, descriptions, categories):
+        response = _get_model(self.api_key).generate_content(_build_prompt(descriptions, categories))
+        return _parse_response(response.text)
+
+
+class RateLimitError(Exception):
+    """429 simulado pelo LocalBackend (mesma mensagem que o retry reconhece)."""
+
+
+class LocalBackend(ClassifierBackend):
+    """
+    Substituto offline do Gemini: responde com as regras fixas (`rules`,
+    padrão utils.categorize_series) e, se houver, os padrões aprendidos
+    (ml_patterns.suggest_batch). Para medir lotes/cache/retry sem rede:
+    - latency / jitter: segundos de espera por lote (jitter sorteado)
+    - rate_limit_rate / failure_rate: fração de lotes que falham com 429 ou
+      com outro erro
+    Os sorteios vêm de um random.Random(seed): mesma sequência a cada execução.
+    """
+
+    name = "local"
+    cache_namespace = "local"
+
+    def __init__(self, learned_patterns=None, latency=0.0, jitter=0.0,
+                 rate_limit_rate=0.0, failure_rate=0.0, seed=0, rules=None):
+        self.learned_patterns = learned_patterns
+        self.rules = rules or utils.categorize_series
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def classify_chunk(self, descriptions, categories):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+            outcome = ("429" if roll < self.rate_limit_rate
+                       else "erro" if roll < self.rate_limit_rate + self.failure_rate else None)
+            if outcome == "429":
+                self.rate_limited += 1
+            elif outcome == "erro":
+                self.failures += 1
+        time.sleep(delay)
+        if outcome == "429":
+            raise RateLimitError("429 Resource has been exhausted (simulado)")
+        if outcome == "erro":
+            raise RuntimeError("Falha simulada do backend local")
+
+        titles = pd.Series(descriptions, dtype=object)
+        suggested = self.rules(titles)
+        if self.learned_patterns:
+            learned = ml_patterns.suggest_from_learned_frame(titles, None, self.learned_patterns)["category"]
+            suggested = suggested.where(suggested != utils.DEFAULT_CATEGORY, learned.fillna(utils.DEFAULT_CATEGORY))
+        allowed = set(categories)
+        return {d: (c if c in allowed else "Outros") for d, c in zip(descriptions, suggested)}
+
+
+AI_BACKEND = os.environ.get("AI_BACKEND", "gemini")
+
+
+def get_backend(api_key=None):
+    """
+    Backend configurado em AI_BACKEND: "gemini" (padrão) ou "local" (offline,
+    com AI_LOCAL_LATENCY_MS, AI_LOCAL_429_RATE, AI_LOCAL_FAILURE_RATE e
+    AI_LOCAL_SEED para simular a API).
+    """
+    if AI_BACKEND == "local":
+        return LocalBackend(
+            latency=float(os.environ.get("AI_LOCAL_LATENCY_MS", "0")) / 1000,
+            rate_limit_rate=float(os.environ.get("AI_LOCAL_429_RATE", "0")),
+            failure_rate=float(os.environ.get("AI_LOCAL_FAILURE_RATE", "0")),
+            seed=int(os.environ.get("AI_LOCAL_SEED", "0")),
+        )
+    return GeminiBackend(api_key)
+
+
+def _classify_chunk(backend, chunk, categories, limiter):
+    """
+    Classifica um lote. Em 429 espera com backoff exponencial + jitter (só
+    esta thread dorme; os outros lotes continuam). Outros erros: lote vazio.
+    """
+    delay = RETRY_INITIAL_DELAY
+    for attempt in range(MAX_RETRIES):
+        limiter.acquire()
         try:
-            response = model.generate_content(prompt)
-            # Limpar markdown do JSON se houver (```json ... ```)
-            text_response = response.text.strip()
-            if text_response.startswith("```json"):
-                text_response = text_response[7:-3].strip()
-            elif text_response.startswith("```"):
-                text_response = text_response[3:-3].strip()
-                
-            result = json.loads(text_response)
-            return result
+            result = backend.classify_chunk(chunk, categories)
+            return {d: result[d] for d in chunk if d in result}
         except Exception as e:
-            if "429" in str(e):
-                # Rate Limit - Esperar exponencialmente
-                wait_time = (2 ** attempt) + 1
-                if attempt < max_retries - 1:
-                    time.sleep(wait_time)
-                    continue
-            print(f"Erro na IA: {e}")
+            if _is_rate_limit(e) and attempt < MAX_RETRIES - 1:
+                time.sleep(min(delay, RETRY_MAX_DELAY) * random.uniform(0.5, 1.0))
+                delay *= 2
+                continue
+            print(f"Erro na IA ({len(chunk)} descrições): {e}")
             return {}
-            
     return {}
+
+
+def classify_transactions_gemini(descriptions, categories, api_key, max_workers=None, limiter=None, cache=None):
+    """
+    Classifica uma lista de descrições usando o Google Gemini (ou o backend
+    de AI_BACKEND). Retorna um dicionário {descrição: categoria}.
+    Veja classify_transactions.
+    """
+    backend = get_backend(api_key)
+    if isinstance(backend, GeminiBackend) and not api_key:
+        return {}
+    return classify_transactions(descriptions, categories, backend,
+                                 max_workers=max_workers, limiter=limiter, cache=cache)
+
+
+def classify_transactions(descriptions, categories, backend, max_workers=None, limiter=None, cache=None):
+    """
+    Classifica uma lista de descrições com o `backend` (ClassifierBackend).
+    Retorna um dicionário {descrição: categoria}.
+
+    Descrições repetidas (mesma chave normalize_description) vão uma vez só,
+    e as que já estão no cache de respostas (`cache`, padrão: get_llm_cache;
+    False desliga)
+    nem chegam à API. O restante é dividido em lotes por orçamento de tokens
+    (chunk_descriptions) enviados em paralelo (até `max_workers`),
+    respeitando o limite de requisições por minuto (`limiter`, padrão:
+    AI_REQUESTS_PER_MINUTE). Lotes que falharem ficam de fora do resultado
+    (e do cache). O cache é separado por backend (cache_namespace).
+    """
+    # Uma descrição representante por chave normalizada
+    representatives = {}
+    for description in descriptions:
+        if description and str(description).strip():
+            representatives.setdefault(normalize_description(description), str(description))
+    if not representatives:
+        return {}
+
+    if cache is None:
+        cache = get_llm_cache()
+    elif cache is False:
+        cache = None
+    by_key = cache.get_many(representatives, categories, namespace=backend.cache_namespace) if cache is not None else {}
+    pending = [d for key, d in representatives.items() if key not in by_key]
+
+    if pending:
+        limiter = limiter or _gemini_limiter
+        chunks = chunk_descriptions(pending)
+        workers = max(1, min(max_workers or AI_MAX_WORKERS, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ai-{backend.name}") as pool:
+            partials = list(pool.map(lambda chunk: _classify_chunk(backend, chunk, categories, limiter), chunks))
+
+        answered = {}
+        for partial in partials:
+            for description, category in partial.items():
+                answered[normalize_description(description)] = category
+        if cache is not None:
+            cache.put_many(answered, categories, namespace=backend.cache_namespace)
+        by_key.update(answered)
+
+    # Devolve para todas as variações da mesma descrição
+    return {
+        str(d): by_key[normalize_description(d)]
+        for d in descriptions
+        if d and str(d).strip() and normalize_description(d) in by_key
+    }
@@ -141,22 +141,18 @@ with col_privacy:
     if st.button(eye_icon, key="privacy_toggle", help="Ocultar/Exibir Valores", on_click=toggle_privacy):
         pass # Ação feita no on_click (rerun automático)
 
-# Carregar Dados
-if 'df' not in st.session_state:
-    st.session_state.df = utils.load_data()
+# Carregar Dados, Receitas (Global) e Configurações em paralelo no início da sessão
+if any(key not in st.session_state for key in ('df', 'income_df', 'settings')):
+    startup = utils.load_startup_bundle()
+    if 'df' not in st.session_state:
+        st.session_state.df = startup.df
+    if 'income_df' not in st.session_state:
+        st.session_state.income_df = startup.income_df
+    if 'settings' not in st.session_state:
+        st.session_state.settings = startup.settings
 
 df = st.session_state.df
-
-# Carregar Dados de Receitas (Global)
-if 'income_df' not in st.session_state:
-    st.session_state.income_df = utils.load_income_data()
-
 income_df = st.session_state.income_df
-
-# Carregar Configurações
-if 'settings' not in st.session_state:
-    st.session_state.settings = utils.load_settings()
-
 settings = st.session_state.settings
 
 if st.session_state.get("just_refreshed"):
@@ -166,27 +162,34 @@ if st.session_state.get("just_refreshed"):
 # --- SIDEBAR: CONFIGURAÇÕES ---
 with st.sidebar:
     if st.button("🔄 Atualizar Dados"):
-        st.session_state.df = utils.load_data()
-        st.session_state.income_df = utils.load_income_data()
-        st.session_state.settings = utils.load_settings()
+        startup = utils.load_startup_bundle()
+        st.session_state.df = startup.df
+        st.session_state.income_df = startup.income_df
+        st.session_state.settings = startup.settings
         
         # Regenerar dados líquidos
         try:
-            rec_liq = utils.compute_receitas_liquidas(
-                st.session_state.income_df, st.session_state.df, st.session_state.settings
+            utils.refresh_liquidas(
+                st.session_state.df, st.session_state.income_df, st.session_state.settings, full=True
             )
-            utils.save_receitas_liquidas(rec_liq)
-            
-            trans_liq = utils.compute_transacoes_liquidas(
-                st.session_state.df, st.session_state.settings
-            )
-            utils.save_transacoes_liquidas(trans_liq)
         except Exception as e:
             st.warning(f"⚠️ Erro ao gerar dados líquidos: {e}")
         
         st.session_state.just_refreshed = True
         st.rerun()
 
+    # Status da fila de gravação em segundo plano
+    write_status = gsheets.get_write_status()
+    if write_status["failed"]:
+        st.caption(f"❌ Não foi possível salvar em: {', '.join(write_status['failed'])} "
+                   "(cópia guardada em .cache/journal/failed)")
+    elif write_status["last_error"] and write_status["pending"]:
+        st.caption(f"⚠️ {write_status['pending']} gravação(ões) pendente(s), tentando novamente...")
+    elif write_status["pending"]:
+        st.caption(f"⏳ Salvando {write_status['pending']} alteração(ões) no Google Sheets...")
+    elif write_status["flushed"]:
+        st.caption("✅ Tudo salvo no Google Sheets")
+
     # Filtro de Pessoa (Global para TODAS as abas)
     # Movido para cima para afetar a exibição dos totais
     owner_filter = st.selectbox("Filtrar por Pessoa", ["Todos", "Pamela", "Renato", "Família"], key="global_owner_filter")
@@ -952,17 +955,11 @@ with tab2:
                     current_income_full = st.session_state.get('income_df', utils.load_income_data())
                     current_trans_full = st.session_state.df
                     
-                    # Receitas líquidas (sem resgates + rendimento sintético)
-                    rec_liq = utils.compute_receitas_liquidas(
-                        current_income_full, current_trans_full, st.session_state.settings
-                    )
-                    utils.save_receitas_liquidas(rec_liq)
-                    
-                    # Transações líquidas (sem aplicações/metas)
-                    trans_liq = utils.compute_transacoes_liquidas(
-                        current_trans_full, st.session_state.settings
+                    # Receitas líquidas (sem resgates + rendimento sintético) e
+                    # transações líquidas (sem aplicações/metas), só nos meses importados
+                    utils.refresh_liquidas(
+                        current_trans_full, current_income_full, st.session_state.settings
                     )
-                    utils.save_transacoes_liquidas(trans_liq)
                     
                     st.info("📊 Dados líquidos atualizados com sucesso!")
                 except Exception as e:
@@ -1029,14 +1026,17 @@ with tab3:
         col_wiz1, col_wiz2 = st.columns(2)
         with col_wiz1:
              wiz_target = st.multiselect("Escopo da Busca:", ["Vazias", "Outros/Geral", "Todas as Categorias"], default=["Vazias"])
+        with col_wiz2:
+             wiz_engine_label = st.radio("Motor de Aprendizado:", ["Padrões (palavra -> categoria)", "Naive Bayes (TF-IDF)"], horizontal=True)
+             wiz_engine = ml_patterns.ENGINE_NAIVE_BAYES if wiz_engine_label.startswith("Naive") else ml_patterns.ENGINE_PATTERNS
         
         # Carregar histórico de aprendizado (Cache resource para não ler toda hora)
         # Carregar histórico de aprendizado
         # Usando utils para evitar erro de escopo no cache do streamlit
         ml_history_df = utils.load_ml_history_cached()
 
-        # Treinar modelo com histórico + dados atuais
-        learned_patterns = ml_patterns.learn_patterns_from_data(df, ml_history_df)
+        # Modelo com histórico + dados atuais (só retreina se algum dos dois mudou)
+        learned_patterns = ml_patterns.get_learned_patterns(df, ml_history_df, engine=wiz_engine)
         
         # Identificar transações sem categoria ("Outros" ou vazias)
         uncategorized = df[df['category'].isin(['Outros', '', None])].copy()
@@ -1046,56 +1046,42 @@ with tab3:
             
             if st.button("🔍 Buscar Sugestões"):
                 # Aprende com dados históricos
-                learned_patterns = ml_patterns.learn_patterns_from_data(df, ml_history_df)
+                learned_patterns = ml_patterns.get_learned_patterns(df, ml_history_df, engine=wiz_engine)
                 
-                wiz_suggestions = []
-                for idx, row in df.iterrows():
-                    # Normalizar categoria atual para verificação
-                    current_cat = str(row['category']).strip()
-                    if current_cat.lower() in ['nan', 'none']: 
-                        current_cat = ""
-
-                    # Identificar tipo
-                    is_empty = (current_cat == "")
-                    is_others = (current_cat in ['Outros', 'Geral'])
-                    
-                    # Filtro de Inclusão
-                    include = False
-                    if "Todas as Categorias" in wiz_target: include = True
-                    if "Vazias" in wiz_target and is_empty: include = True
-                    if "Outros/Geral" in wiz_target and is_others: include = True
-                    
-                    if not include: continue
-
-                    # 1. Tenta regras fixas primeiro
-                    suggested = utils.categorize_transaction(row['title'])
-                    
-                    # 2. Se regras não deram resultado, usa aprendizado
-                    if not suggested or suggested == 'Outros':
-                        suggested = ml_patterns.suggest_category_from_learned(
-                            title=row['title'], 
-                            learned_patterns=learned_patterns,
-                            amount=row['amount']
-                        )
-                    
-                    # MUDANÇA: Mostra TODAS as transações do escopo, mesmo sem sugestão
-                    # Se não conseguiu sugerir, deixa vazio para edição manual
-                    if not suggested or suggested == row['category']:
-                        suggested = ""  # Vazio = usuário pode escolher manualmente
-                    
-                    wiz_suggestions.append({
-                        "id": row['id'],
-                        "Data": row['date'],
-                        "Descrição": row['title'],
-                        "Valor": row['amount'],
-                        "Pessoa": row.get('owner', 'Família'),  # NOVO: Mostrar pessoa
-                        "Categoria Atual": row['category'],
-                        "Nova Categoria": suggested,
-                        "Aplicar?": True if suggested else False
-                    })
+                # Normalizar categoria atual para verificação
+                current_cat = df['category'].astype(str).str.strip()
+                current_cat = current_cat.mask(current_cat.str.lower().isin(['nan', 'none']), "")
+
+                # Filtro de Inclusão
+                include = pd.Series("Todas as Categorias" in wiz_target, index=df.index)
+                if "Vazias" in wiz_target:
+                    include |= current_cat == ""
+                if "Outros/Geral" in wiz_target:
+                    include |= current_cat.isin(['Outros', 'Geral'])
+                scope = df[include]
+
+                # Regras fixas primeiro; se não resolverem, valor exato e palavras aprendidas
+                suggestions = utils.categorize_frame(scope, learned_patterns, k=3)
+                suggested = suggestions['suggested'].where(suggestions['source'] != "padrão", "")
+
+                # MUDANÇA: Mostra TODAS as transações do escopo, mesmo sem sugestão
+                # Se não conseguiu sugerir, deixa vazio para edição manual
+                suggested = suggested.where(suggested != scope['category'], "")
+
+                wiz_suggestions = pd.DataFrame({
+                    "id": scope['id'],
+                    "Data": scope['date'],
+                    "Descrição": scope['title'],
+                    "Valor": scope['amount'],
+                    "Pessoa": scope['owner'] if 'owner' in scope.columns else 'Família',  # NOVO: Mostrar pessoa
+                    "Categoria Atual": scope['category'],
+                    "Nova Categoria": suggested,
+                    "Outras Sugestões": suggestions['alternatives'],
+                    "Aplicar?": suggested != "",
+                }).reset_index(drop=True)
                 
-                if wiz_suggestions:
-                    df_wiz = pd.DataFrame(wiz_suggestions)
+                if not wiz_suggestions.empty:
+                    df_wiz = wiz_suggestions
                     
                     # CORREÇÃO DE ERRO PYARROW: Garantir tipos compatíveis
                     # Converter Data para datetime (coerce errors)
@@ -1107,15 +1093,15 @@ with tab3:
                         df_wiz['Valor'] = pd.to_numeric(df_wiz['Valor'], errors='coerce').fillna(0.0)
                     
                     # Converter Texto para string (evitar misturar None/float/str)
-                    text_cols = ['Descrição', 'Pessoa', 'Categoria Atual', 'Nova Categoria']
+                    text_cols = ['Descrição', 'Pessoa', 'Categoria Atual', 'Nova Categoria', 'Outras Sugestões']
                     for col in text_cols:
                         if col in df_wiz.columns:
                             df_wiz[col] = df_wiz[col].astype(str).replace('nan', '').replace('None', '')
 
                     st.session_state.wiz_suggestions = df_wiz
-                    auto_suggestions = len([s for s in wiz_suggestions if s["Nova Categoria"]])
+                    auto_suggestions = int(wiz_suggestions["Aplicar?"].sum())
                     st.success(f"Mostrando {len(wiz_suggestions)} transações ({auto_suggestions} com sugestão automática).")
-                    st.info(f"📚 Aprendi padrões de {len(learned_patterns)} palavras-chave do seu histórico.")
+                    st.info(f"📚 Aprendi padrões de {len(learned_patterns['words'])} palavras-chave do seu histórico.")
                 else:
                     st.info("Nenhuma transação encontrada no escopo selecionado.")
                     if 'wiz_suggestions' in st.session_state: 
@@ -1154,9 +1140,10 @@ with tab3:
                             required=False,
                             width="large"
                         ),
+                        "Outras Sugestões": st.column_config.TextColumn("Outras Sugestões", width="medium", help="Próximas categorias aprendidas, com a confiança"),
                         "Aplicar?": st.column_config.CheckboxColumn("Aplicar?", default=True, width="small")
                     },
-                    disabled=["Data", "Descrição", "Valor", "Pessoa", "Categoria Atual"],
+                    disabled=["Data", "Descrição", "Valor", "Pessoa", "Categoria Atual", "Outras Sugestões"],
                     hide_index=True,
                     use_container_width=False,
                     key="wizard_table"
@@ -1164,28 +1151,28 @@ with tab3:
                 
                 if st.button("✨ Aplicar Selecionados", key="wizard_apply_btn"):
                     count = 0
+                    # PERSISTÊNCIA ML: acumula os aprendizados e envia em um único append
+                    feedback = gsheets.ClassificationBuffer()
                     for index, row in edited_wiz.iterrows():
                         if row["Aplicar?"] and row["Nova Categoria"] and row["Nova Categoria"].strip():
                             # Atualiza somente se tiver uma categoria válida
                             mask = st.session_state.df['id'] == row['id']
                             st.session_state.df.loc[mask, 'category'] = row['Nova Categoria']
                             
-                            # PERSISTÊNCIA ML: Salvar o aprendizado na planilha
                             # Salvar descrição original e nova categoria
-                            # Dispara em background/thread se possível, mas aqui vamos sequencial para garantir
-                            try:
-                                gsheets.append_classification(
-                                    description=row['title'], 
-                                    category=row['Nova Categoria'],
-                                    amount=row['amount'],
-                                    date=row['date']
-                                )
-                                # st.toast(f"🧠 Aprendi: {row['title']} -> {row['Nova Categoria']}", icon="🤓")
-                            except Exception as e:
-                                print(f"Erro ao salvar aprendizado ML: {e}")
-                                
+                            feedback.add(
+                                description=row['Descrição'],
+                                category=row['Nova Categoria'],
+                                amount=row['Valor'],
+                                date=row['Data']
+                            )
                             count += 1
                     
+                    try:
+                        feedback.flush()
+                    except Exception as e:
+                        print(f"Erro ao salvar aprendizado ML: {e}")
+                    
                     if count > 0:
                         utils.save_data_and_refresh_liquidas(st.session_state.df, st.session_state.income_df, st.session_state.settings)
                         st.success(f"✅ {count} transações categorizadas e **salvas automaticamente**!")
@@ -1372,17 +1359,16 @@ with tab3:
                         if new_bulk_cat != "(Manter Atual)":
                             st.session_state.df.loc[mask, 'category'] = new_bulk_cat
                             
-                            # PERSISTÊNCIA ML
+                            # PERSISTÊNCIA ML (um único append para toda a seleção)
                             try:
-                                for _, row in selected_rows.iterrows():
-                                    title = row.get('title', '')
-                                    if title:
-                                         gsheets.append_classification(
-                                             description=title, 
-                                             category=new_bulk_cat,
-                                             amount=row.get('amount'),
-                                             date=row.get('date')
-                                         )
+                                with gsheets.ClassificationBuffer() as feedback:
+                                    for _, row in selected_rows.iterrows():
+                                        feedback.add(
+                                            description=row.get('title', ''),
+                                            category=new_bulk_cat,
+                                            amount=row.get('amount'),
+                                            date=row.get('date')
+                                        )
                             except:
                                 pass
                             
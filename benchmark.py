@@ -0,0 +1,487 @@
+"""
+Benchmark ponta a ponta com bases sintéticas de uma família.
+
+Gera bases de transações (1k, 10k, 100k, 1M linhas) com estabelecimentos
+realistas, donos, parcelas ("Parcela 3/5"), aplicações e resgates de RDB,
+e mede as etapas reais do app contra o Google Sheets falso (fake_gspread):
+
+- seed_write: escrita completa da base na planilha
+- read_sheet: leitura bruta (get_all_records)
+- load_data: leitura + normalização de dtypes (sem espelho local)
+- load_data_mirror: mesma leitura pelo espelho local (planilha não mudou)
+- process_uploaded_file: importação de uma fatura CSV (10% do tamanho da base)
+- merge_and_save: deduplicação + gravação incremental (até chegar à planilha)
+- compute_receitas_liquidas / compute_transacoes_liquidas
+- learn_patterns_from_data
+- dashboard: agregações da aba Dashboard (KPIs, categorias, top 5 locais, gasto diário)
+
+Resultado em JSON (um objeto por tamanho: segundos, chamadas à API e pico de
+memória por etapa) para acompanhar regressões entre versões. Tudo roda em um
+diretório temporário: espelhos, índices e caches reais do app não são tocados.
+
+Uso:
+    python benchmark.py                          # 1k, 10k e 100k
+    python benchmark.py --sizes 1000 1000000     # inclui 1M (pico de ~7 GB de RAM)
+    python benchmark.py --latency-ms 50 --output bench_results.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import fake_gspread
+import fingerprint_index
+import gsheets
+import local_mirror
+import ml_patterns
+import utils
+from rate_limiter import TokenBucket
+from write_behind import WriteBehindQueue
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_SIZES = SIZES[:3]
+OWNERS = ["Pamela", "Renato", "Família"]
+OWNER_WEIGHTS = [0.4, 0.4, 0.2]
+TRANSACTIONS_PER_MONTH = 300    # de uma família; bases maiores ficam mais densas
+MAX_MONTHS = 120
+START_DATE = pd.Timestamp("2016-01-01")
+META_CATEGORY = "Investimentos"
+
+# (título, categoria, valor típico, peso)
+MERCHANTS = [
+    ("Uber *Trip", "Transporte (Uber/99)", 28.0, 8),
+    ("99app *99pop", "Transporte (Uber/99)", 22.0, 4),
+    ("Posto Shell", "Transporte (Combustível/Estacionamento/Manutenção)", 180.0, 4),
+    ("Ipiranga Auto Posto", "Transporte (Combustível/Estacionamento/Manutenção)", 160.0, 3),
+    ("Estapar Estacionamento", "Transporte (Combustível/Estacionamento/Manutenção)", 25.0, 2),
+    ("Ifood *Ifood", "Lazer/Restaurantes", 65.0, 9),
+    ("Rappi *Restaurante", "Lazer/Restaurantes", 70.0, 3),
+    ("Outback Steakhouse", "Lazer/Restaurantes", 210.0, 1),
+    ("Padaria Real", "Lazer/Restaurantes", 18.0, 5),
+    ("Carrefour", "Alimentação (Mercado/Sacolão)", 320.0, 5),
+    ("Pao de Acucar", "Alimentação (Mercado/Sacolão)", 240.0, 5),
+    ("Sacolao Sao Jorge", "Alimentação (Mercado/Sacolão)", 75.0, 3),
+    ("Assai Atacadista", "Alimentação (Mercado/Sacolão)", 450.0, 2),
+    ("Pg *Drogasil", "Saúde/Farmácia", 85.0, 4),
+    ("Drogaria Sao Paulo", "Saúde/Farmácia", 60.0, 3),
+    ("Netflix.Com", "Assinaturas/Serviços", 55.9, 1),
+    ("Spotify", "Assinaturas/Serviços", 21.9, 1),
+    ("Dl*Google Youtube", "Assinaturas/Serviços", 24.9, 1),
+    ("Amazon Prime Canais", "Assinaturas/Serviços", 19.9, 1),
+    ("Smartfit", "Assinaturas/Serviços", 119.9, 1),
+    ("Mp *Mercadolivre", "Pessoal/Vestuário", 140.0, 4),
+    ("Zara Brasil", "Pessoal/Vestuário", 260.0, 2),
+    ("Renner", "Pessoal/Vestuário", 180.0, 2),
+    ("Petz", "Pets", 150.0, 2),
+    ("Cobasi", "Pets", 120.0, 2),
+    ("Udemy", "Educação/Cursos", 39.9, 1),
+    ("Leroy Merlin", "Manutenção Casa", 230.0, 1),
+    ("Telhanorte", "Manutenção Casa", 190.0, 1),
+    ("Enel Sp", "Moradia", 280.0, 1),
+    ("Sabesp", "Moradia", 120.0, 1),
+    ("Pagamento recebido", "Pagamento/Crédito", 2500.0, 1),
+]
+INSTALLMENT_MERCHANTS = [
+    ("Magazine Luiza", "Manutenção Casa", 1800.0),
+    ("Casas Bahia", "Manutenção Casa", 2400.0),
+    ("Fast Shop", "Pessoal/Vestuário", 3200.0),
+    ("Decolar.Com", "Lazer/Restaurantes", 4200.0),
+]
+SUFFIXES = ["", "", "", " Sao Paulo", " Centro", " Shopping", " Bh", " Paulista"]
+INSTALLMENT_SHARE = 0.05
+
+
+# ============================================================
+# GERAÇÃO DAS BASES SINTÉTICAS
+# ============================================================
+
+def _months(n):
+    return int(min(max(12, n // TRANSACTIONS_PER_MONTH), MAX_MONTHS))
+
+
+def _amounts(rng, typical, n):
+    """Valores em torno do típico (log-normal), em centavos exatos."""
+    return np.round(typical * rng.lognormal(0.0, 0.35, n), 2)
+
+
+def generate_ledger(n, seed=42):
+    """
+    Base de transações com `n` linhas nas colunas do app (id, date,
+    reference_date, title, amount, category, owner). Inclui compras
+    parceladas e uma aplicação RDB por dono e mês.
+    """
+    rng = np.random.default_rng(seed)
+    months = _months(n)
+    n_aplic = min(months * len(OWNERS), n // 10)
+    n_install = int(n * INSTALLMENT_SHARE)
+    n_regular = n - n_aplic - n_install
+
+    # Compras do dia a dia
+    weights = np.array([m[3] for m in MERCHANTS], dtype=float)
+    pick = rng.choice(len(MERCHANTS), n_regular, p=weights / weights.sum())
+    suffix = rng.integers(0, len(SUFFIXES), n_regular)
+    titles = [MERCHANTS[m][0] + SUFFIXES[s] for m, s in zip(pick.tolist(), suffix.tolist())]
+    categories = [MERCHANTS[m][1] for m in pick.tolist()]
+    typical = np.array([m[2] for m in MERCHANTS])[pick]
+    amounts = np.round(typical * rng.lognormal(0.0, 0.35, n_regular), 2)
+
+    # Parcelas: "Loja - Parcela k/N" (valor da parcela)
+    inst = rng.integers(0, len(INSTALLMENT_MERCHANTS), n_install)
+    total = rng.integers(2, 13, n_install)
+    current = (rng.random(n_install) * total).astype(int) + 1
+    titles += [f"{INSTALLMENT_MERCHANTS[i][0]} - Parcela {c}/{t}"
+               for i, c, t in zip(inst.tolist(), current.tolist(), total.tolist())]
+    categories += [INSTALLMENT_MERCHANTS[i][1] for i in inst.tolist()]
+    amounts = np.concatenate([amounts, np.round(
+        np.array([m[2] for m in INSTALLMENT_MERCHANTS])[inst] / total * rng.lognormal(0.0, 0.1, n_install), 2)])
+
+    # Aplicações RDB (investimento: excluídas das líquidas e do dashboard)
+    titles += ["Aplicação RDB"] * n_aplic
+    categories += [META_CATEGORY] * n_aplic
+    amounts = np.concatenate([amounts, _amounts(rng, 1500.0, n_aplic)])
+
+    days = rng.integers(0, months * 30, n)
+    dates = START_DATE + pd.to_timedelta(days, unit="D")
+    owners = np.array(OWNERS)[rng.choice(len(OWNERS), n, p=OWNER_WEIGHTS)]
+    df = pd.DataFrame({
+        "id": [str(uuid.UUID(int=int(x), version=4)) for x in rng.integers(0, 2 ** 63, n)],
+        "date": dates.normalize(),
+        "reference_date": (dates + pd.offsets.MonthBegin(1)).normalize(),
+        "title": titles,
+        "amount": amounts,
+        "category": categories,
+        "owner": owners,
+    })
+    return df.sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def generate_income(transactions, seed=42):
+    """
+    Receitas dos mesmos meses: salários por dono, resgates de RDB (parte
+    do que foi aplicado) e estornos esporádicos.
+    """
+    rng = np.random.default_rng(seed + 1)
+    periods = pd.period_range(transactions["date"].min(), transactions["date"].max(), freq="M")
+    month_starts = periods.to_timestamp()
+    rows = []
+    for owner, salary in (("Pamela", 9500.0), ("Renato", 8700.0)):
+        rows.append(pd.DataFrame({
+            "date": month_starts + pd.Timedelta(days=4),
+            "source": f"Salário {owner}",
+            "amount": np.round(salary * rng.normal(1.0, 0.02, len(periods)), 2),
+            "type": "Fixa",
+            "recurrence": "Mensal",
+            "owner": owner,
+        }))
+    resgate_months = month_starts[rng.random(len(periods)) < 0.4]
+    rows.append(pd.DataFrame({
+        "date": resgate_months + pd.Timedelta(days=14),
+        "source": "Resgate RDB",
+        "amount": _amounts(rng, 1200.0, len(resgate_months)),
+        "type": "Extra",
+        "recurrence": "Única",
+        "owner": "Família",
+    }))
+    n_estornos = max(1, len(transactions) // 200)
+    sample = transactions.sample(n_estornos, random_state=seed)
+    rows.append(pd.DataFrame({
+        "date": sample["date"].to_numpy() + np.timedelta64(3, "D"),
+        "source": "Estorno " + sample["title"].str.split(" - ").str[0],
+        "amount": sample["amount"].to_numpy(),
+        "type": "Extra",
+        "recurrence": "Única",
+        "owner": sample["owner"].to_numpy(),
+    }))
+    income = pd.concat(rows, ignore_index=True)
+    income["reference_date"] = income["date"]
+    return income.sort_values("date", kind="stable").reset_index(drop=True)[
+        ["date", "reference_date", "source", "amount", "type", "recurrence", "owner"]]
+
+
+def generate_statement(transactions, n, owner="Pamela", seed=42):
+    """
+    Fatura CSV (formato Nubank: date,title,amount) com `n` linhas: metade já
+    importada antes (duplicatas do dono) e metade compras novas do último mês.
+    """
+    rng = np.random.default_rng(seed + 2)
+    own = transactions[transactions["owner"] == owner]
+    dup = own.sample(min(n // 2, len(own)), random_state=seed)
+    fresh = generate_ledger(n - len(dup), seed=seed + 3)
+    fresh = fresh[fresh["title"] != "Aplicação RDB"]
+    last = transactions["date"].max()
+    fresh_dates = last - pd.to_timedelta(rng.integers(0, 30, len(fresh)), unit="D")
+    statement = pd.DataFrame({
+        "date": pd.concat([dup["date"], pd.Series(fresh_dates)], ignore_index=True).dt.strftime("%Y-%m-%d"),
+        "title": pd.concat([dup["title"], fresh["title"]], ignore_index=True),
+        "amount": pd.concat([dup["amount"], fresh["amount"]], ignore_index=True),
+    })
+    buffer = io.BytesIO(statement.to_csv(index=False).encode("utf-8"))
+    buffer.name = f"Nubank_{last:%Y-%m-%d}.csv"
+    return buffer
+
+
+def generate_history(transactions, n, seed=42):
+    """Dataset de classificações (aba 'classificacao_categoria') a partir da base."""
+    sample = transactions.sample(min(n, len(transactions)), random_state=seed)
+    return pd.DataFrame({
+        "Descricao": sample["title"].to_numpy(),
+        "Categoria": sample["category"].to_numpy(),
+        "Data": sample["date"].dt.strftime("%Y-%m-%d").to_numpy(),
+        "Valor": sample["amount"].to_numpy(),
+    })
+
+
+def benchmark_settings():
+    """Configurações padrão + metas, com 'Investimentos' como categoria do tipo Meta."""
+    settings = dict(utils.DEFAULT_SETTINGS)
+    settings["budgets_df"] = pd.DataFrame([
+        {"Categoria": META_CATEGORY, "Valor": 2000.0, "Mes": 0, "Ano": 0, "Tipo": "Meta"},
+        {"Categoria": "Lazer/Restaurantes", "Valor": 600.0, "Mes": 0, "Ano": 0, "Tipo": "Orçamento"},
+    ])
+    return settings
+
+
+# ============================================================
+# AGREGAÇÕES DO DASHBOARD (mesmas da aba 📊 Dashboard do app.py)
+# ============================================================
+
+def dashboard_aggregations(df, settings, month, year, owner_filter="Todos", date_col="date"):
+    """KPIs, resumo por categoria, top 5 locais e gasto diário de um mês."""
+    if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        df = df.assign(**{date_col: pd.to_datetime(df[date_col], format="mixed", errors="coerce")})
+    mask = (df[date_col].dt.month == month) & (df[date_col].dt.year == year)
+    if owner_filter != "Todos":
+        mask = mask & (df["owner"] == owner_filter)
+    expenses_df = df[mask].copy()
+
+    categories_to_exclude = ["Pagamento/Crédito"] + utils.get_meta_categories(settings)
+    expenses_df["category"] = expenses_df["category"].astype(str).str.strip()
+    expenses_df = expenses_df[~expenses_df["category"].isin(categories_to_exclude)]
+    expenses_df = expenses_df[~expenses_df["title"].astype(str).str.contains("aplica", case=False, na=False)]
+    expenses_df = expenses_df[expenses_df["amount"] > 0]
+
+    total_gastos = expenses_df["amount"].sum()
+    category_summary = expenses_df.groupby("category").agg({"amount": ["sum", "count", "mean"]}).reset_index()
+    category_summary.columns = ["Categoria", "Total", "Qtd", "Média"]
+    category_summary["% do Total"] = (category_summary["Total"] / total_gastos * 100).round(1)
+    category_summary = category_summary.sort_values("Total", ascending=False)
+
+    clean_title = expenses_df["title"].str.replace(r"(Pg \*|Mp \*|Dl\*)", "", regex=True).str.strip()
+    clean_title = clean_title.apply(lambda x: x.split("-")[0].strip())
+    top5 = expenses_df["amount"].groupby(clean_title).sum().nlargest(5)
+
+    daily_spend = expenses_df.groupby(pd.to_datetime(expenses_df["date"], errors="coerce"))["amount"].sum()
+    return {
+        "total": float(total_gastos),
+        "count": int(expenses_df["title"].count()),
+        "top_category": category_summary["Categoria"].iloc[0] if not category_summary.empty else "-",
+        "categories": len(category_summary),
+        "top5": top5.index.tolist(),
+        "days": len(daily_spend),
+    }
+
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+
+@contextmanager
+def isolated_environment(latency=0.0, reads_per_minute=0, writes_per_minute=0, seed=42):
+    """
+    Google Sheets falso + diretório temporário para espelhos, índices e
+    modelos. Restaura variáveis de ambiente e caminhos ao sair.
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    env_keys = ("GSHEETS_BACKEND", "GSHEETS_RATE_LIMITER")
+    saved_env = {k: os.environ.get(k) for k in env_keys}
+    saved_paths = (local_mirror.MIRROR_DIR, fingerprint_index.INDEX_PATH, ml_patterns.MODEL_DIR)
+    saved_buckets = dict(gsheets._buckets)
+    saved_queue = gsheets._write_queue
+
+    os.environ["GSHEETS_BACKEND"] = "fake"
+    os.environ["GSHEETS_RATE_LIMITER"] = "local"
+    local_mirror.MIRROR_DIR = os.path.join(workdir, "sheets")
+    fingerprint_index.INDEX_PATH = os.path.join(workdir, "fingerprints.sqlite3")
+    ml_patterns.MODEL_DIR = os.path.join(workdir, "ml")
+    client = fake_gspread.FakeClient(latency=latency, reads_per_minute=reads_per_minute,
+                                     writes_per_minute=writes_per_minute, seed=seed)
+    fake_gspread._shared_client = client
+    gsheets.get_gspread_client.clear()
+    gsheets._invalidate_spreadsheet_cache()
+    gsheets._forget_sheet_state()
+    # O limite fica a cargo da cota simulada do fake (se houver)
+    # (baldes novos: reconfigurar os do app mudaria também os originais)
+    gsheets._buckets.update({kind: TokenBucket(1_000_000, per=60, capacity=1_000_000)
+                             for kind in gsheets._rate_limits})
+    # Fila de escrita própria: o journal do app (e o de outros processos) fica intocado
+    queue = WriteBehindQueue(gsheets.write_dataframe_to_sheet, journal_dir=os.path.join(workdir, "journal"),
+                             on_failure=gsheets._notify_write_failure)
+    with gsheets._write_queue_lock:
+        gsheets._write_queue = queue
+    try:
+        yield client
+    finally:
+        gsheets.flush_writes()
+        queue.close()
+        with gsheets._write_queue_lock:
+            gsheets._write_queue = saved_queue
+        gsheets._buckets.clear()
+        gsheets._buckets.update(saved_buckets)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        local_mirror.MIRROR_DIR, fingerprint_index.INDEX_PATH, ml_patterns.MODEL_DIR = saved_paths
+        fake_gspread._shared_client = None
+        gsheets.get_gspread_client.clear()
+        gsheets._invalidate_spreadsheet_cache()
+        gsheets._forget_sheet_state()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _peak_rss_mb():
+    """Pico de memória residente do processo até agora (MB)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timed(fn, repeat=1):
+    """Executa `fn` `repeat` vezes; retorna (último resultado, {median, min, runs})."""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return result, {"median": statistics.median(runs), "min": min(runs), "runs": len(runs)}
+
+
+def run_size(n, client, seed=42, repeat=1):
+    """Todas as etapas para uma base de `n` transações. Retorna o dicionário de resultados."""
+    stages = {}
+    ledger = generate_ledger(n, seed)
+    income = generate_income(ledger, seed)
+    settings = benchmark_settings()
+    statement = generate_statement(ledger, max(100, n // 10), seed=seed)
+    history = generate_history(ledger, max(100, n // 10), seed=seed)
+
+    def stage(name, fn, times=1):
+        client.reset_stats()
+        result, timing = _timed(fn, times)
+        timing["api_calls"] = client.stats["read"] + client.stats["write"]
+        timing["peak_rss_mb"] = _peak_rss_mb()
+        stages[name] = timing
+        return result
+
+    # Persistência: escrita completa, leitura bruta e leitura normalizada
+    stage("seed_write", lambda: (gsheets.write_dataframe_to_sheet(ledger, gsheets.BASE_FINANCEIRA_ID),
+                                 gsheets.write_dataframe_to_sheet(income, gsheets.RECEITAS_ID)))
+    stage("read_sheet", lambda: gsheets.read_sheet_as_dataframe(gsheets.BASE_FINANCEIRA_ID))
+
+    def cold_load():
+        local_mirror.invalidate(gsheets.BASE_FINANCEIRA_ID)
+        return utils.load_data()
+    df = stage("load_data", cold_load, repeat)
+    stage("load_data_mirror", utils.load_data, repeat)
+    income_df = utils.load_income_data()
+
+    # Importação de fatura
+    def process():
+        statement.seek(0)
+        return utils.process_uploaded_file(statement, owner="Pamela")
+    processed, error = stage("process_uploaded_file", process, repeat)
+    if error:
+        raise RuntimeError(error)
+
+    def merge():
+        merged = utils.merge_and_save(df.copy(), processed["expenses"])
+        gsheets.flush_writes()
+        return merged
+    (df_merged, duplicates) = stage("merge_and_save", merge)
+
+    # Cálculos
+    stage("compute_receitas_liquidas", lambda: utils.compute_receitas_liquidas(income_df, df_merged, settings), repeat)
+    stage("compute_transacoes_liquidas", lambda: utils.compute_transacoes_liquidas(df_merged, settings), repeat)
+    stage("learn_patterns_from_data", lambda: ml_patterns.learn_patterns_from_data(df_merged, history), repeat)
+
+    last = df["date"].max()
+    stage("dashboard", lambda: [dashboard_aggregations(df, settings, last.month, last.year, owner)
+                                for owner in ["Todos"] + OWNERS], repeat)
+
+    return {
+        "size": n,
+        "rows": {"transactions": len(ledger), "income": len(income), "statement": len(processed["expenses"]),
+                 "imported": len(df_merged) - len(df), "duplicates": int(duplicates)},
+        "stages": stages,
+        "total_seconds": sum(s["median"] for s in stages.values()),
+    }
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, seed=42, repeat=1, latency=0.0, reads_per_minute=0, writes_per_minute=0):
+    """Roda todos os tamanhos e retorna o relatório (serializável em JSON)."""
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+            "fake_latency_ms": latency * 1000,
+            "fake_reads_per_minute": reads_per_minute,
+            "fake_writes_per_minute": writes_per_minute,
+        },
+        "results": [],
+    }
+    for n in sizes:
+        with isolated_environment(latency, reads_per_minute, writes_per_minute, seed) as client:
+            result = run_size(n, client, seed=seed, repeat=repeat)
+        report["results"].append(result)
+        print(f"\n{n:>9,} transações ({result['total_seconds']:.2f}s)")
+        for name, timing in result["stages"].items():
+            print(f"  {name:<28} {timing['median'] * 1000:>10.1f} ms  ({timing['api_calls']} chamadas, "
+                  f"pico {timing['peak_rss_mb']:.0f} MB)")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta com bases sintéticas.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="tamanhos das bases (padrão: 1000 10000 100000)")
+    parser.add_argument("--repeat", type=int, default=1, help="repetições das etapas sem efeito colateral")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latência por chamada do Sheets falso")
+    parser.add_argument("--reads-per-minute", type=int, default=0, help="cota simulada de leituras (0 = sem cota)")
+    parser.add_argument("--writes-per-minute", type=int, default=0, help="cota simulada de escritas (0 = sem cota)")
+    parser.add_argument("--output", default="bench_results.json", help="arquivo JSON de saída ('-' = stdout)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.sizes, seed=args.seed, repeat=args.repeat, latency=args.latency_ms / 1000,
+                           reads_per_minute=args.reads_per_minute, writes_per_minute=args.writes_per_minute)
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(payload)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+        print(f"\nResultados em {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
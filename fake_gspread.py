@@ -0,0 +1,424 @@
+"""
+Google Sheets falso, em memória, para testes de carga e benchmarks offline.
+Implementa o subconjunto da API do gspread que o gsheets.py usa:
+- client: open_by_key, http_client.get_file_drive_metadata / values_batch_get
+- spreadsheet: get_worksheet, worksheet, add_worksheet, worksheets, batch_update
+  (deleteDimension / updateCells / appendCells)
+- worksheet: get_all_records, get_all_values, row_values, col_values, acell,
+  update_acell, update, clear, append_row, append_rows, id
+
+Cada chamada pode ter latência fixa (+ jitter com semente, para ser
+determinística) e passa por uma cota simulada de leituras/escritas por
+minuto: acima dela levanta gspread APIError 429, igual ao Google, para que o
+retry_on_quota e o rate limiter sejam exercitados de verdade.
+
+Ativado no app por GSHEETS_BACKEND=fake (ver gsheets.get_gspread_client).
+Variáveis: GSHEETS_FAKE_LATENCY_MS, GSHEETS_FAKE_JITTER_MS,
+GSHEETS_FAKE_READS_PER_MINUTE, GSHEETS_FAKE_WRITES_PER_MINUTE (0 = sem cota),
+GSHEETS_FAKE_SEED.
+"""
+import collections
+import datetime
+import os
+import random
+import threading
+import time
+
+import gspread
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol, numericise_all
+
+DEFAULT_SHEET_TITLE = "Página1"
+
+
+class _FakeResponse:
+    """Resposta HTTP mínima para construir um APIError como o do gspread."""
+
+    def __init__(self, status_code, message, status):
+        self.status_code = status_code
+        self.text = message
+        self._error = {"code": status_code, "message": message, "status": status}
+
+    def json(self):
+        return {"error": self._error}
+
+
+def _api_error(status_code, message, status):
+    return APIError(_FakeResponse(status_code, message, status))
+
+
+def _cell_str(value):
+    """Valor gravado com RAW: tudo vira texto (None -> vazio)."""
+    return "" if value is None else str(value)
+
+
+def _trim(row):
+    """Remove as células vazias do fim da linha (a API não as devolve)."""
+    end = len(row)
+    while end and row[end - 1] == "":
+        end -= 1
+    return row[:end]
+
+
+class FakeQuota:
+    """Cota por minuto (janela deslizante), separada para leituras e escritas."""
+
+    def __init__(self, reads_per_minute=0, writes_per_minute=0, window=60.0):
+        self.limits = {"read": reads_per_minute, "write": writes_per_minute}
+        self.window = window
+        self._calls = {"read": collections.deque(), "write": collections.deque()}
+        self._lock = threading.Lock()
+
+    def check(self, kind):
+        """Registra a chamada ou levanta APIError 429 se a cota do minuto acabou."""
+        limit = self.limits[kind]
+        if not limit:
+            return
+        with self._lock:
+            calls = self._calls[kind]
+            now = time.monotonic()
+            while calls and now - calls[0] >= self.window:
+                calls.popleft()
+            if len(calls) >= limit:
+                raise _api_error(
+                    429,
+                    f"Quota exceeded for quota metric '{kind.title()} requests' (fake: {limit}/min)",
+                    "RESOURCE_EXHAUSTED",
+                )
+            calls.append(now)
+
+
+class FakeClient:
+    """
+    Client gspread falso. Planilhas são criadas sob demanda no open_by_key
+    (com uma aba vazia), a menos que auto_create=False.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, reads_per_minute=0, writes_per_minute=0,
+                 seed=None, auto_create=True):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota = FakeQuota(reads_per_minute, writes_per_minute)
+        self.auto_create = auto_create
+        self.http_client = FakeHTTPClient(self)
+        self.spreadsheets = {}
+        self.stats = {"read": 0, "write": 0, "rate_limited": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._revision = 0
+        # Revisões partem do instante de criação: não colidem com espelhos locais de outra execução
+        self._epoch = datetime.datetime.now(datetime.timezone.utc)
+
+    # --- Infraestrutura das chamadas ---
+    def _call(self, kind):
+        """Aplica cota e latência de uma chamada de API (fora do lock dos dados)."""
+        try:
+            self.quota.check(kind)
+        except APIError:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            raise
+        with self._lock:
+            self.stats[kind] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _touch(self, spreadsheet):
+        """Nova revisão (modifiedTime) após uma escrita."""
+        self._revision += 1
+        spreadsheet.modified = self._epoch + datetime.timedelta(microseconds=self._revision)
+
+    # --- API do gspread ---
+    def open_by_key(self, key):
+        self._call("read")
+        return self._get(key)
+
+    def _get(self, key):
+        with self._lock:
+            if key not in self.spreadsheets:
+                if not self.auto_create:
+                    raise gspread.SpreadsheetNotFound(key)
+                self.create(key)
+            return self.spreadsheets[key]
+
+    # --- Auxiliares (não existem no gspread; sem latência nem cota) ---
+    def create(self, key, tabs=None):
+        """Cria (ou substitui) uma planilha: tabs = {título: linhas}, na ordem das abas."""
+        with self._lock:
+            spreadsheet = FakeSpreadsheet(self, key)
+            for title, rows in (tabs or {DEFAULT_SHEET_TITLE: []}).items():
+                ws = spreadsheet._new_worksheet(title)
+                ws._grid = [[_cell_str(v) for v in row] for row in rows]
+            self.spreadsheets[key] = spreadsheet
+            self._touch(spreadsheet)
+            return spreadsheet
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"read": 0, "write": 0, "rate_limited": 0}
+
+
+class FakeHTTPClient:
+    """Chamadas "diretas" que o gsheets faz pelo client.http_client."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def _spreadsheet(self, key):
+        try:
+            return self._client._get(key)
+        except gspread.SpreadsheetNotFound:
+            raise _api_error(404, f"Requested entity was not found: {key}", "NOT_FOUND")
+
+    def get_file_drive_metadata(self, key):
+        self._client._call("read")
+        with self._client._lock:
+            spreadsheet = self._spreadsheet(key)
+            return {
+                "id": key,
+                "name": spreadsheet.title,
+                "modifiedTime": spreadsheet.modified.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            }
+
+    def values_batch_get(self, key, ranges, params=None):
+        self._client._call("read")
+        with self._client._lock:
+            spreadsheet = self._spreadsheet(key)
+            value_ranges = []
+            for a1 in ranges:
+                title, _, cells = a1.rpartition("!")
+                ws = spreadsheet._find(title.strip("'"))
+                if ws is None:
+                    raise _api_error(400, f"Unable to parse range: {a1}", "INVALID_ARGUMENT")
+                values = ws._values_in(a1_range_to_grid_range(cells))
+                value_ranges.append({"range": a1, "majorDimension": "ROWS", "values": values})
+            return {"spreadsheetId": key, "valueRanges": value_ranges}
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, key):
+        self.client = client
+        self.id = key
+        self.title = key
+        self.modified = client._epoch
+        self._worksheets = []
+        self._next_sheet_id = 0
+
+    def _new_worksheet(self, title):
+        ws = FakeWorksheet(self, title, self._next_sheet_id)
+        self._next_sheet_id += 1
+        self._worksheets.append(ws)
+        return ws
+
+    def _find(self, title):
+        return next((ws for ws in self._worksheets if ws.title == title), None)
+
+    def worksheets(self):
+        self.client._call("read")
+        with self.client._lock:
+            return list(self._worksheets)
+
+    def get_worksheet(self, index):
+        self.client._call("read")
+        with self.client._lock:
+            if not 0 <= index < len(self._worksheets):
+                raise gspread.WorksheetNotFound(f"index {index} not found")
+            return self._worksheets[index]
+
+    def worksheet(self, title):
+        self.client._call("read")
+        with self.client._lock:
+            ws = self._find(title)
+            if ws is None:
+                raise gspread.WorksheetNotFound(title)
+            return ws
+
+    def add_worksheet(self, title, rows=1000, cols=26, index=None):
+        self.client._call("write")
+        with self.client._lock:
+            if self._find(title) is not None:
+                raise _api_error(400, f'A sheet with the name "{title}" already exists.', "INVALID_ARGUMENT")
+            ws = self._new_worksheet(title)
+            self.client._touch(self)
+            return ws
+
+    def batch_update(self, body):
+        """Aplica deleteDimension (linhas), updateCells e appendCells, na ordem."""
+        self.client._call("write")
+        with self.client._lock:
+            by_id = {ws.id: ws for ws in self._worksheets}
+            for request in body.get("requests", []):
+                (kind, params), = request.items()
+                if kind == "deleteDimension":
+                    rng = params["range"]
+                    grid = by_id[rng["sheetId"]]._grid
+                    del grid[rng["startIndex"]:rng["endIndex"]]
+                elif kind == "updateCells":
+                    rng = params.get("range") or params["start"]
+                    ws = by_id[rng["sheetId"]]
+                    start_row = rng.get("startRowIndex", rng.get("rowIndex", 0))
+                    start_col = rng.get("startColumnIndex", rng.get("columnIndex", 0))
+                    width = rng.get("endColumnIndex", start_col) - start_col
+                    for i, row in enumerate(params.get("rows", [])):
+                        values = _row_strings(row)
+                        # Com range + fields, células do intervalo sem valor são apagadas
+                        values += [""] * (width - len(values))
+                        ws._write_row(start_row + i, start_col, values)
+                elif kind == "appendCells":
+                    ws = by_id[params["sheetId"]]
+                    del ws._grid[ws._used_rows():]
+                    ws._grid.extend(_row_strings(row) for row in params.get("rows", []))
+                else:
+                    raise _api_error(400, f"Unsupported request: {kind}", "INVALID_ARGUMENT")
+            self.client._touch(self)
+            return {"spreadsheetId": self.id, "replies": [{} for _ in body.get("requests", [])]}
+
+
+def _row_strings(row_data):
+    """Valores de um RowData da API (userEnteredValue) como texto."""
+    out = []
+    for cell in row_data.get("values", []):
+        value = cell.get("userEnteredValue", {})
+        out.append(_cell_str(next(iter(value.values()), "")))
+    return out
+
+
+class _Cell:
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeWorksheet:
+    """Aba como grade de strings (lista de linhas, sem padding)."""
+
+    def __init__(self, spreadsheet, title, sheet_id):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self._grid = []
+
+    @property
+    def _client(self):
+        return self.spreadsheet.client
+
+    # --- Auxiliares internos (chamados com o lock) ---
+    def _write_row(self, r, c, values):
+        while len(self._grid) <= r:
+            self._grid.append([])
+        row = self._grid[r]
+        if len(row) < c + len(values):
+            row.extend([""] * (c + len(values) - len(row)))
+        row[c:c + len(values)] = values
+
+    def _values_in(self, grid_range):
+        """Valores de um intervalo (sem limites = aba inteira), como a API devolve."""
+        r0 = grid_range.get("startRowIndex", 0)
+        r1 = grid_range.get("endRowIndex", len(self._grid))
+        c0 = grid_range.get("startColumnIndex", 0)
+        c1 = grid_range.get("endColumnIndex")
+        rows = [_trim(row[c0:c1]) for row in self._grid[r0:r1]]
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def _used_rows(self):
+        return len(self._values_in({}))
+
+    # --- Leitura ---
+    def get_all_values(self):
+        self._client._call("read")
+        with self._client._lock:
+            rows = self._values_in({})
+            width = max((len(r) for r in rows), default=0)
+            return [r + [""] * (width - len(r)) for r in rows]
+
+    def get_all_records(self, head=1):
+        self._client._call("read")
+        with self._client._lock:
+            rows = self._values_in({})
+        if len(rows) < head:
+            return []
+        keys = rows[head - 1]
+        return [
+            dict(zip(keys, numericise_all((row + [""] * len(keys))[:len(keys)])))
+            for row in rows[head:]
+        ]
+
+    def row_values(self, row):
+        self._client._call("read")
+        with self._client._lock:
+            return _trim(list(self._grid[row - 1])) if row <= len(self._grid) else []
+
+    def col_values(self, col):
+        self._client._call("read")
+        with self._client._lock:
+            return [r[0] if r else "" for r in self._values_in({"startColumnIndex": col - 1, "endColumnIndex": col})]
+
+    def acell(self, label):
+        self._client._call("read")
+        row, col = a1_to_rowcol(label)
+        with self._client._lock:
+            values = self._grid[row - 1] if row <= len(self._grid) else []
+            return _Cell(row, col, values[col - 1] if col <= len(values) and values[col - 1] != "" else None)
+
+    # --- Escrita ---
+    def update(self, values=None, range_name=None, value_input_option=None, **kwargs):
+        self._client._call("write")
+        row, col = a1_to_rowcol((range_name or "A1").split(":")[0])
+        with self._client._lock:
+            for i, values_row in enumerate(values or []):
+                self._write_row(row - 1 + i, col - 1, [_cell_str(v) for v in values_row])
+            self._client._touch(self.spreadsheet)
+        return {"updatedRows": len(values or [])}
+
+    def update_acell(self, label, value):
+        return self.update([[value]], label)
+
+    def clear(self):
+        self._client._call("write")
+        with self._client._lock:
+            self._grid = []
+            self._client._touch(self.spreadsheet)
+
+    def append_rows(self, values, value_input_option=None, **kwargs):
+        self._client._call("write")
+        with self._client._lock:
+            start = self._used_rows()
+            del self._grid[start:]
+            self._grid.extend([_cell_str(v) for v in row] for row in values)
+            self._client._touch(self.spreadsheet)
+        return {"updates": {"updatedRows": len(values)}}
+
+    def append_row(self, values, value_input_option=None, **kwargs):
+        return self.append_rows([values], value_input_option=value_input_option)
+
+
+# --- Instância compartilhada (GSHEETS_BACKEND=fake) ---
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def _env_number(name, default=0.0):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def get_fake_client():
+    """Client falso único do processo, configurado pelas variáveis GSHEETS_FAKE_*."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            seed = os.environ.get("GSHEETS_FAKE_SEED")
+            _shared_client = FakeClient(
+                latency=_env_number("GSHEETS_FAKE_LATENCY_MS") / 1000,
+                jitter=_env_number("GSHEETS_FAKE_JITTER_MS") / 1000,
+                reads_per_minute=int(_env_number("GSHEETS_FAKE_READS_PER_MINUTE")),
+                writes_per_minute=int(_env_number("GSHEETS_FAKE_WRITES_PER_MINUTE")),
+                seed=int(seed) if seed else None,
+            )
+        return _shared_client
@@ -0,0 +1,193 @@
+"""
+Índice persistente (SQLite) dos fingerprints das linhas de transações e receitas.
+Usado na importação para saber, sem recalcular o hash da base inteira, quais
+linhas do extrato já existem. Não depende do Streamlit: pode ser usado por um
+job de importação sem interface.
+
+Cada índice (`name`, ex: o ID da planilha) guarda fingerprint -> id da linha,
+mais o número de linhas, a revisão da planilha (modifiedTime do Drive) que ele
+reflete e uma marca de "desatualizado". A validade é conferida sem hashear a
+base: mesmo número de linhas e mesma revisão. Qualquer gravação que não venha
+da importação (edição, exclusão, outro processo, edição manual) muda a
+revisão; a próxima importação então reconstrói o índice uma vez e volta ao
+modo incremental.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "fingerprints.sqlite3")
+
+
+def row_fingerprints(df, columns):
+    """
+    Fingerprint estável de 64 bits por linha (mesmo valor entre processos,
+    ao contrário do hash() do Python), calculado de forma vetorizada sobre
+    `columns`. Normaliza antes de hashear: datas -> dia (sem hora), valores ->
+    centavos inteiros, texto -> str. Colunas ausentes contam como vazias.
+
+    Returns:
+        pd.Series uint64 com o mesmo índice de `df`
+    """
+    normalized = {}
+    for col in columns:
+        if col not in df.columns:
+            normalized[col] = pd.Series("", index=df.index)
+        elif col in ('date', 'reference_date'):
+            # Dia (meia-noite) em datetime64: equivale a 'YYYY-MM-DD' sem formatar texto
+            dates = pd.to_datetime(df[col], format='mixed', errors='coerce')
+            normalized[col] = dates.dt.normalize().astype('datetime64[ns]')
+        elif col == 'amount':
+            cents = (pd.to_numeric(df[col], errors='coerce') * 100).round()
+            normalized[col] = cents.fillna(0).astype('int64')
+        else:
+            normalized[col] = df[col].fillna("").astype(str)
+    return pd.util.hash_pandas_object(pd.DataFrame(normalized, index=df.index), index=False)
+
+
+def _to_sql_ints(fingerprints):
+    """uint64 -> int64 (mesmos bits): o INTEGER do SQLite é com sinal."""
+    return np.asarray(fingerprints, dtype=np.uint64).view(np.int64).tolist()
+
+
+def _row_ids_list(row_ids, count):
+    return [""] * count if row_ids is None else [str(i) for i in row_ids]
+
+
+class FingerprintIndex:
+    """Índice fingerprint -> id de linha para uma base (`name`) em um arquivo SQLite."""
+
+    def __init__(self, name, path=None):
+        self.name = name
+        self.path = path or INDEX_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                "name TEXT NOT NULL, fp INTEGER NOT NULL, row_id TEXT NOT NULL, "
+                "PRIMARY KEY (name, fp, row_id)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS indexes ("
+                "name TEXT PRIMARY KEY, row_count INTEGER NOT NULL, stale INTEGER NOT NULL, revision TEXT)"
+            )
+            # Arquivos criados antes da revisão: índices sem revisão são reconstruídos
+            columns = [r[1] for r in conn.execute("PRAGMA table_info(indexes)")]
+            if "revision" not in columns:
+                conn.execute("ALTER TABLE indexes ADD COLUMN revision TEXT")
+
+    @contextmanager
+    def _connect(self):
+        """Conexão curta: uma transação por operação, sempre fechada no fim."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def is_valid(self, row_count, revision=None):
+        """
+        True se o índice existe, não está desatualizado, cobre `row_count` linhas
+        e (se `revision` for dada) foi montado/atualizado nessa revisão da planilha.
+        Não lê os fingerprints: só a linha de controle do índice.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT row_count, stale, revision FROM indexes WHERE name = ?", (self.name,)
+            ).fetchone()
+        if row is None or row[1] or row[0] != row_count:
+            return False
+        return revision is None or row[2] == revision
+
+    def mark_stale(self):
+        with self._connect() as conn:
+            conn.execute("UPDATE indexes SET stale = 1 WHERE name = ?", (self.name,))
+
+    def rebuild(self, fingerprints, row_ids=None, revision=None):
+        """Substitui o índice inteiro pelos fingerprints da base atual (na `revision` dada)."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM fingerprints WHERE name = ?", (self.name,))
+            conn.execute("DELETE FROM indexes WHERE name = ?", (self.name,))
+            self._insert(conn, fingerprints, row_ids)
+            conn.execute(
+                "INSERT INTO indexes (name, row_count, stale, revision) VALUES (?, ?, 0, ?)",
+                (self.name, len(fingerprints), revision),
+            )
+
+    def add(self, fingerprints, row_ids=None, revision=None, base_count=None):
+        """
+        Acrescenta as linhas recém-importadas, depois que a base com elas chegou
+        à planilha; o índice passa a refletir a `revision` dessa gravação.
+        `base_count`: nº de linhas da base quando o lote foi deduplicado. Se o
+        índice foi reconstruído ou marcado desde então, nada é feito (a próxima
+        importação o valida de novo).
+        Returns:
+            True se o índice foi atualizado
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT row_count, stale FROM indexes WHERE name = ?", (self.name,)
+            ).fetchone()
+            if row is None or row[1] or (base_count is not None and row[0] != base_count):
+                return False
+            self._insert(conn, fingerprints, row_ids)
+            conn.execute(
+                "UPDATE indexes SET row_count = row_count + ?, revision = ? WHERE name = ?",
+                (len(fingerprints), revision, self.name),
+            )
+        return True
+
+    def _insert(self, conn, fingerprints, row_ids):
+        ids = _row_ids_list(row_ids, len(fingerprints))
+        conn.executemany(
+            "INSERT OR IGNORE INTO fingerprints (name, fp, row_id) VALUES (?, ?, ?)",
+            zip([self.name] * len(ids), _to_sql_ints(fingerprints), ids),
+        )
+
+    def contains(self, fingerprints):
+        """Máscara booleana: quais fingerprints já estão no índice (busca pela chave primária)."""
+        values = _to_sql_ints(fingerprints)
+        if not values:
+            return np.zeros(0, dtype=bool)
+        with self._connect() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS probe (fp INTEGER)")
+            conn.execute("DELETE FROM probe")
+            conn.executemany("INSERT INTO probe (fp) VALUES (?)", ((v,) for v in values))
+            found = {
+                r[0] for r in conn.execute(
+                    "SELECT DISTINCT probe.fp FROM probe JOIN fingerprints f "
+                    "ON f.name = ? AND f.fp = probe.fp", (self.name,)
+                )
+            }
+        return np.fromiter((v in found for v in values), dtype=bool, count=len(values))
+
+    def row_ids(self, fingerprint):
+        """Ids das linhas da base com esse fingerprint."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT row_id FROM fingerprints WHERE name = ? AND fp = ?",
+                (self.name, _to_sql_ints([fingerprint])[0]),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+def dedup_against_index(index, current_df, new_df, columns, id_column=None, revision=None):
+    """
+    Linhas de `new_df` que não existem em `current_df` (nem repetidas no lote),
+    consultando o índice em vez de comparar com a base. A base só é hasheada
+    quando o índice precisa ser reconstruído (desatualizado, nº de linhas
+    diferente ou outra `revision` da planilha).
+
+    Returns:
+        (linhas_novas, quantidade_de_duplicatas, fingerprints_das_linhas_novas)
+    """
+    if not index.is_valid(len(current_df), revision):
+        ids = current_df[id_column] if id_column and id_column in current_df.columns else None
+        index.rebuild(row_fingerprints(current_df, columns).to_numpy(), ids, revision)
+    new_fp = row_fingerprints(new_df, columns)
+    is_dup = new_fp.duplicated().to_numpy() | index.contains(new_fp.to_numpy())
+    return new_df[~is_dup], int(is_dup.sum()), new_fp.to_numpy()[~is_dup]
@@ -21,6 +21,8 @@ from google.oauth2.service_account import Credentials
 import pandas as pd
 import json
 
+import local_mirror
+
 # IDs das planilhas no Google Drive
 BASE_FINANCEIRA_ID = "173UZUPU5GXATVkaGGnIaDwJmd1r11YxXutNFxD5uCVs"
 RECEITAS_ID = "1ZTEqYxGAJGkanYOWKw7-WftiXeIqEc882wrD_ClPX9s"
@@ -44,7 +46,13 @@ def get_gspread_client():
     1. st.secrets['gcp_service_account'] (Streamlit Cloud / secrets.toml)
     2. .streamlit/secrets_new.toml (fallback local)
     3. service_account.json (fallback manual)
+    Com GSHEETS_BACKEND=fake usa o Google Sheets falso em memória (fake_gspread),
+    para testes de carga e benchmarks offline.
     """
+    if os.environ.get("GSHEETS_BACKEND", "google") == "fake":
+        import fake_gspread
+        return fake_gspread.get_fake_client()
+    
     creds_dict = None
     
     # Tentativa 1: st.secrets do Streamlit (funciona no Cloud e quando secrets.toml é legível)
@@ -88,39 +96,94 @@ def get_gspread_client():
 import time
 import threading
 import collections
+import hashlib
 from functools import wraps
 from gspread.exceptions import APIError
 
-# --- SLIDING WINDOW RATE LIMITER ---
-# O Google Sheets tem limite de 60 reads/minuto/usuário.
-# Em vez de um delay fixo entre cada chamada (que torna tudo lento),
-# usamos uma janela deslizante que permite rajadas rápidas e só freia
-# quando estamos próximos do limite.
-_api_lock = threading.Lock()
-_call_timestamps = collections.deque()
-_WINDOW_SIZE = 60   # janela de 60 segundos (quota reseta por minuto)
-_MAX_CALLS = 55     # limite conservador (quota real = 60)
-
-def _throttle_api():
-    """Sliding window rate limiter: permite rajadas, freia perto do limite."""
-    with _api_lock:
-        now = time.time()
-        # Limpar chamadas fora da janela de 60s
-        while _call_timestamps and _call_timestamps[0] < now - _WINDOW_SIZE:
-            _call_timestamps.popleft()
-        
-        # Se perto do limite, esperar até a chamada mais antiga sair da janela
-        if len(_call_timestamps) >= _MAX_CALLS:
-            wait_until = _call_timestamps[0] + _WINDOW_SIZE + 0.1
-            wait = wait_until - now
-            if wait > 0:
-                time.sleep(wait)
-                # Limpar novamente após a espera
-                now = time.time()
-                while _call_timestamps and _call_timestamps[0] < now - _WINDOW_SIZE:
-                    _call_timestamps.popleft()
-        
-        _call_timestamps.append(time.time())
+from rate_limiter import TokenBucket, SharedTokenBucket, split_quota
+from write_behind import WriteBehindQueue
+
+# --- RATE LIMITER (TOKEN BUCKET) ---
+# O Google Sheets limita leituras e escritas em cotas SEPARADAS (60/minuto/usuário).
+# Cada tipo de chamada tem seu próprio balde: uma rajada de escritas não trava
+# as leituras. O sleep acontece fora do lock, então uma thread esperando não
+# bloqueia as outras. Limites configuráveis por variável de ambiente.
+# Com GSHEETS_RATE_LIMITER=shared o saldo fica em um SQLite compartilhado por
+# todos os processos (vários workers do Streamlit, jobs em background) que usam
+# a mesma service account; o arquivo é GSHEETS_RATE_LIMITER_DB (padrão:
+# .cache/rate_limiter.sqlite3). Sem isso, cada processo tem o próprio balde.
+# Os baldes só são criados na primeira chamada (importar o módulo não cria arquivos).
+# O limite vale para QUALQUER janela de 60s (rajada + reposição somam o limite),
+# senão uma rajada cheia seguida da reposição passaria da cota real.
+# Sheets: 55/min + rajada de 5 (split_quota) = no máximo 60 em qualquer minuto (cota real).
+# Drive (revisão da planilha): cota própria, bem maior, contada em outro balde.
+_rate_limits = {
+    "read": int(os.environ.get("GSHEETS_READS_PER_MINUTE", 55)),    # cota real = 60
+    "write": int(os.environ.get("GSHEETS_WRITES_PER_MINUTE", 55)),  # cota real = 60
+    "drive": int(os.environ.get("GSHEETS_DRIVE_PER_MINUTE", 1000)),  # cota real = 12.000
+}
+_DEFAULT_RATE_LIMITER_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "rate_limiter.sqlite3")
+
+def _make_bucket(kind, per_minute):
+    """Cria o balde de um tipo de chamada (local, ou compartilhado entre processos se pedido)."""
+    rate, capacity = split_quota(per_minute)
+    if os.environ.get("GSHEETS_RATE_LIMITER", "local") == "shared":
+        path = os.environ.get("GSHEETS_RATE_LIMITER_DB", _DEFAULT_RATE_LIMITER_DB)
+        return SharedTokenBucket(path, f"gsheets_{kind}", rate, per=60, capacity=capacity)
+    return TokenBucket(rate, per=60, capacity=capacity)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def _get_bucket(kind):
+    """Balde do tipo `kind`, criado na primeira vez que é usado."""
+    bucket = _buckets.get(kind)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(kind)
+            if bucket is None:
+                bucket = _buckets[kind] = _make_bucket(kind, _rate_limits[kind])
+    return bucket
+
+_throttle_stats_lock = threading.Lock()
+_throttle_stats = {kind: {"calls": 0, "waits": 0, "waited": 0.0, "max_wait": 0.0} for kind in _rate_limits}
+
+def configure_rate_limits(reads_per_minute=None, writes_per_minute=None, drive_per_minute=None):
+    """
+    Ajusta os limites de leitura/escrita (Sheets) e de consultas ao Drive em
+    tempo de execução. Os baldes são reconfigurados no lugar: chamadas já
+    reservadas continuam contando.
+    """
+    for kind, per_minute in (("read", reads_per_minute), ("write", writes_per_minute),
+                             ("drive", drive_per_minute)):
+        if per_minute:
+            with _buckets_lock:
+                _rate_limits[kind] = per_minute
+                bucket = _buckets.get(kind)
+            if bucket is not None:
+                rate, capacity = split_quota(per_minute)
+                bucket.reconfigure(rate, per=60, capacity=capacity)
+
+def _throttle_api(kind="read"):
+    """
+    Consome um token do balde de leitura ("read") ou escrita ("write") do
+    Sheets, ou de consultas ao Drive ("drive"), esperando se necessário.
+    Retorna quantos segundos a chamada esperou.
+    """
+    waited = _get_bucket(kind).acquire()
+    with _throttle_stats_lock:
+        stats = _throttle_stats[kind]
+        stats["calls"] += 1
+        if waited > 0:
+            stats["waits"] += 1
+        stats["waited"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+    return waited
+
+def get_throttle_stats():
+    """Chamadas, esperas e tempo de espera por tipo: {'read': {...}, 'write': {...}, 'drive': {...}}."""
+    with _throttle_stats_lock:
+        return {kind: dict(stats) for kind, stats in _throttle_stats.items()}
 
 # --- CACHE DE SPREADSHEETS ---
 # Evita chamar client.open_by_key() repetidamente para a mesma planilha.
@@ -128,19 +191,28 @@ _spreadsheet_cache = {}
 _spreadsheet_cache_time = {}
 _SPREADSHEET_CACHE_TTL = 300  # 5 minutos
 
+# Um lock por planilha: leituras paralelas da mesma planilha abrem-na uma vez só,
+# sem serializar a abertura de planilhas diferentes.
+_spreadsheet_locks = collections.defaultdict(threading.Lock)
+_spreadsheet_locks_guard = threading.Lock()
+
 def _get_spreadsheet(client, spreadsheet_id):
     """Retorna spreadsheet do cache ou abre e cacheia."""
-    now = time.time()
-    cached_time = _spreadsheet_cache_time.get(spreadsheet_id, 0)
+    with _spreadsheet_locks_guard:
+        lock = _spreadsheet_locks[spreadsheet_id]
     
-    if spreadsheet_id in _spreadsheet_cache and (now - cached_time) < _SPREADSHEET_CACHE_TTL:
-        return _spreadsheet_cache[spreadsheet_id]
-    
-    _throttle_api()
-    spreadsheet = client.open_by_key(spreadsheet_id)
-    _spreadsheet_cache[spreadsheet_id] = spreadsheet
-    _spreadsheet_cache_time[spreadsheet_id] = now
-    return spreadsheet
+    with lock:
+        now = time.time()
+        cached_time = _spreadsheet_cache_time.get(spreadsheet_id, 0)
+        
+        if spreadsheet_id in _spreadsheet_cache and (now - cached_time) < _SPREADSHEET_CACHE_TTL:
+            return _spreadsheet_cache[spreadsheet_id]
+        
+        _throttle_api()
+        spreadsheet = client.open_by_key(spreadsheet_id)
+        _spreadsheet_cache[spreadsheet_id] = spreadsheet
+        _spreadsheet_cache_time[spreadsheet_id] = now
+        return spreadsheet
 
 def _invalidate_spreadsheet_cache(spreadsheet_id=None):
     """Invalida o cache de uma planilha específica ou de todas."""
@@ -151,6 +223,21 @@ def _invalidate_spreadsheet_cache(spreadsheet_id=None):
         _spreadsheet_cache.clear()
         _spreadsheet_cache_time.clear()
 
+def _notify_user(level, message):
+    """
+    st.toast/st.error só funcionam dentro de uma execução do script (thread da
+    sessão); em threads de fundo (ex: fila de escrita) a mensagem vai para o log.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        has_ctx = get_script_run_ctx(suppress_warning=True) is not None
+    except Exception:
+        has_ctx = False
+    if has_ctx:
+        getattr(st, level)(message)
+    else:
+        print(message)
+
 def retry_on_quota(max_retries=5, initial_delay=5):
     """
     Decorator para tentar novamente em caso de erro de cota (429).
@@ -176,11 +263,11 @@ def retry_on_quota(max_retries=5, initial_delay=5):
                         _invalidate_spreadsheet_cache()
                         
                         if attempt == max_retries - 1:
-                            st.error("⚠️ O Google Sheets está sobrecarregado (Muitas requisições). Tente novamente em 1 minuto.")
+                            _notify_user("error", "⚠️ O Google Sheets está sobrecarregado (Muitas requisições). Tente novamente em 1 minuto.")
                             raise
                         
                         effective_delay = min(delay, 60)  # Cap em 60s
-                        st.toast(f"⏳ Cota do Google atingida. Aguardando {effective_delay}s... ({attempt+1}/{max_retries})")
+                        _notify_user("toast", f"⏳ Cota do Google atingida. Aguardando {effective_delay}s... ({attempt+1}/{max_retries})")
                         time.sleep(effective_delay)
                         delay *= 2
                     else:
@@ -190,14 +277,358 @@ def retry_on_quota(max_retries=5, initial_delay=5):
     return decorator
 
 
+# --- ESTADO CONHECIDO DAS ABAS (ESCRITA INCREMENTAL) ---
+# Para cada (planilha, aba) guardamos o que sabemos estar gravado na nuvem:
+# sheetId, header, ids na ordem das linhas, um digest do conteúdo de cada linha
+# e a revisão (modifiedTime do Drive) da planilha quando esse estado foi visto.
+# Com isso, um save só envia as linhas alteradas/novas/removidas em um único
+# batch_update, em vez de limpar a aba e reenviar a base inteira.
+# As posições só valem para aquela revisão: se a planilha mudou por fora (outro
+# processo, edição manual), o save volta a ser a escrita completa.
+# "checked_at" (relógio monotônico) marca quando a revisão foi confirmada pela
+# última vez: uma gravação logo em seguida (mesma execução do script) não
+# precisa consultar o Drive de novo antes do delta.
+_sheet_state = {}
+_sheet_state_lock = threading.Lock()
+_REVISION_FRESH_SECONDS = 5.0
+
+
+def _dataframe_to_values(df):
+    """Converte o DataFrame para (header, linhas) só com strings, como é gravado na aba."""
+    df_str = df.copy()
+    for col in df_str.columns:
+        # Normalizar datas para formato consistente YYYY-MM-DD
+        if pd.api.types.is_datetime64_any_dtype(df_str[col]):
+            df_str[col] = df_str[col].dt.strftime('%Y-%m-%d').fillna('')
+        else:
+            df_str[col] = df_str[col].astype(str).replace("nan", "").replace("None", "").replace("NaT", "")
+    return [str(c) for c in df_str.columns], df_str.values.tolist()
+
+
+def _row_digest(row):
+    """Digest curto e estável do conteúdo de uma linha (já convertida para strings)."""
+    return hashlib.blake2b("\x1f".join(row).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _row_keys(header, rows, digests, key_column="id"):
+    """
+    Chave de cada linha para o diff: a coluna `id` quando existe; senão o próprio
+    conteúdo (digest + nº da ocorrência, para linhas repetidas). Em abas sem id
+    (receitas, receitas líquidas) uma linha alterada vira remoção + inserção.
+    """
+    if key_column in header:
+        k = header.index(key_column)
+        return [r[k] for r in rows]
+    seen = collections.Counter()
+    keys = []
+    for digest in digests:
+        keys.append(f"{digest}#{seen[digest]}")
+        seen[digest] += 1
+    return keys
+
+
+def _remember_sheet_state(spreadsheet_id, sheet_index, sheet_id, header, rows, revision=None, key_column="id"):
+    """Registra o estado gravado de uma aba (na `revision` dada) para permitir escritas incrementais."""
+    digests = [_row_digest(r) for r in rows]
+    with _sheet_state_lock:
+        _sheet_state[(spreadsheet_id, sheet_index)] = {
+            "sheet_id": sheet_id,
+            "header": list(header),
+            "ids": _row_keys(header, rows, digests, key_column),
+            "digests": digests,
+            "revision": revision,
+            "checked_at": time.monotonic() if revision else None,
+        }
+
+
+def _mark_revision_checked(spreadsheet_id, revision):
+    """A planilha acabou de ser vista nesta `revision`: estados nela continuam válidos."""
+    now = time.monotonic()
+    with _sheet_state_lock:
+        for key, state in _sheet_state.items():
+            if key[0] == spreadsheet_id and revision and state.get("revision") == revision:
+                _sheet_state[key] = dict(state, checked_at=now)
+
+
+def _revision_is_fresh(state):
+    """True se a revisão do estado foi confirmada há menos de _REVISION_FRESH_SECONDS."""
+    checked_at = state.get("checked_at")
+    return checked_at is not None and time.monotonic() - checked_at < _REVISION_FRESH_SECONDS
+
+
+def _normalize_sheet_state(spreadsheet_id, sheet_index, df, key_column="id"):
+    """
+    Recalcula os digests do estado a partir do DataFrame já normalizado pelo
+    loader (ex: amount "100" lido da aba vira 100.0 -> "100.0"), que é a mesma
+    representação que o writer compara no próximo save. Sem isso, o primeiro
+    save depois de cada leitura reenviaria todas as linhas com números.
+    O índice de `df` deve ser a posição da linha na aba (linhas filtradas pelo
+    loader mantêm o digest lido e saem no próximo save). Header diferente:
+    nada a fazer, o próximo save já será completo.
+    """
+    key = (spreadsheet_id, sheet_index)
+    with _sheet_state_lock:
+        state = _sheet_state.get(key)
+    if not state:
+        return
+    header, rows = _dataframe_to_values(df)
+    if header != state["header"]:
+        return
+    digests = list(state["digests"])
+    positions = df.index.tolist()
+    if any(not isinstance(p, int) or not 0 <= p < len(digests) for p in positions):
+        _forget_sheet_state(spreadsheet_id)
+        return
+    for pos, row in zip(positions, rows):
+        digests[pos] = _row_digest(row)
+    # Abas com id mantêm as chaves; nas demais a chave é o próprio conteúdo
+    ids = state["ids"] if key_column in header else _row_keys(header, [], digests, key_column)
+    with _sheet_state_lock:
+        if _sheet_state.get(key) is state:
+            _sheet_state[key] = dict(state, digests=digests, ids=ids)
+
+
+def _forget_sheet_state(spreadsheet_id=None):
+    """Descarta o estado conhecido (de uma planilha ou de todas)."""
+    with _sheet_state_lock:
+        if spreadsheet_id is None:
+            _sheet_state.clear()
+        else:
+            for key in [k for k in _sheet_state if k[0] == spreadsheet_id]:
+                del _sheet_state[key]
+
+
+def _contiguous_ranges(positions):
+    """[1, 2, 3, 7, 8] -> [(1, 4), (7, 9)] (intervalos semiabertos)."""
+    ranges = []
+    for pos in positions:
+        if ranges and ranges[-1][1] == pos:
+            ranges[-1][1] = pos + 1
+        else:
+            ranges.append([pos, pos + 1])
+    return [tuple(r) for r in ranges]
+
+
+def _plan_delta(state, header, rows, key_column="id"):
+    """
+    Compara as linhas novas com o último estado conhecido da aba (chave: coluna `id`,
+    ou o conteúdo da linha em abas sem id).
+    Retorna o plano {'delete', 'update', 'append', 'ids', 'digests'} ou None quando
+    a escrita incremental não é segura (sem estado, header mudou, ids vazios/duplicados).
+    Posições são índices de linhas de dados (0 = primeira linha após o header).
+    """
+    if not state or state["header"] != list(header) or state.get("ids") is None:
+        return None
+    
+    new_digests = [_row_digest(r) for r in rows]
+    new_ids = _row_keys(header, rows, new_digests, key_column)
+    old_ids = state["ids"]
+    if "" in new_ids or len(set(new_ids)) != len(new_ids) or len(set(old_ids)) != len(old_ids):
+        return None
+    
+    new_pos = {rid: i for i, rid in enumerate(new_ids)}
+    old_digest = dict(zip(old_ids, state["digests"]))
+    
+    # 1. Linhas removidas (posições no estado antigo)
+    deleted = [i for i, rid in enumerate(old_ids) if rid not in new_pos]
+    
+    # 2. Linhas mantidas: após as remoções ficam na ordem antiga; atualiza só as que mudaram
+    updates = []
+    final_ids = []
+    final_digests = []
+    for rid in old_ids:
+        if rid not in new_pos:
+            continue
+        row = rows[new_pos[rid]]
+        digest = new_digests[new_pos[rid]]
+        if digest != old_digest[rid]:
+            updates.append((len(final_ids), row))
+        final_ids.append(rid)
+        final_digests.append(digest)
+    
+    # 3. Linhas novas vão para o final
+    appends = []
+    for rid, row, digest in zip(new_ids, rows, new_digests):
+        if rid not in old_digest:
+            appends.append(row)
+            final_ids.append(rid)
+            final_digests.append(digest)
+    
+    return {
+        "delete": _contiguous_ranges(deleted),
+        "update": updates,
+        "append": appends,
+        "ids": final_ids,
+        "digests": final_digests,
+    }
+
+
+def _row_data(row):
+    """Linha de strings -> RowData da API (célula vazia = apagar valor, como no RAW)."""
+    return {"values": [{"userEnteredValue": {"stringValue": v}} if v != "" else {} for v in row]}
+
+
+def _build_delta_requests(sheet_id, plan, n_cols):
+    """Monta os requests do batch_update: remoções (de baixo para cima), updates e appends."""
+    requests = []
+    # Remover de baixo para cima para não deslocar os intervalos seguintes (+1 = header)
+    for start, end in reversed(plan["delete"]):
+        requests.append({"deleteDimension": {"range": {
+            "sheetId": sheet_id, "dimension": "ROWS",
+            "startIndex": start + 1, "endIndex": end + 1,
+        }}})
+    
+    # Agrupar updates contíguos em um único updateCells
+    block = []
+    def flush_block():
+        if not block:
+            return
+        first = block[0][0]
+        requests.append({"updateCells": {
+            "range": {
+                "sheetId": sheet_id,
+                "startRowIndex": first + 1, "endRowIndex": first + 1 + len(block),
+                "startColumnIndex": 0, "endColumnIndex": n_cols,
+            },
+            "rows": [_row_data(r) for _, r in block],
+            "fields": "userEnteredValue",
+        }})
+        block.clear()
+    
+    for pos, row in plan["update"]:
+        if block and block[-1][0] + 1 != pos:
+            flush_block()
+        block.append((pos, row))
+    flush_block()
+    
+    if plan["append"]:
+        requests.append({"appendCells": {
+            "sheetId": sheet_id,
+            "rows": [_row_data(r) for r in plan["append"]],
+            "fields": "userEnteredValue",
+        }})
+    return requests
+
+
+def export_sheet_state(spreadsheet_id, sheet_index=0):
+    """Cópia serializável (JSON) do estado conhecido de uma aba, ou None."""
+    with _sheet_state_lock:
+        state = _sheet_state.get((spreadsheet_id, sheet_index))
+        if not state:
+            return None
+        # Relógio monotônico só vale neste processo
+        return {k: v for k, v in state.items() if k != "checked_at"}
+
+
+def known_revision(spreadsheet_id, sheet_index=0):
+    """
+    Revisão em que a aba foi vista pela última vez (leitura ou gravação deste
+    processo), sem chamar a API. None se não há estado conhecido.
+    """
+    with _sheet_state_lock:
+        state = _sheet_state.get((spreadsheet_id, sheet_index))
+        return state.get("revision") if state else None
+
+
+def restore_sheet_state(spreadsheet_id, state, sheet_index=0):
+    """Restaura um estado exportado (ex: vindo do espelho local de mesma revisão)."""
+    if not state:
+        return
+    with _sheet_state_lock:
+        _sheet_state[(spreadsheet_id, sheet_index)] = dict(state)
+
+
+# --- ESPELHO LOCAL POR REVISÃO ---
+@retry_on_quota()
+def get_sheet_revision(spreadsheet_id):
+    """
+    Retorna o modifiedTime da planilha pela Drive API.
+    É uma única chamada leve (não abre a planilha nem baixa dados) e conta na
+    cota do Drive, não na de leitura do Sheets.
+    """
+    client = get_gspread_client()
+    _throttle_api("drive")
+    metadata = client.http_client.get_file_drive_metadata(spreadsheet_id)
+    return metadata.get("modifiedTime")
+
+
+def _current_revision(spreadsheet_id, name):
+    """Revisão atual da planilha, ou None se a consulta falhar (sem espelho nesse caso)."""
+    try:
+        revision = get_sheet_revision(spreadsheet_id)
+    except Exception as e:
+        print(f"Aviso: não foi possível consultar revisão de '{name}': {e}")
+        return None
+    _mark_revision_checked(spreadsheet_id, revision)
+    return revision
+
+
+# Revisão já consultada por read_mirrored, para o fetch que ele chama (mesma
+# thread) não consultar o Drive de novo: {spreadsheet_id: revisão}
+_fetch_revisions = threading.local()
+
+
+def _revision_for_read(spreadsheet_id):
+    known = getattr(_fetch_revisions, "known", None) or {}
+    return known.get(spreadsheet_id) or _current_revision(spreadsheet_id, "leitura")
+
+
+def read_mirrored(spreadsheet_id, name, fetch, sheet_index=None):
+    """
+    Lê um DataFrame pelo espelho local se a planilha não mudou desde a última leitura.
+    - fetch: função sem argumentos que lê (e normaliza) os dados da nuvem.
+    - sheet_index: aba cujo estado de escrita incremental acompanha o espelho.
+    Se a consulta de revisão falhar, cai direto no fetch (comportamento antigo).
+    Se houver gravação pendente na fila de segundo plano, ela é a versão atual.
+    """
+    # Leitura das próprias escritas: gravação agendada e ainda não enviada
+    if sheet_index is not None:
+        pending = pending_write(spreadsheet_id, sheet_index)
+        if pending is not None:
+            return pending
+    
+    key = f"{spreadsheet_id}__{name}"
+    revision = _current_revision(spreadsheet_id, name)
+    
+    if revision:
+        cached = local_mirror.load(key, revision)
+        if cached is not None:
+            df, extra = cached
+            if sheet_index is not None:
+                restore_sheet_state(spreadsheet_id, extra.get("sheet_state"), sheet_index)
+                _mark_revision_checked(spreadsheet_id, revision)
+            return df
+    
+    known = getattr(_fetch_revisions, "known", None)
+    _fetch_revisions.known = dict(known or {}, **({spreadsheet_id: revision} if revision else {}))
+    try:
+        df = fetch()
+    finally:
+        _fetch_revisions.known = known
+    if sheet_index is not None:
+        _normalize_sheet_state(spreadsheet_id, sheet_index, df)
+    if revision:
+        extra = {}
+        if sheet_index is not None:
+            extra["sheet_state"] = export_sheet_state(spreadsheet_id, sheet_index)
+        local_mirror.save(key, revision, df, extra)
+    return df
+
+
 @retry_on_quota()
-def read_sheet_as_dataframe(spreadsheet_id, sheet_index=0):
+def read_sheet_as_dataframe(spreadsheet_id, sheet_index=0, revision=None):
     """
     Lê todos os dados de uma aba (worksheet) de uma planilha Google Sheets
     e retorna como pandas DataFrame.
+    revision: revisão já consultada antes da leitura; sem ela, vem a que
+    read_mirrored acabou de consultar ou uma consulta nova ao Drive.
     """
     client = get_gspread_client()
     spreadsheet = _get_spreadsheet(client, spreadsheet_id)
+    # Revisão ANTES de ler: se alguém gravar durante a leitura, o estado fica
+    # com a revisão antiga e o próximo save cai na escrita completa
+    if revision is None:
+        revision = _revision_for_read(spreadsheet_id)
     
     _throttle_api()
     worksheet = spreadsheet.get_worksheet(sheet_index)
@@ -209,49 +640,167 @@ def read_sheet_as_dataframe(spreadsheet_id, sheet_index=0):
         _throttle_api()
         header = worksheet.row_values(1)
         if header:
+            _remember_sheet_state(spreadsheet_id, sheet_index, worksheet.id, header, [], revision)
             return pd.DataFrame(columns=header)
         return pd.DataFrame()
     
-    return pd.DataFrame(records)
+    df = pd.DataFrame(records)
+    header, rows = _dataframe_to_values(df)
+    _remember_sheet_state(spreadsheet_id, sheet_index, worksheet.id, header, rows, revision)
+    return df
 
 
 @retry_on_quota()
 def write_dataframe_to_sheet(df, spreadsheet_id, sheet_index=0):
     """
-    Sobrescreve uma aba (worksheet) com o conteúdo de um DataFrame.
-    Limpa a aba e escreve header + dados.
+    Grava um DataFrame em uma aba (worksheet).
+    Se conhecemos o estado atual da aba (o header não mudou e a planilha continua
+    na revisão em que o estado foi visto), envia apenas o delta (linhas alteradas,
+    novas e removidas) em um único batch_update.
+    Caso contrário, limpa a aba e escreve header + dados.
     """
     client = get_gspread_client()
     spreadsheet = _get_spreadsheet(client, spreadsheet_id)
+    header, rows = _dataframe_to_values(df)
+    local_mirror.invalidate(spreadsheet_id)
+    
+    with _sheet_state_lock:
+        state = _sheet_state.get((spreadsheet_id, sheet_index))
+    plan = _plan_delta(state, header, rows)
+    
+    if plan is not None:
+        # Posições de outra revisão (outro processo, edição manual) apagariam/
+        # atualizariam as linhas erradas: nesse caso, escrita completa. Se a
+        # revisão acabou de ser confirmada (leitura/gravação há poucos
+        # segundos), não consulta o Drive de novo.
+        revision = state.get("revision")
+        if not _revision_is_fresh(state):
+            revision = _current_revision(spreadsheet_id, "escrita")
+        if revision is None or revision != state.get("revision"):
+            print(f"--- '{spreadsheet_id}' mudou desde a última leitura: escrita completa ---")
+            plan = None
+    
+    if plan is not None:
+        requests = _build_delta_requests(state["sheet_id"], plan, len(header))
+        if requests:
+            try:
+                _throttle_api("write")
+                spreadsheet.batch_update({"requests": requests})
+            except Exception:
+                # Estado incerto: a próxima tentativa faz a escrita completa
+                _forget_sheet_state(spreadsheet_id)
+                raise
+            revision = _current_revision(spreadsheet_id, "escrita")
+        with _sheet_state_lock:
+            _sheet_state[(spreadsheet_id, sheet_index)] = {
+                "sheet_id": state["sheet_id"],
+                "header": list(header),
+                "ids": plan["ids"],
+                "digests": plan["digests"],
+                "revision": revision,
+                "checked_at": time.monotonic() if revision else None,
+            }
+        return
     
     _throttle_api()
     worksheet = spreadsheet.get_worksheet(sheet_index)
     
     # Limpar todo o conteúdo existente
-    _throttle_api()
+    _forget_sheet_state(spreadsheet_id)
+    _throttle_api("write")
     worksheet.clear()
     
     if df.empty:
         # Se vazio, escrever apenas o header
         if len(df.columns) > 0:
-            _throttle_api()
-            worksheet.update([df.columns.tolist()], value_input_option="RAW")
+            _throttle_api("write")
+            worksheet.update([header], value_input_option="RAW")
+        _remember_sheet_state(spreadsheet_id, sheet_index, worksheet.id, header, [],
+                              _current_revision(spreadsheet_id, "escrita"))
         return
     
-    # Converter tudo para string para evitar erros de serialização
-    df_str = df.copy()
-    for col in df_str.columns:
-        # Normalizar datas para formato consistente YYYY-MM-DD
-        if pd.api.types.is_datetime64_any_dtype(df_str[col]):
-            df_str[col] = df_str[col].dt.strftime('%Y-%m-%d').fillna('')
-        else:
-            df_str[col] = df_str[col].astype(str).replace("nan", "").replace("None", "").replace("NaT", "")
-    
     # Montar dados: header + linhas
-    data = [df_str.columns.tolist()] + df_str.values.tolist()
+    data = [header] + rows
     
-    _throttle_api()
+    _throttle_api("write")
     worksheet.update(data, value_input_option="RAW")
+    _remember_sheet_state(spreadsheet_id, sheet_index, worksheet.id, header, rows,
+                          _current_revision(spreadsheet_id, "escrita"))
+
+
+# ============================================================
+# ESCRITA EM SEGUNDO PLANO (write-behind)
+# ============================================================
+# GSHEETS_WRITE_BEHIND=0 desliga a fila (gravações síncronas, como antes).
+_WRITE_BEHIND = os.environ.get("GSHEETS_WRITE_BEHIND", "1") != "0"
+_write_queue = None
+_write_queue_lock = threading.Lock()
+_write_failure_listeners = []
+
+
+def add_write_failure_listener(callback):
+    """
+    Registra callback(spreadsheet_id, sheet_index, error), chamado (na thread da
+    fila) sempre que uma gravação em segundo plano falha.
+    """
+    _write_failure_listeners.append(callback)
+
+
+def _notify_write_failure(spreadsheet_id, sheet_index, error):
+    for callback in list(_write_failure_listeners):
+        callback(spreadsheet_id, sheet_index, error)
+
+
+def _get_write_queue():
+    """Cria a fila na primeira chamada (e reenvia o journal de execuções anteriores)."""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteBehindQueue(write_dataframe_to_sheet, on_failure=_notify_write_failure)
+        return _write_queue
+
+
+def enqueue_write(df, spreadsheet_id, sheet_index=0, on_success=None):
+    """
+    Agenda a gravação do DataFrame na aba e retorna imediatamente.
+    Uma gravação pendente da mesma aba é substituída por esta.
+    on_success: chamada sem argumentos quando ESTA gravação chegar à planilha
+    (não é chamada se ela for substituída antes do envio ou descartada).
+    """
+    if not _WRITE_BEHIND:
+        write_dataframe_to_sheet(df, spreadsheet_id, sheet_index)
+        if on_success is not None:
+            on_success()
+        return
+    _get_write_queue().enqueue(df, spreadsheet_id, sheet_index, on_success=on_success)
+
+
+def pending_write(spreadsheet_id, sheet_index=0):
+    """DataFrame agendado e ainda não enviado para a aba, ou None."""
+    if not _WRITE_BEHIND:
+        return None
+    return _get_write_queue().pending(spreadsheet_id, sheet_index)
+
+
+def has_pending_write(spreadsheet_id, sheet_index=0):
+    """True se há gravação agendada para a aba (sem criar a fila se ainda não existe)."""
+    queue = _write_queue
+    return queue is not None and queue.pending(spreadsheet_id, sheet_index) is not None
+
+
+def get_write_status():
+    """Status da fila para a UI: {'pending', 'in_flight', 'flushed', 'last_flush', 'last_error', 'failed'}."""
+    if not _WRITE_BEHIND:
+        return {"pending": 0, "in_flight": False, "flushed": 0, "last_flush": None, "last_error": None,
+                "failed": []}
+    return _get_write_queue().status()
+
+
+def flush_writes(timeout=None):
+    """Espera todas as gravações pendentes chegarem à planilha."""
+    if not _WRITE_BEHIND:
+        return True
+    return _get_write_queue().flush(timeout)
 
 
 @retry_on_quota()
@@ -270,7 +819,10 @@ def read_settings_from_sheet(spreadsheet_id=SETTINGS_ID):
     
     # Settings são armazenadas como JSON na célula A1
     _throttle_api()
-    cell_value = worksheet.acell("A1").value
+    return _parse_settings_json(worksheet.acell("A1").value)
+
+def _parse_settings_json(cell_value):
+    """Conteúdo da célula A1 da aba 'Settings' -> dict (ou None)."""
     if cell_value:
         try:
             return json.loads(cell_value)
@@ -286,12 +838,13 @@ def write_settings_to_sheet(settings_dict, spreadsheet_id=SETTINGS_ID):
     client = get_gspread_client()
     spreadsheet = _get_spreadsheet(client, spreadsheet_id)
     worksheet = _get_or_create_worksheet(spreadsheet, "Settings")
+    local_mirror.invalidate(spreadsheet_id)
     
     # Limpar e escrever JSON
-    _throttle_api()
+    _throttle_api("write")
     worksheet.clear()
     json_str = json.dumps(settings_dict, indent=2, ensure_ascii=False)
-    _throttle_api()
+    _throttle_api("write")
     worksheet.update_acell("A1", json_str)
 
 
@@ -301,7 +854,7 @@ def _get_or_create_worksheet(spreadsheet, title, rows=100, cols=20):
         _throttle_api()
         return spreadsheet.worksheet(title)
     except gspread.WorksheetNotFound:
-        _throttle_api()
+        _throttle_api("write")
         return spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
 
 @retry_on_quota()
@@ -313,7 +866,10 @@ def read_categories(spreadsheet_id=SETTINGS_ID):
     
     # Lê coluna A (pula header se houver, mas vamos assumir lista simples ou com header 'Categoria')
     _throttle_api()
-    vals = ws.col_values(1)
+    return _clean_categories(ws.col_values(1))
+
+def _clean_categories(vals):
+    """Valores da coluna A da aba 'Categorias' -> lista limpa e ordenada."""
     if not vals:
         return []
     
@@ -330,22 +886,26 @@ def save_categories(categories_list, spreadsheet_id=SETTINGS_ID):
     client = get_gspread_client()
     spreadsheet = _get_spreadsheet(client, spreadsheet_id)
     ws = _get_or_create_worksheet(spreadsheet, "Categorias")
+    local_mirror.invalidate(spreadsheet_id)
     
-    _throttle_api()
+    _throttle_api("write")
     ws.clear()
-    _throttle_api()
+    _throttle_api("write")
     data = [["Categoria"]] + [[c] for c in categories_list]
     ws.update(data, value_input_option="RAW")
 
 @retry_on_quota()
-def read_budgets(spreadsheet_id=SETTINGS_ID):
-    """Lê a tabela de metas da aba 'Metas'."""
+def _fetch_budgets(spreadsheet_id=SETTINGS_ID):
+    """Lê a tabela de metas da aba 'Metas' direto da nuvem."""
     client = get_gspread_client()
     spreadsheet = _get_spreadsheet(client, spreadsheet_id)
     ws = _get_or_create_worksheet(spreadsheet, "Metas")
     
     _throttle_api()
-    records = ws.get_all_records()
+    return _budgets_frame(ws.get_all_records())
+
+def _budgets_frame(records):
+    """Registros da aba 'Metas' -> DataFrame com colunas e tipos garantidos."""
     if not records:
         return pd.DataFrame(columns=["Categoria", "Valor", "Mes", "Ano"])
     
@@ -359,20 +919,77 @@ def read_budgets(spreadsheet_id=SETTINGS_ID):
             elif col == "Tipo": val = "Orçamento"
             else: val = ""
             df[col] = val
+    
+    # Tipos definitivos (mesmos do save_budgets) para o espelho local já sair pronto
+    df["Valor"] = pd.to_numeric(df["Valor"], errors="coerce").fillna(0.0).astype(float)
+    df["Mes"] = pd.to_numeric(df["Mes"], errors="coerce").fillna(0).astype(int)
+    df["Ano"] = pd.to_numeric(df["Ano"], errors="coerce").fillna(0).astype(int)
             
     return df[expected_cols]
 
+def read_budgets(spreadsheet_id=SETTINGS_ID):
+    """Lê a tabela de metas da aba 'Metas' (via espelho local quando a planilha não mudou)."""
+    return read_mirrored(spreadsheet_id, "metas", lambda: _fetch_budgets(spreadsheet_id))
+
+# --- LEITURA EM LOTE DAS CONFIGURAÇÕES ---
+# Settings (JSON legado), Categorias e Metas em uma única chamada values:batchGet,
+# em vez de ~7 chamadas (abrir abas + acell + col_values + get_all_records).
+_SETTINGS_RANGES = ["Settings!A1", "Categorias!A:A", "Metas!A:E"]
+
+@retry_on_quota()
+def _fetch_settings_tabs(spreadsheet_id=SETTINGS_ID):
+    """Lê as três abas de configuração direto da nuvem com um único batchGet."""
+    client = get_gspread_client()
+    _throttle_api()
+    response = client.http_client.values_batch_get(spreadsheet_id, _SETTINGS_RANGES)
+    value_ranges = response.get("valueRanges", [])
+    settings_vals, cat_vals, meta_vals = [vr.get("values", []) for vr in value_ranges]
+    
+    legacy = _parse_settings_json(settings_vals[0][0] if settings_vals and settings_vals[0] else None)
+    categories = _clean_categories([row[0] if row else "" for row in cat_vals])
+    
+    # Mesma conversão do get_all_records (header na linha 1, números numericizados)
+    records = []
+    if meta_vals:
+        header = meta_vals[0]
+        for row in meta_vals[1:]:
+            padded = list(row) + [""] * (len(header) - len(row))
+            records.append(dict(zip(header, gspread.utils.numericise_all(padded[:len(header)]))))
+    return legacy, categories, _budgets_frame(records)
+
+def read_settings_tabs(spreadsheet_id=SETTINGS_ID):
+    """
+    Retorna (legacy_dict, categorias, metas_df) das abas de configuração.
+    Usa o espelho local quando a planilha não mudou (1 chamada: revisão);
+    senão faz um único values_batch_get (2 chamadas no total).
+    Levanta APIError se alguma aba não existir (quem chama deve cair no caminho antigo).
+    """
+    key = f"{spreadsheet_id}__settings_tabs"
+    revision = _current_revision(spreadsheet_id, "settings_tabs")
+    
+    if revision:
+        cached = local_mirror.load(key, revision)
+        if cached is not None:
+            budgets_df, extra = cached
+            return extra.get("legacy"), extra.get("categories", []), budgets_df
+    
+    legacy, categories, budgets_df = _fetch_settings_tabs(spreadsheet_id)
+    if revision:
+        local_mirror.save(key, revision, budgets_df, {"legacy": legacy, "categories": categories})
+    return legacy, categories, budgets_df
+
 @retry_on_quota()
 def save_budgets(df, spreadsheet_id=SETTINGS_ID):
     """Salva o DataFrame de metas na aba 'Metas'."""
     client = get_gspread_client()
     spreadsheet = _get_spreadsheet(client, spreadsheet_id)
     ws = _get_or_create_worksheet(spreadsheet, "Metas")
+    local_mirror.invalidate(spreadsheet_id)
     
-    _throttle_api()
+    _throttle_api("write")
     ws.clear()
     if df.empty:
-        _throttle_api()
+        _throttle_api("write")
         ws.update([["Categoria", "Valor", "Mes", "Ano", "Tipo"]], value_input_option="RAW")
         return
 
@@ -387,13 +1004,13 @@ def save_budgets(df, spreadsheet_id=SETTINGS_ID):
     df_save["Tipo"] = df_save["Tipo"].fillna("Orçamento").astype(str)
     
     data = [df_save.columns.tolist()] + df_save.values.tolist()
-    _throttle_api()
+    _throttle_api("write")
     ws.update(data, value_input_option="RAW")
 
 
 @retry_on_quota()
-def read_classification_dataset(spreadsheet_id=CLASSIFICATION_ID):
-    """Lê o dataset de treinamento da aba 'classificacao_categoria'."""
+def _fetch_classification_dataset(spreadsheet_id=CLASSIFICATION_ID):
+    """Lê o dataset de treinamento da aba 'classificacao_categoria' direto da nuvem."""
     client = get_gspread_client()
     spreadsheet = _get_spreadsheet(client, spreadsheet_id)
     ws = _get_or_create_worksheet(spreadsheet, "classificacao_categoria")
@@ -412,22 +1029,97 @@ def read_classification_dataset(spreadsheet_id=CLASSIFICATION_ID):
             
     return df[["Descricao", "Categoria", "Data", "Valor"]]
 
+def read_classification_dataset(spreadsheet_id=CLASSIFICATION_ID):
+    """Lê o dataset de treinamento (via espelho local quando a planilha não mudou)."""
+    return read_mirrored(spreadsheet_id, "classificacao_categoria", lambda: _fetch_classification_dataset(spreadsheet_id))
+
+_CLASSIFICATION_HEADER = ["Descricao", "Categoria", "Data", "Valor"]
+# Planilhas cuja aba de treinamento já teve o header verificado nesta sessão
+_classification_header_checked = set()
+_classification_header_lock = threading.Lock()
+
+
+def _classification_row(description, category, amount=None, date=None):
+    """Linha da aba 'classificacao_categoria' (Valor com vírgula decimal)."""
+    val_amount = str(amount).replace(".", ",") if amount is not None else ""
+    val_date = str(date) if date is not None else ""
+    return [str(description), str(category), val_date, val_amount]
+
+
+_classification_listeners = []
+
+
+def add_classification_listener(callback):
+    """
+    Registra callback(spreadsheet_id, count), chamado depois que novos exemplos
+    de treinamento são gravados (ex: para descartar o histórico em cache).
+    """
+    _classification_listeners.append(callback)
+
+
 @retry_on_quota()
-def append_classification(description, category, amount=None, date=None, spreadsheet_id=CLASSIFICATION_ID):
-    """Adiciona um novo exemplo de treinamento na aba 'classificacao_categoria'."""
+def append_classifications(examples, spreadsheet_id=CLASSIFICATION_ID):
+    """
+    Adiciona vários exemplos de treinamento na aba 'classificacao_categoria'
+    em uma única chamada append_rows.
+    - examples: iterável de (descricao, categoria, valor, data)
+    O header é verificado (row_values(1)) só uma vez por sessão e planilha.
+    """
+    rows = [_classification_row(*example) for example in examples]
+    count = len(rows)
+    if not count:
+        return 0
+    
     client = get_gspread_client()
     spreadsheet = _get_spreadsheet(client, spreadsheet_id)
     ws = _get_or_create_worksheet(spreadsheet, "classificacao_categoria")
+    local_mirror.invalidate(spreadsheet_id)
     
-    # Se a aba estiver vazia, adicionar header
-    _throttle_api()
-    if not ws.get_all_values():
+    with _classification_header_lock:
+        needs_check = spreadsheet_id not in _classification_header_checked
+    if needs_check:
+        # Se a aba estiver vazia, o header vai junto no mesmo append
         _throttle_api()
-        ws.append_row(["Descricao", "Categoria", "Data", "Valor"])
-        
-    val_amount = str(amount).replace(".", ",") if amount is not None else ""
-    val_date = str(date) if date is not None else ""
+        if not ws.row_values(1):
+            rows = [_CLASSIFICATION_HEADER] + rows
     
-    _throttle_api()
-    ws.append_row([str(description), str(category), val_date, val_amount])
+    _throttle_api("write")
+    ws.append_rows(rows, value_input_option="RAW")
+    with _classification_header_lock:
+        _classification_header_checked.add(spreadsheet_id)
+    for callback in list(_classification_listeners):
+        callback(spreadsheet_id, count)
+    return count
+
+
+class ClassificationBuffer:
+    """
+    Acumula os exemplos de uma ação da UI (wizard, edição em massa) e envia tudo
+    em um único append_classifications ao sair do bloco `with` (ou no flush()).
+    """
+
+    def __init__(self, spreadsheet_id=CLASSIFICATION_ID):
+        self.spreadsheet_id = spreadsheet_id
+        self.examples = []
+
+    def add(self, description, category, amount=None, date=None):
+        if description:
+            self.examples.append((description, category, amount, date))
+
+    def flush(self):
+        examples, self.examples = self.examples, []
+        return append_classifications(examples, spreadsheet_id=self.spreadsheet_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+
+def append_classification(description, category, amount=None, date=None, spreadsheet_id=CLASSIFICATION_ID):
+    """Adiciona um novo exemplo de treinamento na aba 'classificacao_categoria'."""
+    append_classifications([(description, category, amount, date)], spreadsheet_id=spreadsheet_id)
 
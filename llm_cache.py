@@ -0,0 +1,130 @@
+"""
+Cache persistente (SQLite) das respostas da IA na categorização.
+Os mesmos estabelecimentos aparecem todo mês: só descrições realmente novas
+precisam ir para a API.
+
+Chave: descrição normalizada + hash da lista de categorias (mudou a lista,
+as respostas antigas deixam de valer) + namespace opcional (ex: o backend
+que respondeu, para um simulador não contaminar as respostas reais).
+Entradas expiram após `ttl` segundos e, acima de `max_entries`, as menos
+usadas recentemente são removidas (LRU).
+Contadores de acerto/erro ficam em memória, por instância.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_cache.sqlite3")
+DEFAULT_TTL = 90 * 24 * 3600    # 90 dias
+MAX_ENTRIES = 50_000
+
+
+def categories_hash(categories, namespace=""):
+    """Hash estável da lista de categorias (ordem e duplicatas não importam)."""
+    payload = json.dumps(sorted(set(categories)), ensure_ascii=False)
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{namespace}:{digest}" if namespace else digest
+
+
+class LLMCache:
+    """Cache descrição normalizada -> categoria para uma lista de categorias."""
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self.path = path or CACHE_PATH
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT NOT NULL, cats TEXT NOT NULL, category TEXT NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (key, cats)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        """Conexão curta: uma transação por operação, sempre fechada no fim."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, keys, categories, namespace=""):
+        """
+        {chave: categoria} das chaves em cache e ainda válidas (TTL). Marca
+        as encontradas como usadas agora (LRU) e atualiza os contadores.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        cats = categories_hash(categories, namespace)
+        now = time.time()
+        found = {}
+        with self._connect() as conn:
+            # Lotes de 500 (limite de parâmetros do SQLite)
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key, category FROM responses WHERE cats = ? AND created >= ? "
+                    f"AND key IN ({','.join('?' * len(part))})",
+                    [cats, now - self.ttl, *part],
+                ).fetchall()
+                found.update(rows)
+            conn.executemany(
+                "UPDATE responses SET last_used = ? WHERE key = ? AND cats = ?",
+                ((now, key, cats) for key in found),
+            )
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items, categories, namespace=""):
+        """Grava {chave: categoria} e aplica a expiração/limite de tamanho."""
+        if not items:
+            return
+        cats = categories_hash(categories, namespace)
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, cats, category, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                ((key, cats, str(category), now, now) for key, category in items.items()),
+            )
+        self.evict()
+
+    def evict(self):
+        """Remove entradas expiradas e, acima de max_entries, as menos usadas. Retorna quantas saíram."""
+        with self._connect() as conn:
+            removed = conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)).rowcount
+            excess = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += conn.execute(
+                    "DELETE FROM responses WHERE (key, cats) IN "
+                    "(SELECT key, cats FROM responses ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                ).rowcount
+        return removed
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Contadores desta instância e tamanho atual do cache."""
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0, "entries": entries}
@@ -0,0 +1,169 @@
+"""
+Espelho local (Parquet) das planilhas do Google Sheets.
+Cada espelho guarda o DataFrame já normalizado (dtypes corretos) junto com a
+revisão (modifiedTime do Drive) da planilha no momento da leitura.
+Se a revisão atual for a mesma, o DataFrame é lido do disco em milissegundos,
+idêntico ao da leitura da nuvem (mesmos dtypes, valores e índice).
+"""
+import datetime
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+MIRROR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sheets")
+# Espelhos de formato anterior (sem índice nem tipos das colunas object) são relidos
+MIRROR_FORMAT = 2
+
+
+def _paths(key):
+    """Caminhos (parquet, metadados) de um espelho."""
+    return (
+        os.path.join(MIRROR_DIR, f"{key}.parquet"),
+        os.path.join(MIRROR_DIR, f"{key}.json"),
+    )
+
+
+def _arrow_safe(df):
+    """
+    Colunas object com tipos misturados (ex: 'Valor' com 10 e "48,83", vindas do
+    get_all_records, ou 'date' com datetime.date e Timestamp depois de importar
+    um extrato) não são serializáveis em Arrow sem perda: convertemos essas para
+    o texto que seria gravado na planilha.
+    """
+    out = df
+    for col in _mixed_columns(df):
+        if out is df:
+            out = df.copy()
+        out[col] = df[col].map(lambda v: "" if v is None or (isinstance(v, float) and pd.isna(v)) else str(v))
+    return out
+
+
+# Tipos dos valores de colunas misturadas, na ordem de teste (subclasses
+# antes: Timestamp é datetime, bool é int): (tipos, nome, texto -> valor)
+_VALUE_TYPES = [
+    ((bool, np.bool_), "bool", lambda text: text == "True"),
+    ((int, np.integer), "int", int),
+    ((float, np.floating), "float", float),
+    ((pd.Timestamp,), "timestamp", pd.Timestamp),
+    ((datetime.datetime,), "datetime", datetime.datetime.fromisoformat),
+    ((datetime.date,), "date", datetime.date.fromisoformat),
+]
+_PARSERS = {name: parse for _, name, parse in _VALUE_TYPES}
+_PARSERS.update({"str": str, "nan": lambda text: float("nan"), "nat": lambda text: pd.NaT})
+
+
+def _type_name(value):
+    """Nome do tipo de um valor (None para None); tipos desconhecidos voltam como texto."""
+    if value is None:
+        return None
+    if value is pd.NaT:
+        return "nat"
+    if isinstance(value, float) and pd.isna(value):
+        return "nan"
+    for types, name, _ in _VALUE_TYPES:
+        if isinstance(value, types):
+            return name
+    return "str"
+
+
+def _mixed_columns(df):
+    """Colunas object com tipos misturados (não serializáveis em Arrow sem perda)."""
+    mixed = []
+    for col in df.columns:
+        if df[col].dtype == object:
+            kind = pd.api.types.infer_dtype(df[col], skipna=True)
+            if kind.startswith("mixed") or len(set(map(type, df[col].dropna()))) > 1:
+                mixed.append(col)
+    return mixed
+
+
+def _encode_objects(df):
+    """
+    Colunas object -> texto, com o tipo de cada valor à parte (um nome só se
+    todos são do mesmo tipo). Sem isso o Parquet devolveria str no lugar de
+    object, "" no lugar de números em colunas misturadas, etc.
+    Returns:
+        (DataFrame serializável, [[coluna, tipo ou lista de tipos], ...])
+    """
+    out, value_types = df, []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        values = df[col].tolist()
+        types = [_type_name(v) for v in values]
+        if out is df:
+            out = df.copy()
+        out[col] = pd.Series([str(v) if t not in (None, "nan", "nat") else "" for v, t in zip(values, types)],
+                             index=df.index, dtype=object)
+        value_types.append([col, types[0] if len(set(types)) == 1 else types])
+    return out, value_types
+
+
+def _decode_objects(df, value_types):
+    """Desfaz _encode_objects: valores originais, coluna object."""
+    for col, types in value_types:
+        if isinstance(types, str) or types is None:
+            types = [types] * len(df)
+        texts = df[col].tolist()
+        df[col] = pd.Series([None if t is None else _PARSERS[t](v) for v, t in zip(texts, types)],
+                            index=df.index, dtype=object)
+    return df
+
+
+def load(key, revision):
+    """
+    Retorna (df, extra) se existir espelho para `key` gravado na mesma `revision`.
+    Retorna None se não existir, estiver desatualizado ou corrompido.
+    """
+    parquet_path, meta_path = _paths(key)
+    if not revision or not os.path.exists(parquet_path) or not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("revision") != revision or meta.get("format") != MIRROR_FORMAT:
+            return None
+        df = _decode_objects(pd.read_parquet(parquet_path), meta.get("value_types") or [])
+        return df, meta.get("extra") or {}
+    except Exception as e:
+        print(f"Aviso: espelho local '{key}' ilegível, ignorando: {e}")
+        return None
+
+
+def save(key, revision, df, extra=None):
+    """
+    Grava o espelho (escrita atômica: arquivo temporário + rename), com o
+    índice. Colunas object vão como texto para o Parquet e o tipo de cada
+    valor fica nos metadados, para o load devolver os valores originais.
+    """
+    if not revision:
+        return
+    parquet_path, meta_path = _paths(key)
+    try:
+        os.makedirs(MIRROR_DIR, exist_ok=True)
+        tmp_parquet = parquet_path + ".tmp"
+        tmp_meta = meta_path + ".tmp"
+        encoded, value_types = _encode_objects(df)
+        encoded.to_parquet(tmp_parquet, index=True)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"format": MIRROR_FORMAT, "revision": revision, "extra": extra or {},
+                       "value_types": value_types}, f, ensure_ascii=False)
+        # Metadados por último: um espelho só é válido quando os dois existem
+        os.replace(tmp_parquet, parquet_path)
+        os.replace(tmp_meta, meta_path)
+    except Exception as e:
+        print(f"Aviso: não foi possível gravar espelho local '{key}': {e}")
+
+
+def invalidate(spreadsheet_id=None):
+    """Remove os espelhos de uma planilha (chaves começam com o ID) ou todos."""
+    if not os.path.isdir(MIRROR_DIR):
+        return
+    for name in os.listdir(MIRROR_DIR):
+        if spreadsheet_id is None or name.startswith(f"{spreadsheet_id}__"):
+            try:
+                os.remove(os.path.join(MIRROR_DIR, name))
+            except OSError:
+                pass
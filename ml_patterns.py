@@ -2,8 +2,19 @@
 Módulo de aprendizado de padrões para categorização de transações.
 Aprende com transações já categorizadas manualmente pelo usuário.
 """
+import os
+import json
+import hashlib
+import functools
+import threading
+
+import numpy as np
 import pandas as pd
 from collections import defaultdict
+
+# Versão do formato do modelo persistido: mudar sempre que a estrutura mudar
+MODEL_FORMAT = 3
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ml")
 STOPWORDS = {
     'compra', 'pagamento', 'transferencia', 'transf', 'doc', 'ted', 'pix', 'envio', 'recebimento',
     'de', 'para', 'do', 'da', 'no', 'na', 'em', 'com', 'e', 'o', 'a', 'os', 'as', 'um', 'uma',
@@ -11,99 +22,850 @@ STOPWORDS = {
     'app', 'mobile', 'internet', 'bank', 'banco', 'servico', 'serv', 'saque', 'extrato'
 }
 
+# Títulos distintos guardados no cache de tokenização (LRU)
+TOKEN_CACHE_SIZE = 50_000
+# Tokens distintos no vocabulário antes de recomeçá-lo (junto com o cache acima)
+MAX_VOCABULARY_SIZE = 200_000
+
+
+class Vocabulary:
+    """
+    Vocabulário internado: cada token ganha um id inteiro pequeno (int32),
+    estável enquanto o processo viver. Aprendizado e sugestão agrupam e
+    consultam ids em vez de strings.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._tokens = []
+        # Espelho de _tokens em array (para indexar por id), com folga: cresce
+        # dobrando de tamanho e só copia os tokens novos
+        self._array = np.empty(1024, dtype=object)
+        self._filled = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def ids(self, tokens):
+        """Ids dos tokens (internando os novos), como array int32."""
+        with self._lock:
+            out = np.empty(len(tokens), dtype=np.int32)
+            for i, token in enumerate(tokens):
+                token_id = self._ids.get(token)
+                if token_id is None:
+                    token_id = self._ids[token] = len(self._tokens)
+                    self._tokens.append(token)
+                out[i] = token_id
+            return out
+
+    def tokens(self, ids):
+        """Tokens dos ids (array de objetos)."""
+        with self._lock:
+            size = len(self._tokens)
+            if self._filled < size:
+                if len(self._array) < size:
+                    grown = np.empty(max(2 * len(self._array), size), dtype=object)
+                    grown[:self._filled] = self._array[:self._filled]
+                    self._array = grown
+                self._array[self._filled:size] = self._tokens[self._filled:size]
+                self._filled = size
+            array = self._array[:size]
+        return array[np.asarray(ids, dtype=np.int64)]
+
+    def lookup(self, mapping, missing=-1):
+        """
+        {token: valor inteiro} -> array indexado por id (tokens fora do
+        mapping = `missing`), para consultar um lote inteiro de ids de uma vez.
+        """
+        keys = self.ids(list(mapping))
+        table = np.full(len(self), missing, dtype=np.int64)
+        table[keys] = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+        return table
+
+
+VOCABULARY = Vocabulary()
+_vocabulary_cond = threading.Condition()
+_vocabulary_users = 0
+
+
+def _uses_vocabulary(func):
+    """
+    Marca uma função que guarda ids do VOCABULARY entre chamadas internas.
+    Quando o vocabulário passa de MAX_VOCABULARY_SIZE, ele é recomeçado (com
+    o cache de títulos) na entrada da próxima função marcada em que nenhuma
+    outra estiver em andamento: os ids nunca mudam no meio de um cálculo.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global VOCABULARY, _vocabulary_users
+        with _vocabulary_cond:
+            if _vocabulary_users == 0 and len(VOCABULARY) > MAX_VOCABULARY_SIZE:
+                VOCABULARY = Vocabulary()
+                title_token_ids.cache_clear()
+            _vocabulary_users += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with _vocabulary_cond:
+                _vocabulary_users -= 1
+    return wrapper
+
+
+def _split_tokens(text):
+    text = text.lower().replace('/', ' ').replace('-', ' ').replace('.', ' ')
+    words = [w.strip() for w in text.split() if len(w.strip()) > 2]
+    return [w for w in words if w not in STOPWORDS and not w.isdigit()]
+
+
+@functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def title_token_ids(text):
+    """
+    Ids (VOCABULARY) dos tokens de um título, na ordem do texto. Cacheado
+    pelo título bruto: extratos repetem muito os mesmos estabelecimentos.
+    O array devolvido é compartilhado (somente leitura).
+    """
+    ids = VOCABULARY.ids(_split_tokens(text))
+    ids.setflags(write=False)
+    return ids
+
+
+@_uses_vocabulary
 def tokenize(text):
     """Quebra o texto em palavras significativas."""
     if not text: return []
-    text = str(text).lower().replace('/', ' ').replace('-', ' ').replace('.', ' ')
-    words = [w.strip() for w in text.split() if len(w.strip()) > 2]
-    return [w for w in words if w not in STOPWORDS and not w.isdigit()]
+    return VOCABULARY.tokens(title_token_ids(str(text))).tolist()
+
+@_uses_vocabulary
+def tokenize_ids(texts):
+    """
+    Tokens de vários textos como arrays de inteiros: (posição da linha de
+    origem, id do token), na ordem em que os tokens aparecem. Cada texto
+    distinto passa pelo cache de tokenização uma vez só.
+    """
+    texts = pd.Series(texts)
+    if texts.empty:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    codes, unique = pd.factorize(texts.astype(str))
+    # Código -1 = texto ausente (NaN/None): linha sem tokens
+    present = codes >= 0
+    if not present.any():
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    codes = np.where(present, codes, 0)
+    per_title = [title_token_ids(t) for t in unique]
+    lengths = np.fromiter((len(a) for a in per_title), dtype=np.int64, count=len(per_title))
+    flat = np.concatenate(per_title) if per_title else np.zeros(0, dtype=np.int32)
+    starts = np.cumsum(lengths) - lengths
+    
+    # Expande título único -> linhas: linha i recebe flat[starts[c]:starts[c] + lengths[c]]
+    row_lengths = np.where(present, lengths[codes], 0)
+    rows = np.repeat(np.arange(len(codes)), row_lengths)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+    return rows, flat[np.repeat(starts[codes], row_lengths) + offsets]
+
+@_uses_vocabulary
+def tokenize_series(texts):
+    """
+    Versão vetorizada de tokenize: uma linha por token, com o índice da linha
+    de origem (na ordem em que os tokens aparecem no texto).
+    """
+    texts = pd.Series(texts)
+    rows, ids = tokenize_ids(texts)
+    return pd.Series(VOCABULARY.tokens(ids), index=texts.index[rows], dtype=object)
+
+
+# ============================================================
+# VALORES EM CENTAVOS (índice ordenado)
+# ============================================================
+# Valores aprendidos são comparados em centavos inteiros: "48,83" da
+# planilha e 48.83 (ou 48.830000001) do pandas caem na mesma chave.
+
+def to_cents(values):
+    """Valores -> centavos int64 (arredondados); inválidos/ausentes = 0."""
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+    cents = np.round(values * 100)
+    return np.where(np.isfinite(cents), cents, 0).astype(np.int64)
+
+
+def _amount_key(cents):
+    """Centavos -> chave float do modelo (ex: 4883 -> 48.83)."""
+    return int(cents) / 100
+
+
+class AmountIndex:
+    """
+    Valores aprendidos -> categoria, em arrays NumPy ordenados por centavos
+    (busca com searchsorted). Além do índice geral, um índice por dono:
+    contas recorrentes de uma pessoa têm prioridade sobre o geral.
+    """
+
+    def __init__(self, amounts, owner_amounts=None):
+        """amounts: {valor: categoria}; owner_amounts: {dono: {valor: categoria}}."""
+        self._global = self._arrays(amounts)
+        self._owners = {owner: self._arrays(patterns) for owner, patterns in (owner_amounts or {}).items() if patterns}
+
+    @staticmethod
+    def _arrays(patterns):
+        cents = to_cents(list(patterns.keys()))
+        order = np.argsort(cents, kind='stable')
+        return cents[order], np.asarray(list(patterns.values()), dtype=object)[order]
+
+    def __len__(self):
+        return len(self._global[0]) + sum(len(c) for c, _ in self._owners.values())
+
+    @staticmethod
+    def _search(arrays, cents, tolerance):
+        """Categoria do valor mais próximo a até `tolerance` centavos (empate -> o menor) ou None."""
+        keys, categories = arrays
+        out = np.full(len(cents), None, dtype=object)
+        if len(keys) == 0 or len(cents) == 0:
+            return out
+        right = np.searchsorted(keys, cents)
+        left = np.maximum(right - 1, 0)
+        right = np.minimum(right, len(keys) - 1)
+        left_dist, right_dist = np.abs(keys[left] - cents), np.abs(keys[right] - cents)
+        best = np.where(left_dist <= right_dist, left, right)
+        hit = np.minimum(left_dist, right_dist) <= tolerance
+        out[hit] = categories[best[hit]]
+        return out
+
+    def lookup(self, amounts, owners=None, tolerance=0):
+        """
+        Categoria de cada valor (None se não aprendido). tolerance: aceita o
+        valor aprendido mais próximo a até ±N centavos (contas que variam um
+        pouco). owners: dono de cada valor; o índice do dono vem antes do geral.
+        """
+        cents = to_cents(amounts)
+        valid = cents > 0
+        out = np.full(len(cents), None, dtype=object)
+        out[valid] = self._search(self._global, cents[valid], tolerance)
+        if owners is not None and self._owners:
+            owners = pd.Series(owners).to_numpy(dtype=object)
+            for owner, arrays in self._owners.items():
+                mask = valid & (owners == owner)
+                if mask.any():
+                    scoped = self._search(arrays, cents[mask], tolerance)
+                    out[mask] = np.where(pd.notna(scoped), scoped, out[mask])
+        return out
+
+
+def _index_amounts(model):
+    """
+    Guarda no modelo o AmountIndex dos valores aprendidos ("amount_index").
+    Chamada sempre que "amounts"/"owner_amounts" mudam (treino, update,
+    leitura do disco): as sugestões reaproveitam o índice em vez de
+    reordenar os valores a cada chamada. Não vai para o disco.
+    """
+    model["amount_index"] = AmountIndex(model.get("amounts", {}), model.get("owner_amounts"))
+    return model
+
+
+def _amount_index(learned_patterns):
+    """AmountIndex do modelo; dicts sem índice (learn_patterns_from_data, montados à mão) ganham um temporário."""
+    index = learned_patterns.get("amount_index")
+    if index is None:
+        index = AmountIndex(learned_patterns.get("amounts", {}), learned_patterns.get("owner_amounts"))
+    return index
+
+
+# Pesos e limiares do aprendizado
+HISTORY_WEIGHT = 5      # Correções explícitas (feedback direto, planilha de histórico)
+CURRENT_WEIGHT = 1      # Transações atuais já categorizadas
+MIN_WORD_POINTS = 2     # Pelo menos 2 pontos de confiança
+MIN_AMOUNT_POINTS = 3   # Valor exato exige mais confiança, pois valores podem coincidir
+_IGNORED_CATEGORIES = ['Outros', 'Pagamento/Crédito', '', None]
+
+
+def _history_rows(history_df):
+    """Linhas do histórico que entram no aprendizado (com categoria)."""
+    if history_df is None or history_df.empty or \
+            'Descricao' not in history_df.columns or 'Categoria' not in history_df.columns:
+        return pd.DataFrame(columns=['Descricao', 'Categoria', 'Valor'])
+    cols = [c for c in ['Descricao', 'Categoria', 'Valor'] if c in history_df.columns]
+    hist = history_df[cols].reset_index(drop=True)
+    cats = hist['Categoria']
+    return hist[cats.notna() & (cats.astype(str) != '')].reset_index(drop=True)
+
+
+def _current_rows(df):
+    """
+    Transações atuais que entram no aprendizado (exceto "Outros" e
+    "Pagamento/Crédito"), com o dono quando houver (valores por pessoa).
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['title', 'category', 'amount'])
+    cols = ['title', 'category', 'amount'] + (['owner'] if 'owner' in df.columns else [])
+    return df.loc[~df['category'].isin(_IGNORED_CATEGORIES), cols].reset_index(drop=True)
+
+
+def _row_events(rows, text_col, cat_col, amount_col, weight, decimal_comma=False):
+    """
+    Eventos de pontuação de um conjunto de linhas:
+    (palavra, categoria, peso) por token e (valor, categoria, peso[, dono])
+    por valor > 0, com o valor em centavos inteiros (to_cents).
+    decimal_comma: valores em texto com vírgula decimal (planilha de histórico).
+    """
+    word_events = pd.DataFrame(columns=['word', 'category', 'weight'])
+    amount_events = pd.DataFrame(columns=['amount', 'category', 'weight'])
+    if rows.empty:
+        return word_events, amount_events
+    
+    # Aprendizado por Valor Exato (se disponível)
+    if amount_col in rows.columns:
+        vals = rows[amount_col].astype(str).str.replace(',', '.') if decimal_comma else rows[amount_col]
+        cents = pd.Series(to_cents(vals), index=rows.index)
+        cents = cents[cents > 0]
+        amount_events = pd.DataFrame({'amount': cents, 'category': rows.loc[cents.index, cat_col], 'weight': weight})
+        if 'owner' in rows.columns:
+            amount_events['owner'] = rows.loc[cents.index, 'owner']
+    
+    # Palavras como ids inteiros do VOCABULARY (agrupamento mais barato que strings)
+    pos, ids = tokenize_ids(rows[text_col])
+    word_events = pd.DataFrame({'word': ids, 'category': rows[cat_col].to_numpy()[pos], 'weight': weight},
+                               index=rows.index[pos])
+    return word_events, amount_events
+
+
+def _sequenced(parts, start=0):
+    """Concatena eventos numerando a ordem de chegada (usada no desempate)."""
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=['category', 'weight', 'seq'])
+    events = pd.concat(parts, ignore_index=True)
+    events['seq'] = range(start, start + len(events))
+    return events
+
+
+def _totals(events, key, by=()):
+    """Pontos e primeira aparição por ([by...,] chave, categoria)."""
+    if events.empty:
+        return pd.DataFrame(columns=[*by, key, 'category', 'points', 'first'])
+    return events.groupby([*by, key, 'category'], sort=False).agg(points=('weight', 'sum'), first=('seq', 'min')).reset_index()
+
+
+def _winners(totals, key, min_points):
+    """
+    Para cada chave, a categoria com mais pontos; empate -> a que apareceu
+    primeiro (menor seq). Só entram chaves com pelo menos `min_points` pontos.
+    """
+    if totals.empty:
+        return {}
+    best = totals.sort_values([key, 'points', 'first'], ascending=[True, False, True]).drop_duplicates(key)
+    best = best[best['points'] >= min_points].sort_values('first')
+    return dict(zip(best[key].tolist(), best['category'].tolist()))
+
+
+def _owned(amount_events):
+    """Eventos de valor com dono preenchido (o histórico não tem dono)."""
+    if 'owner' not in amount_events.columns:
+        return amount_events.iloc[:0].assign(owner=pd.Series(dtype=object))
+    owners = amount_events['owner']
+    return amount_events[owners.notna() & (owners.astype(str) != '')]
+
+
+@_uses_vocabulary
+def _learn_totals(hist, cur):
+    """
+    (totais por palavra, totais por valor, totais por (dono, valor), nº de
+    eventos) de histórico + atuais. Valores em centavos.
+    """
+    hist_words, hist_amounts = _row_events(hist, 'Descricao', 'Categoria', 'Valor', HISTORY_WEIGHT, decimal_comma=True)
+    cur_words, cur_amounts = _row_events(cur, 'title', 'category', 'amount', CURRENT_WEIGHT)
+    words = _sequenced([hist_words, cur_words])
+    amounts = _sequenced([hist_amounts, cur_amounts])
+    word_totals = _totals(words, 'word')
+    word_totals['word'] = VOCABULARY.tokens(word_totals['word'].to_numpy(dtype=np.int64))
+    owner_totals = _totals(_owned(amounts), 'amount', by=('owner',))
+    return word_totals, _totals(amounts, 'amount'), owner_totals, max(len(words), len(amounts))
+
+
+def _amount_winners(totals):
+    """Vencedores por valor, com a chave em reais ({48.83: categoria})."""
+    return {_amount_key(k): v for k, v in _winners(totals, 'amount', MIN_AMOUNT_POINTS).items()}
+
+
+def _owner_amount_winners(owner_totals):
+    """{dono: {valor: categoria}} (só donos com algum valor aprendido)."""
+    winners = {}
+    for owner, totals in owner_totals.groupby('owner', sort=False):
+        patterns = _amount_winners(totals)
+        if patterns:
+            winners[owner] = patterns
+    return winners
+
 
 def learn_patterns_from_data(df, history_df=None):
     """
     Analisa os DataFrames e cria um mapeamento de palavras-chave -> categoria.
     df: Transações atuais (memória curta).
     history_df: Dataset persistente da planilha (memória longa/feedbacks).
+    
+    Tudo em operações de coluna: tokens "explodidos" em linhas, pontos somados
+    por (token, categoria) com groupby e vencedor escolhido por ordenação.
     """
-    patterns = defaultdict(lambda: defaultdict(int))
-    amount_patterns = defaultdict(lambda: defaultdict(int)) # Novo: Padrões de valor exato
-    
-    # 1. Processar Histórico (Peso maior: 5x)
-    if history_df is not None and not history_df.empty:
-        # Garantir colunas
-        if 'Descricao' in history_df.columns and 'Categoria' in history_df.columns:
-            for idx, row in history_df.iterrows():
-                title = str(row['Descricao'])
-                category = row['Categoria']
-                if not category: continue
-                
-                # Aprendizado por Valor Exato (se disponível)
-                if 'Valor' in row and row['Valor']:
-                    try:
-                        val = float(str(row['Valor']).replace(',', '.'))
-                        if val > 0:
-                            amount_patterns[val][category] += 5
-                    except: pass
-
-                words = tokenize(title)
-                for word in words:
-                    patterns[word][category] += 5 # Peso 5 para correções explícitas (feedback direto)
-    
-    # 2. Processar Dados Atuais (Peso normal: 1x)
-    if not df.empty:
-        # Filtra apenas transações que não são "Outros" ou "Pagamento/Crédito"
-        valid_cats = df[~df['category'].isin(['Outros', 'Pagamento/Crédito', '', None])]
-        
-        for idx, row in valid_cats.iterrows():
-            title = str(row['title'])
-            category = row['category']
-            
-            # Aprendizado por Valor Exato
-            try:
-                val = float(row['amount'])
-                if val > 0:
-                     amount_patterns[val][category] += 1
-            except: pass
-            
-            words = tokenize(title)
-            for word in words:
-                patterns[word][category] += 1
+    word_totals, amount_totals, _, _ = _learn_totals(_history_rows(history_df), _current_rows(df))
     
     # Converte para o padrão mais comum para cada palavra/valor
-    learned = {
+    return {
+        "words": _winners(word_totals, 'word', MIN_WORD_POINTS),
+        "amounts": _amount_winners(amount_totals),
+    }
+
+
+# ============================================================
+# MODELO (vencedores + contagens), com atualização incremental
+# ============================================================
+
+def _counts_from_totals(totals, key, cast=lambda k: k):
+    """DataFrame de totais -> {chave: {categoria: [pontos, primeira_aparição]}}."""
+    counts = {}
+    for k, cat, points, first in zip(totals[key].tolist(), totals['category'].tolist(),
+                                     totals['points'].tolist(), totals['first'].tolist()):
+        counts.setdefault(cast(k), {})[cat] = [points, first]
+    return counts
+
+
+def build_model(df, history_df=None):
+    """
+    Treina do zero e devolve o modelo completo: os vencedores ("words",
+    "amounts", mesmo formato de learn_patterns_from_data; "owner_amounts" por
+    dono) e as contagens por (chave, categoria) que permitem atualizações
+    incrementais (update).
+    """
+    word_totals, amount_totals, owner_totals, n_events = _learn_totals(_history_rows(history_df), _current_rows(df))
+    return _index_amounts({
+        "format": MODEL_FORMAT,
+        "words": _winners(word_totals, 'word', MIN_WORD_POINTS),
+        "amounts": _amount_winners(amount_totals),
+        "owner_amounts": _owner_amount_winners(owner_totals),
+        "word_counts": _counts_from_totals(word_totals, 'word'),
+        "amount_counts": _counts_from_totals(amount_totals, 'amount', _amount_key),
+        "owner_amount_counts": {owner: _counts_from_totals(totals, 'amount', _amount_key)
+                                for owner, totals in owner_totals.groupby('owner', sort=False)},
+        "next_seq": n_events,
+    })
+
+
+def _best(cat_counts, min_points):
+    """Categoria vencedora de uma chave (mais pontos; empate -> primeira vista) ou None."""
+    if not cat_counts:
+        return None
+    cat, (points, _) = min(cat_counts.items(), key=lambda kv: (-kv[1][0], kv[1][1]))
+    return cat if points >= min_points else None
+
+
+def _apply_events(model, events, key, counts_name, winners_name, min_points, cast=lambda k: k):
+    """Soma eventos (peso pode ser negativo = remoção) e recalcula só as chaves tocadas."""
+    counts = model[counts_name]
+    winners = model[winners_name]
+    touched = set()
+    for k, cat, weight in zip(events[key].tolist(), events['category'].tolist(), events['weight'].tolist()):
+        k = cast(k)
+        cat_counts = counts.setdefault(k, {})
+        if cat in cat_counts:
+            cat_counts[cat][0] += weight
+        else:
+            cat_counts[cat] = [weight, model["next_seq"]]
+            model["next_seq"] += 1
+        if cat_counts[cat][0] <= 0:
+            del cat_counts[cat]
+        touched.add(k)
+    for k in touched:
+        if not counts.get(k):
+            counts.pop(k, None)
+        best = _best(counts.get(k), min_points)
+        if best is None:
+            winners.pop(k, None)
+        else:
+            winners[k] = best
+
+
+@_uses_vocabulary
+def _apply_rows(model, rows, text_col, cat_col, amount_col, weight, decimal_comma=False):
+    words, amounts = _row_events(rows, text_col, cat_col, amount_col, weight, decimal_comma)
+    words['word'] = VOCABULARY.tokens(words['word'].to_numpy(dtype=np.int64))
+    _apply_events(model, words, 'word', "word_counts", "words", MIN_WORD_POINTS)
+    _apply_events(model, amounts, 'amount', "amount_counts", "amounts", MIN_AMOUNT_POINTS, _amount_key)
+    
+    # Valores por dono: mesmas contagens, num "submodelo" por pessoa
+    owner_counts = model.setdefault("owner_amount_counts", {})
+    owner_winners = model.setdefault("owner_amounts", {})
+    for owner, events in _owned(amounts).groupby('owner', sort=False):
+        scope = {"counts": owner_counts.setdefault(owner, {}), "winners": owner_winners.setdefault(owner, {}),
+                 "next_seq": model["next_seq"]}
+        _apply_events(scope, events, 'amount', "counts", "winners", MIN_AMOUNT_POINTS, _amount_key)
+        model["next_seq"] = scope["next_seq"]
+        if not scope["counts"]:
+            owner_counts.pop(owner)
+        if not scope["winners"]:
+            owner_winners.pop(owner)
+
+
+def update(model, new_examples, weight=HISTORY_WEIGHT):
+    """
+    Incorpora novos exemplos rotulados ao modelo sem retreinar o histórico:
+    ajusta as contagens e recalcula o vencedor só das palavras/valores tocados.
+    Custo O(lote). Atualiza o modelo no lugar e o retorna.
+    
+    new_examples: iterável de (descricao, categoria, valor[, data]) - o mesmo
+    formato de gsheets.append_classifications. Peso padrão = feedback (5x).
+    """
+    rows = pd.DataFrame([tuple(ex)[:3] for ex in new_examples], columns=['Descricao', 'Categoria', 'Valor'])
+    _apply_rows(model, _history_rows(rows), 'Descricao', 'Categoria', 'Valor', weight, decimal_comma=True)
+    return _index_amounts(model)
+
+
+# ============================================================
+# MOTOR NAIVE BAYES (TF-IDF, matriz esparsa)
+# ============================================================
+# Alternativa ao "vencedor por palavra": guarda o log-likelihood de cada
+# (token, categoria) e pontua um lote de títulos com um único produto de
+# matrizes. Usa scipy.sparse se estiver instalado; senão, NumPy denso.
+ENGINE_PATTERNS = "padroes"
+ENGINE_NAIVE_BAYES = "naive_bayes"
+ENGINES = (ENGINE_PATTERNS, ENGINE_NAIVE_BAYES)
+NB_ALPHA = 1.0          # Suavização de Laplace
+_nb_cache = {}
+
+
+def _scipy_sparse():
+    """scipy.sparse, importado só quando o motor é usado (dependência opcional)."""
+    try:
+        from scipy import sparse
+    except ImportError:
+        return None
+    return sparse
+
+
+def _nb_word_events(hist, cur):
+    """Eventos (palavra, categoria, peso, doc) de histórico + atuais; `doc` numera as linhas."""
+    hist_words, _ = _row_events(hist, 'Descricao', 'Categoria', 'Valor', HISTORY_WEIGHT, decimal_comma=True)
+    cur_words, _ = _row_events(cur, 'title', 'category', 'amount', CURRENT_WEIGHT)
+    hist_words = hist_words.assign(doc=hist_words.index.to_numpy())
+    cur_words = cur_words.assign(doc=cur_words.index.to_numpy() + len(hist))
+    return pd.concat([p for p in (hist_words, cur_words) if not p.empty] or [hist_words], ignore_index=True)
+
+
+@_uses_vocabulary
+def build_naive_bayes(df, history_df=None, alpha=NB_ALPHA):
+    """
+    Treina o motor Naive Bayes multinomial com pesos TF-IDF.
+    
+    Cada token de um exemplo soma peso (5x histórico, 1x atuais) x idf do
+    token à contagem N[token, categoria]. O log-likelihood suavizado é
+    separado em duas partes para ficar esparso:
+        log P(t|c) = log((N[t,c] + a) / a) + log(a / (N[c] + a*V))
+    A primeira só é diferente de zero onde o token apareceu na categoria
+    ("likelihood", V x C); a segunda depende só da categoria ("baseline").
+    
+    O modelo também leva "amounts" (valor exato, como no motor de padrões)
+    e "words" (categoria mais provável de cada token, para exibição).
+    """
+    hist, cur = _history_rows(history_df), _current_rows(df)
+    events = _nb_word_events(hist, cur)
+    _, amount_totals, owner_totals, _ = _learn_totals(hist, cur)
+    model = {
+        "engine": ENGINE_NAIVE_BAYES,
+        "format": MODEL_FORMAT,
+        "amounts": _amount_winners(amount_totals),
+        "owner_amounts": _owner_amount_winners(owner_totals),
         "words": {},
-        "amounts": {}
+        "vocab": {},
+        "categories": [],
     }
+    _index_amounts(model)
+    if events.empty:
+        return model
+    
+    n_docs = len(hist) + len(cur)
+    token_codes, vocab = pd.factorize(events['word'].to_numpy(dtype=np.int64))
+    cat_codes, categories = pd.factorize(events['category'])
+    n_tokens, n_cats = len(vocab), len(categories)
     
-    for word, cat_counts in patterns.items():
-        if cat_counts:
-            most_common = max(cat_counts.items(), key=lambda x: x[1])
-            if most_common[1] >= 2:  # Pelo menos 2 pontos de confiança
-                learned["words"][word] = most_common[0]
+    # IDF suavizado: log((1 + n) / (1 + df)) + 1
+    doc_freq = pd.Series(token_codes).groupby(events['doc'].to_numpy()).unique().explode()
+    doc_freq = np.bincount(doc_freq.to_numpy(dtype=np.int64), minlength=n_tokens)
+    idf = np.log((1.0 + n_docs) / (1.0 + doc_freq)) + 1.0
+    
+    counts = np.zeros((n_tokens, n_cats))
+    np.add.at(counts, (token_codes, cat_codes), events['weight'].to_numpy(dtype=float) * idf[token_codes])
+    cat_totals = counts.sum(axis=0)
+    
+    # Prior pelo peso dos exemplos (linhas) de cada categoria
+    doc_cats = events.drop_duplicates('doc')
+    prior = doc_cats.groupby('category', sort=False)['weight'].sum().reindex(categories).to_numpy(dtype=float)
+    
+    rows, cols = np.nonzero(counts)
+    values = np.log((counts[rows, cols] + alpha) / alpha)
+    sparse = _scipy_sparse()
+    if sparse is not None:
+        likelihood = sparse.csr_matrix((values, (rows, cols)), shape=(n_tokens, n_cats))
+    else:
+        likelihood = np.zeros((n_tokens, n_cats))
+        likelihood[rows, cols] = values
+    
+    best = counts.argmax(axis=1)
+    model.update({
+        "words": dict(zip(VOCABULARY.tokens(vocab).tolist(), categories[best].tolist())),
+        "vocab": {token: i for i, token in enumerate(VOCABULARY.tokens(vocab).tolist())},
+        "categories": categories.tolist(),
+        "idf": idf,
+        "likelihood": likelihood,
+        "baseline": np.log(alpha / (cat_totals + alpha * n_tokens)),
+        "log_prior": np.log(prior / prior.sum()),
+    })
+    return model
 
-    for val, cat_counts in amount_patterns.items():
-        if cat_counts:
-            most_common = max(cat_counts.items(), key=lambda x: x[1])
-            # Exige mais confiança para valor exato (pelo menos 3 pontos), pois valores podem coincidir
-            if most_common[1] >= 3: 
-                learned["amounts"][val] = most_common[0]
-                
-    return learned
 
-def suggest_category_from_learned(title, learned_patterns, amount=None):
+@_uses_vocabulary
+def _nb_features(model, titles):
+    """
+    Tokens conhecidos de cada título como triplas (linha, coluna do
+    vocabulário do modelo, idf). Tokens repetidos num título aparecem
+    repetidos: as somas da pontuação fazem o papel do tf.
+    """
+    rows, ids = tokenize_ids(titles)
+    columns = VOCABULARY.lookup(model["vocab"])[ids]
+    known = columns >= 0
+    rows, columns = rows[known], columns[known]
+    return rows, columns, model["idf"][columns]
+
+
+def naive_bayes_scores(model, titles):
+    """
+    Probabilidade de cada categoria para cada título (softmax dos escores).
+    
+    Os escores somam log P(t|c) ponderado por tf-idf com um produto
+    esparso (títulos x vocabulário) @ (vocabulário x categorias). A parte de
+    verossimilhança é dividida pelo peso total dos tokens do título (média
+    por token): sem isso o Naive Bayes dá ~100% de confiança a qualquer
+    título com várias palavras, e a confiança deixa de servir de limiar.
+    
+    Returns:
+        (matriz n x C de probabilidades, máscara dos títulos com algum token conhecido)
+    """
+    n = len(titles)
+    n_cats = len(model.get("categories", []))
+    if n == 0 or n_cats == 0:
+        return np.zeros((n, n_cats)), np.zeros(n, dtype=bool)
+    
+    rows, tokens, weights = _nb_features(model, titles)
+    likelihood = model["likelihood"]
+    sparse = _scipy_sparse()
+    if sparse is not None and sparse.issparse(likelihood):
+        features = sparse.csr_matrix((weights, (rows, tokens)), shape=(n, len(model["vocab"])))
+        loglik = np.asarray((features @ likelihood).todense())
+    else:
+        dense = likelihood.toarray() if hasattr(likelihood, "toarray") else likelihood
+        loglik = np.zeros((n, n_cats))
+        np.add.at(loglik, rows, weights[:, None] * dense[tokens])
+    
+    length = np.bincount(rows, weights=weights, minlength=n)
+    known = length > 0
+    scores = model["log_prior"] + (loglik + length[:, None] * model["baseline"]) / np.maximum(length, 1e-12)[:, None]
+    scores -= scores.max(axis=1, keepdims=True)
+    probs = np.exp(scores)
+    probs /= probs.sum(axis=1, keepdims=True)
+    return probs, known
+
+
+# ============================================================
+# MODELO CACHEADO (memória + disco), versionado pelos dados de entrada
+# ============================================================
+# Se as entradas mudarem pouco (ex: Mágico aplicou categorias e o histórico
+# ganhou as linhas de feedback), o modelo em memória é ajustado só com as
+# linhas que entraram/saíram (update), sem retreinar.
+MAX_INCREMENTAL_ROWS = 500        # Até 500 linhas alteradas: sempre incremental
+MAX_INCREMENTAL_FRACTION = 0.2    # Acima disso, só se for até 20% da base
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+
+
+def _row_fingerprints(rows):
+    """Fingerprint (uint64) de cada linha de treino."""
+    if rows.empty:
+        return pd.Series([], dtype='uint64')
+    return pd.util.hash_pandas_object(rows.astype(str), index=False)
+
+
+def _version(hist, hist_fp, cur, cur_fp):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"format={MODEL_FORMAT}".encode())
+    for rows, fp in ((hist, hist_fp), (cur, cur_fp)):
+        h.update(b"|" + ",".join(map(str, rows.columns)).encode() + b"|")
+        h.update(fp.to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def model_version(df, history_df=None):
+    """
+    Versão do modelo = hash dos fingerprints das linhas que entram no
+    aprendizado (histórico + transações categorizadas, na ordem) e do formato.
+    """
+    hist, cur = _history_rows(history_df), _current_rows(df)
+    return _version(hist, _row_fingerprints(hist), cur, _row_fingerprints(cur))
+
+
+def _row_delta(old_rows, old_fp, new_rows, new_fp):
+    """Linhas que entraram e que saíram (comparação de multiconjuntos de fingerprints)."""
+    diff = pd.Series(new_fp.to_numpy()).value_counts().sub(
+        pd.Series(old_fp.to_numpy()).value_counts(), fill_value=0)
+
+    def take(rows, fp, counts):
+        if counts.empty:
+            return rows.iloc[:0]
+        fps = pd.Series(fp.to_numpy())
+        limit = fps.map(counts)
+        return rows[(limit.notna() & (fps.groupby(fps).cumcount() < limit)).to_numpy()]
+
+    return take(new_rows, new_fp, diff[diff > 0]), take(old_rows, old_fp, -diff[diff < 0])
+
+
+def _model_path():
+    return os.path.join(MODEL_DIR, "learned_patterns.json")
+
+
+def save_model(model):
+    """Grava o modelo em disco (JSON; chaves de valor como lista de pares)."""
+    try:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        payload = {
+            "format": MODEL_FORMAT,
+            "version": model["version"],
+            "words": model["words"],
+            "amounts": [[k, v] for k, v in model["amounts"].items()],
+            "word_counts": model["word_counts"],
+            "amount_counts": [[k, v] for k, v in model["amount_counts"].items()],
+            "owner_amounts": {o: [[k, v] for k, v in p.items()] for o, p in model.get("owner_amounts", {}).items()},
+            "owner_amount_counts": {o: [[k, v] for k, v in c.items()]
+                                    for o, c in model.get("owner_amount_counts", {}).items()},
+            "next_seq": model["next_seq"],
+        }
+        tmp = _model_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp, _model_path())
+    except Exception as e:
+        print(f"Aviso: não foi possível gravar o modelo do Mágico: {e}")
+
+
+def load_model(version):
+    """Lê o modelo do disco se for do formato atual e da `version` pedida; senão None."""
+    try:
+        with open(_model_path(), "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get("format") != MODEL_FORMAT or payload.get("version") != version:
+        return None
+    return _index_amounts({
+        "format": MODEL_FORMAT,
+        "version": version,
+        "words": payload["words"],
+        "amounts": {float(k): v for k, v in payload["amounts"]},
+        "word_counts": payload["word_counts"],
+        "amount_counts": {float(k): v for k, v in payload["amount_counts"]},
+        "owner_amounts": {o: {float(k): v for k, v in p} for o, p in payload["owner_amounts"].items()},
+        "owner_amount_counts": {o: {float(k): v for k, v in c} for o, c in payload["owner_amount_counts"].items()},
+        "next_seq": payload["next_seq"],
+    })
+
+
+def _copy_model(model):
+    """
+    Cópia do modelo para ajuste incremental: o modelo em cache pode estar sendo
+    lido por outras threads (sessões), então nunca é alterado no lugar.
+    O AmountIndex (imutável) é compartilhado até os valores mudarem.
+    """
+    def counts(c):
+        return {k: {cat: list(pc) for cat, pc in cats.items()} for k, cats in c.items()}
+    copy = dict(model)
+    copy["words"] = dict(model["words"])
+    copy["amounts"] = dict(model["amounts"])
+    copy["word_counts"] = counts(model["word_counts"])
+    copy["amount_counts"] = counts(model["amount_counts"])
+    copy["owner_amounts"] = {o: dict(p) for o, p in model.get("owner_amounts", {}).items()}
+    copy["owner_amount_counts"] = {o: counts(c) for o, c in model.get("owner_amount_counts", {}).items()}
+    return copy
+
+
+def get_learned_patterns(df, history_df=None, engine=ENGINE_PATTERNS):
+    """
+    Modelo aprendido (mesmo formato de learn_patterns_from_data + contagens e
+    'version'), reaproveitado da memória ou do disco enquanto as entradas não
+    mudarem. Mudanças pequenas são aplicadas (em uma cópia, trocada no cache
+    de uma vez) com update(); só retreina do zero quando não há modelo anterior
+    ou a mudança é grande.
+    
+    engine=ENGINE_NAIVE_BAYES devolve o motor Naive Bayes (build_naive_bayes),
+    cacheado só em memória pela mesma versão; o retreino é vetorizado.
+    """
+    hist, cur = _history_rows(history_df), _current_rows(df)
+    hist_fp, cur_fp = _row_fingerprints(hist), _row_fingerprints(cur)
+    version = _version(hist, hist_fp, cur, cur_fp)
+    
+    if engine == ENGINE_NAIVE_BAYES:
+        with _model_cache_lock:
+            model = _nb_cache.get(version)
+        if model is None:
+            model = build_naive_bayes(df, history_df)
+            model["version"] = version
+            with _model_cache_lock:
+                _nb_cache.clear()
+                _nb_cache[version] = model
+        return model
+    
+    with _model_cache_lock:
+        cached = dict(_model_cache)
+    model = cached.get("model")
+    if model is not None and model["version"] == version:
+        return model
+    
+    if model is not None:
+        hist_added, hist_removed = _row_delta(cached["hist"], cached["hist_fp"], hist, hist_fp)
+        cur_added, cur_removed = _row_delta(cached["cur"], cached["cur_fp"], cur, cur_fp)
+        changed = len(hist_added) + len(hist_removed) + len(cur_added) + len(cur_removed)
+        if changed > max(MAX_INCREMENTAL_ROWS, MAX_INCREMENTAL_FRACTION * (len(hist) + len(cur))):
+            model = None
+        else:
+            model = _copy_model(model)
+            _apply_rows(model, hist_removed, 'Descricao', 'Categoria', 'Valor', -HISTORY_WEIGHT, decimal_comma=True)
+            _apply_rows(model, cur_removed, 'title', 'category', 'amount', -CURRENT_WEIGHT)
+            _apply_rows(model, hist_added, 'Descricao', 'Categoria', 'Valor', HISTORY_WEIGHT, decimal_comma=True)
+            _apply_rows(model, cur_added, 'title', 'category', 'amount', CURRENT_WEIGHT)
+            _index_amounts(model)
+            model["version"] = version
+            save_model(model)
+    
+    if model is None:
+        model = load_model(version)
+    if model is None:
+        model = build_model(df, history_df)
+        model["version"] = version
+        save_model(model)
+    with _model_cache_lock:
+        _model_cache.update({"model": model, "hist": hist, "hist_fp": hist_fp, "cur": cur, "cur_fp": cur_fp})
+    return model
+
+
+def suggest_category_from_learned(title, learned_patterns, amount=None, owner=None, amount_tolerance=0):
     """
     Tenta sugerir uma categoria baseado nos padrões aprendidos.
-    Prioridade: Valor Exato > Palavras-Chave.
+    Prioridade: Valor Exato (do dono, depois geral) > Palavras-Chave.
+    amount_tolerance: aceita valor aprendido a até ±N centavos.
     """
     if not learned_patterns:
         return None
+    if learned_patterns.get("engine") == ENGINE_NAIVE_BAYES:
+        result = suggest_from_learned_frame(pd.Series([title]), pd.Series([amount]), learned_patterns,
+                                            owners=[owner], amount_tolerance=amount_tolerance)
+        return result["category"].iloc[0]
         
-    # 1. Tentar por Valor Exato
+    # 1. Tentar por Valor Exato (em centavos)
     if amount is not None:
-        try:
-            val = float(amount)
-            if val in learned_patterns.get("amounts", {}):
-                return learned_patterns["amounts"][val]
-        except: pass
+        category = _amount_index(learned_patterns).lookup([amount], [owner], amount_tolerance)[0]
+        if category is not None:
+            return category
     
     # 2. Tentar por Palavras-Chave
     if not title: return None
@@ -126,3 +888,135 @@ def suggest_category_from_learned(title, learned_patterns, amount=None):
         return best_match[0]
     
     return None
+
+
+def _amount_candidates(amounts, learned_patterns, owners=None, tolerance=0):
+    """
+    Valor exato: uma candidata (score 1.0) por linha cujo valor foi aprendido.
+    Busca indexada: o AmountIndex do modelo (centavos ordenados) é consultado
+    uma vez por lote.
+    """
+    index = _amount_index(learned_patterns)
+    if amounts is None or not len(index):
+        return pd.DataFrame(columns=["row", "category", "score", "prio", "source"])
+    found = index.lookup(amounts, owners, tolerance)
+    rows = np.flatnonzero(pd.notna(found))
+    return pd.DataFrame({"row": rows, "category": found[rows], "score": 1.0, "prio": -1, "source": "valor"})
+
+
+@_uses_vocabulary
+def _word_candidates(unique_titles, learned_patterns, k):
+    """
+    As k melhores categorias por palavras de cada título único:
+    (title, category, score, prio), prio = posição no ranking.
+    - Padrões: score = fração dos votos; empate -> primeiro voto no título.
+    - Naive Bayes: score = probabilidade (naive_bayes_scores).
+    """
+    empty = pd.DataFrame(columns=["title", "category", "score", "prio"])
+    if not learned_patterns.get("words") or len(unique_titles) == 0:
+        return empty
+    
+    if learned_patterns.get("engine") == ENGINE_NAIVE_BAYES:
+        probs, known = naive_bayes_scores(learned_patterns, unique_titles)
+        k = min(k, probs.shape[1])
+        top = np.argsort(-probs, axis=1, kind="stable")[known, :k]
+        titles = np.repeat(np.flatnonzero(known), k)
+        return pd.DataFrame({
+            "title": titles,
+            "category": np.asarray(learned_patterns["categories"], dtype=object)[top.ravel()],
+            "score": probs[titles, top.ravel()],
+            "prio": np.tile(np.arange(k), len(top)),
+        })
+    
+    unique_titles = pd.Series(unique_titles)
+    pos, ids = tokenize_ids(unique_titles)
+    word_patterns = learned_patterns["words"]
+    cat_codes, cat_names = pd.factorize(pd.Series(list(word_patterns.values()), dtype=object))
+    votes = pd.DataFrame({
+        "title": unique_titles.index.to_numpy()[pos],
+        "pos": pd.Series(pos).groupby(pos).cumcount().to_numpy(),
+        "category": VOCABULARY.lookup(dict(zip(word_patterns, cat_codes)))[ids],
+    })
+    votes = votes[votes["category"] >= 0]
+    if votes.empty:
+        return empty
+    
+    per_cat = votes.groupby(["title", "category"], sort=False).agg(votes=("pos", "size"), first=("pos", "min")).reset_index()
+    per_cat["category"] = np.asarray(cat_names, dtype=object)[per_cat["category"].to_numpy()]
+    per_cat["score"] = per_cat["votes"] / per_cat.groupby("title")["votes"].transform("sum")
+    # Mais votos vence; empate -> categoria cujo primeiro voto aparece antes no título
+    per_cat = per_cat.sort_values(["title", "votes", "first"], ascending=[True, False, True])
+    per_cat["prio"] = per_cat.groupby("title").cumcount()
+    return per_cat.loc[per_cat["prio"] < k, ["title", "category", "score", "prio"]]
+
+
+def suggest_batch(titles, amounts=None, learned_patterns=None, k=3, owners=None, amount_tolerance=0):
+    """
+    As k melhores sugestões para cada transação, em uma chamada vetorizada.
+    Cada título distinto é tokenizado e pontuado uma vez só; os valores são
+    consultados numa tabela indexada. Prioridade igual à de
+    suggest_category_from_learned: valor exato (score 1.0) primeiro, depois
+    as categorias das palavras, sem repetir categoria.
+    owners / amount_tolerance: como em AmountIndex.lookup.
+    
+    Returns:
+        DataFrame (mesmo índice de `titles`) com colunas category_1..k e
+        score_1..k (None / 0.0 onde não há sugestão) e source ("valor",
+        "palavras" ou None) da primeira sugestão.
+    """
+    titles = pd.Series(titles)
+    n = len(titles)
+    categories = np.full((n, k), None, dtype=object)
+    scores = np.zeros((n, k))
+    sources = np.full(n, None, dtype=object)
+    
+    if learned_patterns and n:
+        valid = (titles.notna() & (titles.astype(str) != "")).to_numpy()
+        codes, unique = pd.factorize(titles.astype(str).where(valid, ""))
+        words = _word_candidates(pd.Series(unique), learned_patterns, k)
+        # Candidatas do título único -> todas as linhas com esse título
+        rows = pd.DataFrame({"row": np.arange(n), "title": codes})[valid]
+        words = rows.merge(words, on="title").drop(columns="title").assign(source="palavras")
+        amount_values = None if amounts is None else pd.Series(amounts).to_numpy()
+        owner_values = None if owners is None else pd.Series(owners).to_numpy(dtype=object)
+        by_amount = _amount_candidates(amount_values, learned_patterns, owner_values, amount_tolerance)
+        parts = [c for c in (by_amount, words) if not c.empty]
+        if parts:
+            candidates = (pd.concat(parts, ignore_index=True)
+                          .sort_values(["row", "prio"], kind="stable")
+                          .drop_duplicates(["row", "category"]))
+            row = candidates["row"].to_numpy(dtype=np.int64)
+            rank = candidates.groupby("row").cumcount().to_numpy()
+            keep = rank < k
+            categories[row[keep], rank[keep]] = candidates["category"].to_numpy()[keep]
+            scores[row[keep], rank[keep]] = candidates["score"].to_numpy(dtype=float)[keep]
+            sources[row[rank == 0]] = candidates["source"].to_numpy()[rank == 0]
+    
+    result = pd.DataFrame(index=titles.index)
+    for i in range(k):
+        result[f"category_{i + 1}"] = pd.Series(categories[:, i], index=titles.index, dtype=object)
+        result[f"score_{i + 1}"] = scores[:, i]
+    result["source"] = pd.Series(sources, index=titles.index, dtype=object)
+    return result
+
+
+def suggest_from_learned_frame(titles, amounts, learned_patterns, owners=None, amount_tolerance=0):
+    """
+    Versão vetorizada de suggest_category_from_learned para várias transações
+    (a primeira sugestão de suggest_batch). Mesma prioridade (Valor Exato >
+    Palavras-Chave) e mesmo desempate entre categorias com o mesmo número de
+    votos (a que aparece primeiro no título).
+    
+    Returns:
+        DataFrame (mesmo índice de `titles`) com colunas:
+        - category: sugestão ou None
+        - source: "valor", "palavras" ou None
+        - confidence: 1.0 para valor exato; fração dos votos para palavras
+          (no motor Naive Bayes: probabilidade da categoria sugerida)
+    """
+    batch = suggest_batch(titles, amounts, learned_patterns, k=1, owners=owners, amount_tolerance=amount_tolerance)
+    return pd.DataFrame({
+        "category": batch["category_1"],
+        "source": batch["source"],
+        "confidence": batch["score_1"],
+    })
@@ -0,0 +1,165 @@
+"""
+Rate limiters (token bucket) para as APIs do Google.
+Usados pelo gsheets.py para respeitar as cotas de leitura e escrita.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+BURST_FRACTION = 0.1
+
+
+def split_quota(limit, burst_fraction=BURST_FRACTION, strict=False):
+    """
+    (rate, capacity) de um balde para uma cota de `limit` chamadas por `per`
+    segundos, com rajada de burst_fraction * limit.
+    - Padrão: reposição na cota cheia (vazão sustentada = limit) e a rajada
+      só como capacidade. Em uma janela cabem até limit + capacity chamadas:
+      deixe essa margem abaixo da cota real (ex: gsheets usa 55/min com
+      rajada de 5 para a cota de 60/min do Google).
+    - strict=True: nenhuma janela passa de `limit` (a rajada sai da
+      reposição, vazão sustentada = limit - capacity). Para cotas rígidas
+      sem margem.
+    Ex: 55/min -> (55, 5); strict -> (50, 5).
+    """
+    capacity = max(1, int(limit * burst_fraction))
+    if strict:
+        return max(1, limit - capacity), capacity
+    return limit, capacity
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: `rate` tokens a cada `per` segundos, com rajada
+    de até `capacity` tokens (padrão: 1, sem rajada). Em qualquer janela de
+    `per` segundos passam no máximo capacity + rate chamadas; para dimensionar
+    a partir de uma cota "N por minuto", use split_quota(N).
+
+    Quem chama reserva o token dentro do lock e dorme FORA dele: o saldo pode
+    ficar negativo, e cada chamada espera exatamente até o seu token existir.
+    Assim várias threads esperam em paralelo, cada uma na sua vez, sem que o
+    lock fique preso durante o sleep.
+
+    clock/sleep: relógio monotônico e função de espera (substituíveis em testes).
+    """
+
+    def __init__(self, rate, per=60.0, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate) / float(per)  # tokens por segundo
+        self.capacity = float(capacity if capacity is not None else 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def reconfigure(self, rate, per=60.0, capacity=None):
+        """
+        Muda taxa e rajada sem perder o saldo: reservas já feitas (saldo
+        negativo) continuam valendo, e o saldo nunca passa da nova rajada.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.rate = float(rate) / float(per)
+            self.capacity = float(capacity if capacity is not None else 1)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def reserve(self, tokens=1):
+        """Reserva `tokens` e retorna quantos segundos esperar até poder usá-los (sem dormir)."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """Reserva e espera. Retorna o tempo de espera (0.0 se havia saldo)."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket compartilhado entre PROCESSOS locais (vários workers do Streamlit,
+    jobs em background) via SQLite. A cota do Google é por usuário/projeto, então
+    todos os processos que usam a mesma service account precisam dividir o saldo.
+
+    Cada reserva é uma transação `BEGIN IMMEDIATE` (lock de escrita do SQLite):
+    lê o saldo, repõe pelo tempo decorrido, debita e grava. O sleep continua
+    fora de qualquer lock. Se o SQLite falhar (ex: disco somente leitura), cai
+    para um bucket em memória, só deste processo.
+    """
+
+    def __init__(self, path, name, rate, per=60.0, capacity=None):
+        super().__init__(rate, per=per, capacity=capacity)
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+        self._fallback = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = self._conn()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        except (sqlite3.Error, OSError) as e:
+            self._use_fallback(e)
+
+    def _conn(self):
+        """Uma conexão por thread (conexões sqlite3 não são compartilháveis entre threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def reconfigure(self, rate, per=60.0, capacity=None):
+        """O saldo fica no SQLite (intocado); só a taxa/rajada deste processo muda."""
+        self.rate = float(rate) / float(per)
+        self.capacity = float(capacity if capacity is not None else 1)
+        if self._fallback is not None:
+            self._fallback.reconfigure(rate, per, capacity)
+
+    def _use_fallback(self, error):
+        print(f"Aviso: rate limiter compartilhado indisponível ({error}). Usando limite local.")
+        self._fallback = TokenBucket(self.rate * 60.0, per=60.0, capacity=self.capacity)
+
+    def reserve(self, tokens=1):
+        if self._fallback is not None:
+            return self._fallback.reserve(tokens)
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                # Relógio de parede: é o único comum a todos os processos
+                now = time.time()
+                if row is None:
+                    available = self.capacity
+                else:
+                    available = min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+                available -= tokens
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                    (self.name, available, now),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self._use_fallback(e)
+            return self._fallback.reserve(tokens)
+        return 0.0 if available >= 0 else -available / self.rate
@@ -0,0 +1,204 @@
+"""
+Teste da classificação em lotes (ai_utils.classify_transactions_gemini):
+deduplicação, lotes por orçamento de tokens, paralelismo, retry em 429 e
+cache de respostas, com um modelo falso no lugar do Gemini (sem rede).
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import ai_utils
+from llm_cache import LLMCache
+from rate_limiter import TokenBucket
+
+
+class FakeModel:
+    """Responde {descrição: categoria} do prompt; falha com 429 nas primeiras `fail_first` chamadas."""
+
+    def __init__(self, latency=0.05, fail_first=0):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        descriptions = json.loads(prompt.split("Transações para classificar:")[1].strip())
+        with self.lock:
+            self.calls.append(descriptions)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            fail = len(self.calls) <= self.fail_first
+        try:
+            time.sleep(self.latency)
+            if fail:
+                raise Exception("429 Resource has been exhausted")
+            answer = {d: ("Transporte" if "uber" in d.lower() else "Outros") for d in descriptions}
+            return type("Response", (), {"text": "```json\n" + json.dumps(answer) + "\n```"})()
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_classify_batches():
+    print("=" * 60)
+    print("TESTE DA CLASSIFICAÇÃO EM LOTES (IA)")
+    print("=" * 60)
+
+    original_get_model = ai_utils._get_model
+    original_delay = ai_utils.RETRY_INITIAL_DELAY
+    ai_utils.RETRY_INITIAL_DELAY = 0.01
+    ai_utils.AI_CACHE_ENABLED = False
+    limiter = TokenBucket(10_000, per=1.0)
+    try:
+        # 1. Repetidas e variações de caixa/espaço vão uma vez só
+        model = FakeModel()
+        ai_utils._get_model = lambda api_key: model
+        descriptions = ["Uber *Trip", "UBER  *trip", "Padaria", "Uber *Trip", "", None]
+        result = ai_utils.classify_transactions_gemini(descriptions, ["Transporte", "Outros"], "key", limiter=limiter)
+        print(f"\n1. {result}")
+        assert result == {"Uber *Trip": "Transporte", "UBER  *trip": "Transporte", "Padaria": "Outros"}
+        assert len(model.calls) == 1 and len(model.calls[0]) == 2
+
+        # 2. 2.000 descrições: vários lotes dentro do orçamento, em paralelo
+        model = FakeModel(latency=0.05)
+        ai_utils._get_model = lambda api_key: model
+        many = [f"Loja {i} Centro" for i in range(2_000)]
+        start = time.perf_counter()
+        result = ai_utils.classify_transactions_gemini(many, ["Outros"], "key", max_workers=8, limiter=limiter)
+        elapsed = time.perf_counter() - start
+        print(f"2. {len(result)} descrições em {len(model.calls)} lotes, {elapsed * 1000:.0f} ms, "
+              f"até {model.max_active} em paralelo")
+        assert len(result) == 2_000 and len(model.calls) > 1
+        for chunk in model.calls:
+            used = sum(ai_utils.estimate_tokens(json.dumps(d)) + 1 for d in chunk)
+            assert used <= ai_utils.CHUNK_TOKEN_BUDGET and len(chunk) <= ai_utils.MAX_CHUNK_ITEMS
+        assert model.max_active > 1
+
+        # 3. 429 nas primeiras chamadas: retry com backoff, sem perder lotes
+        model = FakeModel(latency=0.0, fail_first=2)
+        ai_utils._get_model = lambda api_key: model
+        result = ai_utils.classify_transactions_gemini(["Uber", "Padaria"], ["Outros"], "key", limiter=limiter)
+        print(f"3. Após 2 erros 429: {result} ({len(model.calls)} chamadas)")
+        assert result == {"Uber": "Transporte", "Padaria": "Outros"} and len(model.calls) == 3
+
+        # Sem chave, nada é enviado
+        assert ai_utils.classify_transactions_gemini(["Uber"], ["Outros"], "") == {}
+    finally:
+        ai_utils._get_model = original_get_model
+        ai_utils.RETRY_INITIAL_DELAY = original_delay
+        ai_utils.AI_CACHE_ENABLED = True
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_response_cache():
+    print("=" * 60)
+    print("TESTE DO CACHE DE RESPOSTAS DA IA")
+    print("=" * 60)
+
+    original_get_model = ai_utils._get_model
+    model = FakeModel(latency=0.0)
+    ai_utils._get_model = lambda api_key: model
+    cache = LLMCache(path=os.path.join(tempfile.mkdtemp(), "llm.sqlite3"), max_entries=3)
+    limiter = TokenBucket(10_000, per=1.0)
+    categories = ["Transporte", "Outros"]
+    try:
+        # 1. Primeira vez vai para a API; no mês seguinte só o que é novo
+        ai_utils.classify_transactions_gemini(["Uber *Trip", "Padaria"], categories, "key", limiter=limiter, cache=cache)
+        result = ai_utils.classify_transactions_gemini(["UBER *TRIP", "Padaria", "Farmacia"], categories, "key",
+                                                       limiter=limiter, cache=cache)
+        print(f"\n1. {result} | chamadas: {model.calls} | {cache.stats()}")
+        assert result == {"UBER *TRIP": "Transporte", "Padaria": "Outros", "Farmacia": "Outros"}
+        assert model.calls == [["Uber *Trip", "Padaria"], ["Farmacia"]]
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 3, 3)
+
+        # 2. Outra lista de categorias não reaproveita as respostas
+        assert cache.get_many(["padaria"], categories + ["Mercado"]) == {}
+        assert cache.get_many(["padaria"], list(reversed(categories))) == {"padaria": "Outros"}
+
+        # 3. LRU: acima de max_entries sai a menos usada ('farmacia' foi lida por último, 'uber *trip' não)
+        cache.get_many(["padaria", "farmacia"], categories)
+        cache.put_many({"posto": "Transporte"}, categories)
+        assert set(cache.get_many(["uber *trip", "padaria", "farmacia", "posto"], categories)) == {"padaria", "farmacia", "posto"}
+
+        # 4. TTL: entradas vencidas não valem
+        cache.ttl = -1
+        assert cache.get_many(["padaria"], categories) == {}
+        assert cache.evict() == 3 and cache.stats()["entries"] == 0
+        print("2. Lista de categorias, LRU e TTL OK")
+    finally:
+        ai_utils._get_model = original_get_model
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_local_backend():
+    print("=" * 60)
+    print("TESTE DO BACKEND LOCAL (SEM REDE)")
+    print("=" * 60)
+
+    original_delay = ai_utils.RETRY_INITIAL_DELAY
+    ai_utils.RETRY_INITIAL_DELAY = 0.01
+    limiter = TokenBucket(10_000, per=1.0)
+    categories = ["Transporte (Uber/99)", "Academia", "Outros"]
+    try:
+        # 1. Regras fixas + padrões aprendidos; categoria fora da lista -> Outros
+        backend = ai_utils.LocalBackend(learned_patterns={"words": {"smartfit": "Academia"}, "amounts": {}})
+        result = ai_utils.classify_transactions(["Uber *Trip", "SmartFit Paulista", "Supermercado X", "Loja Y"],
+                                                categories, backend, limiter=limiter, cache=False)
+        print(f"\n1. {result}")
+        assert result == {"Uber *Trip": "Transporte (Uber/99)", "SmartFit Paulista": "Academia",
+                          "Supermercado X": "Outros", "Loja Y": "Outros"}
+
+        # Regras injetadas no lugar das regras fixas do utils; a interface é abstrata
+        backend = ai_utils.LocalBackend(rules=lambda titles: titles.map(lambda t: "Academia"))
+        assert backend.classify_chunk(["Loja Y"], categories) == {"Loja Y": "Academia"}
+        try:
+            ai_utils.ClassifierBackend()
+            raise AssertionError("ClassifierBackend sem classify_chunk não deveria instanciar")
+        except TypeError:
+            pass
+
+        # 2. Latência e 429 injetados: retry cobre os 429, falhas ficam de fora; mesma semente = mesmo resultado
+        # (um worker só: com vários, a ordem em que os lotes recebem os sorteios varia)
+        many = [f"Loja {i}" for i in range(3_000)]
+        runs = []
+        for _ in range(2):
+            backend = ai_utils.LocalBackend(latency=0.01, rate_limit_rate=0.3, failure_rate=0.05, seed=42)
+            start = time.perf_counter()
+            result = ai_utils.classify_transactions(many, categories, backend, max_workers=1, limiter=limiter, cache=False)
+            elapsed = time.perf_counter() - start
+            runs.append((len(result), backend.calls, backend.rate_limited, backend.failures))
+            print(f"2. {len(result)}/{len(many)} classificadas em {elapsed * 1000:.0f} ms: "
+                  f"{backend.calls} chamadas, {backend.rate_limited} x 429, {backend.failures} falhas")
+        assert runs[0] == runs[1]
+        assert runs[0][2] > 0 and len(many) > runs[0][0] > 0
+
+        # 3. Selecionado por AI_BACKEND=local, sem chave de API
+        original_backend = ai_utils.AI_BACKEND
+        ai_utils.AI_BACKEND = "local"
+        try:
+            assert isinstance(ai_utils.get_backend(), ai_utils.LocalBackend)
+            assert ai_utils.classify_transactions_gemini(["Uber"], categories, "", cache=False) == {"Uber": "Transporte (Uber/99)"}
+        finally:
+            ai_utils.AI_BACKEND = original_backend
+    finally:
+        ai_utils.RETRY_INITIAL_DELAY = original_delay
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_classify_batches()
+        test_response_cache()
+        test_local_backend()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
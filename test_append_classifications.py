@@ -0,0 +1,92 @@
+"""
+Teste do envio em lote dos exemplos de treinamento (gsheets.append_classifications)
+"""
+import sys
+
+import pandas as pd
+
+import gsheets
+
+
+class FakeWorksheet:
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+
+    def row_values(self, n):
+        self.calls.append("row_values")
+        return self.rows[n - 1] if len(self.rows) >= n else []
+
+    def append_rows(self, rows, value_input_option=None):
+        self.calls.append("append_rows")
+        self.rows.extend(rows)
+
+
+def test_append_classifications():
+    print("=" * 60)
+    print("TESTE DO ENVIO EM LOTE DE CLASSIFICAÇÕES")
+    print("=" * 60)
+
+    ws = FakeWorksheet()
+    appended = []
+    listener = lambda sid, count: appended.append((sid, count))
+    gsheets.add_classification_listener(listener)
+    originals = (gsheets.get_gspread_client, gsheets._get_spreadsheet, gsheets._get_or_create_worksheet)
+    gsheets.get_gspread_client = lambda: None
+    gsheets._get_spreadsheet = lambda client, spreadsheet_id: None
+    gsheets._get_or_create_worksheet = lambda spreadsheet, title: ws
+    try:
+        # 1. Aba vazia: header + 200 exemplos em um único append
+        with gsheets.ClassificationBuffer("planilha_teste") as feedback:
+            for i in range(200):
+                feedback.add(f"LOJA {i}", "Outros", 10.5 + i, "2024-01-05")
+        print(f"\n1. Chamadas para 200 exemplos: {ws.calls}")
+        assert ws.calls == ["row_values", "append_rows"]
+        assert ws.rows[0] == ["Descricao", "Categoria", "Data", "Valor"]
+        assert ws.rows[1] == ["LOJA 0", "Outros", "2024-01-05", "10,5"]
+        assert len(ws.rows) == 201
+        assert appended == [("planilha_teste", 200)]
+
+        # 2. Header já verificado nesta sessão: só o append
+        ws.calls.clear()
+        gsheets.append_classification("PADARIA", "Lazer/Restaurantes", spreadsheet_id="planilha_teste")
+        print(f"2. Chamadas para 1 exemplo (header já verificado): {ws.calls}")
+        assert ws.calls == ["append_rows"]
+        assert ws.rows[-1] == ["PADARIA", "Lazer/Restaurantes", "", ""]
+
+        # 3. Buffer vazio não chama a API
+        ws.calls.clear()
+        assert gsheets.ClassificationBuffer("planilha_teste").flush() == 0
+        assert ws.calls == []
+
+        # 4. Exemplos gravados na planilha de classificações: histórico do Mágico recarregado
+        import utils
+        reads = []
+        original_read = gsheets.read_classification_dataset
+        gsheets.read_classification_dataset = lambda: reads.append(1) or pd.DataFrame()
+        try:
+            utils.load_ml_history_cached.clear()
+            utils.load_ml_history_cached()
+            utils.load_ml_history_cached()
+            gsheets.append_classification("PADARIA", "Lazer/Restaurantes", spreadsheet_id=gsheets.CLASSIFICATION_ID)
+            utils.load_ml_history_cached()
+            print(f"4. Leituras do histórico (2 chamadas + 1 após append): {len(reads)}")
+            assert len(reads) == 2
+        finally:
+            gsheets.read_classification_dataset = original_read
+            utils.load_ml_history_cached.clear()
+    finally:
+        gsheets.get_gspread_client, gsheets._get_spreadsheet, gsheets._get_or_create_worksheet = originals
+        gsheets._classification_listeners.remove(listener)
+        gsheets._classification_header_checked.discard(gsheets.CLASSIFICATION_ID)
+        gsheets._classification_header_checked.discard("planilha_teste")
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_append_classifications()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
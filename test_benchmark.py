@@ -0,0 +1,75 @@
+"""
+Teste do benchmark ponta a ponta (benchmark.py): bases sintéticas e uma
+rodada pequena de todas as etapas contra o Google Sheets falso.
+"""
+import json
+import os
+import sys
+
+import benchmark
+import fingerprint_index
+import gsheets
+import local_mirror
+
+
+def test_synthetic_ledger():
+    print("=" * 60)
+    print("TESTE DAS BASES SINTÉTICAS")
+    print("=" * 60)
+
+    ledger = benchmark.generate_ledger(5_000, seed=1)
+    income = benchmark.generate_income(ledger, seed=1)
+    print(f"\n1. {len(ledger)} transações, {len(income)} receitas")
+    print(ledger.head())
+
+    assert len(ledger) == 5_000 and ledger["id"].is_unique
+    assert list(ledger.columns) == ["id", "date", "reference_date", "title", "amount", "category", "owner"]
+    assert set(ledger["owner"]) == set(benchmark.OWNERS)
+    assert ledger["title"].str.contains(r" - Parcela \d+/\d+$").mean() > 0.03
+    assert (ledger["title"] == "Aplicação RDB").sum() > 0
+    assert income["source"].eq("Resgate RDB").sum() > 0
+    assert (ledger["amount"] > 0).all()
+
+    # Mesma semente, mesma base
+    assert benchmark.generate_ledger(5_000, seed=1).equals(ledger)
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_benchmark_run():
+    print("=" * 60)
+    print("TESTE DA RODADA DO BENCHMARK")
+    print("=" * 60)
+
+    paths = (local_mirror.MIRROR_DIR, fingerprint_index.INDEX_PATH)
+    queue = gsheets._write_queue
+    report = benchmark.run_benchmark([1_000], seed=7)
+    result = report["results"][0]
+    print(f"\n1. {result['rows']}")
+
+    expected = {"seed_write", "read_sheet", "load_data", "load_data_mirror", "process_uploaded_file",
+                "merge_and_save", "compute_receitas_liquidas", "compute_transacoes_liquidas",
+                "learn_patterns_from_data", "dashboard"}
+    assert set(result["stages"]) == expected
+    assert all(s["median"] >= 0 for s in result["stages"].values())
+    # Espelho local: a segunda leitura só consulta a revisão
+    assert result["stages"]["load_data_mirror"]["api_calls"] == 1
+    # Metade da fatura já estava na base
+    assert result["rows"]["duplicates"] > 0 and result["rows"]["imported"] > 0
+    json.dumps(report)
+
+    # Caminhos e variáveis do app restaurados
+    assert (local_mirror.MIRROR_DIR, fingerprint_index.INDEX_PATH) == paths
+    assert gsheets._write_queue is queue
+    assert os.environ.get("GSHEETS_BACKEND") != "fake"
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_synthetic_ledger()
+        test_benchmark_run()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
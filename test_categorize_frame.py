@@ -0,0 +1,77 @@
+"""
+Teste do categorizador vetorizado (utils.categorize_frame): mesmo resultado
+do laço linha a linha do Mágico (regras -> valor exato -> palavras aprendidas).
+"""
+import random
+import sys
+import time
+
+import pandas as pd
+
+import ml_patterns
+import utils
+
+
+def row_by_row(df, learned):
+    """Laço antigo do Mágico de Categorização."""
+    out = []
+    for _, row in df.iterrows():
+        suggested = utils.categorize_transaction(row['title'])
+        if not suggested or suggested == 'Outros':
+            suggested = ml_patterns.suggest_category_from_learned(
+                title=row['title'], learned_patterns=learned, amount=row['amount']
+            )
+        out.append(suggested or 'Outros')
+    return out
+
+
+def test_categorize_frame():
+    print("=" * 60)
+    print("TESTE DO CATEGORIZADOR VETORIZADO")
+    print("=" * 60)
+
+    learned = {
+        "words": {"kumon": "Pessoal/Vestuário", "academia": "Saúde/Farmácia", "smartfit": "Saúde/Farmácia",
+                  "livraria": "Educação/Cursos", "cultura": "Lazer/Restaurantes"},
+        "amounts": {99.9: "Assinaturas/Serviços"},
+    }
+    df = pd.DataFrame({
+        'title': ['Uber *Trip', 'KUMON LIVRARIA', 'Livraria Cultura', 'Qualquer Xyz', 'SmartFit Academia', 'Mensalidade'],
+        'amount': [20.0, 50.0, 80.0, 10.0, 120.0, 99.9],
+    })
+    result = utils.categorize_frame(df, learned)
+    print("\n1. Sugestões:")
+    print(pd.concat([df, result], axis=1).to_string())
+    assert result['suggested'].tolist() == row_by_row(df, learned)
+    assert result['source'].tolist() == ["regra", "palavras", "palavras", "padrão", "palavras", "valor"]
+    # Empate de votos -> vence a palavra que aparece primeiro no título
+    assert result.loc[1, 'suggested'] == "Pessoal/Vestuário" and result.loc[1, 'confidence'] == 0.5
+
+    # 2. Equivalência e desempenho em 20k transações
+    random.seed(7)
+    words = ['kumon', 'livraria', 'cultura', 'academia', 'smartfit', 'uber', 'mercado', 'xpto', 'loja', '123']
+    big = pd.DataFrame({
+        'title': [" ".join(random.choices(words, k=random.randint(1, 4))) for _ in range(20_000)],
+        'amount': [random.choice([99.9, 10.0, 35.5]) for _ in range(20_000)],
+    })
+    start = time.perf_counter()
+    result = utils.categorize_frame(big, learned)
+    elapsed = time.perf_counter() - start
+    print(f"2. 20k transações em {elapsed * 1000:.0f} ms")
+    assert result['suggested'].tolist() == row_by_row(big, learned)
+    # Origem coerente com a sugestão de cada linha
+    source = result['source']
+    assert source.isin(["regra", "valor", "palavras", "padrão"]).all()
+    assert (big['amount'][source == "valor"] == 99.9).all()
+    assert (result['suggested'][source == "padrão"] == "Outros").all()
+    assert (result['suggested'][source == "valor"] == "Assinaturas/Serviços").all()
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_categorize_frame()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
@@ -0,0 +1,63 @@
+"""
+Teste do categorizador compilado (utils.CATEGORY_RULES / categorize_series):
+deve dar o mesmo resultado das regras if/any em ordem de prioridade.
+"""
+import random
+import sys
+import time
+
+import pandas as pd
+
+import utils
+
+
+def reference_categorize(title):
+    """Regras aplicadas como antes: primeira regra (na ordem) com alguma palavra no título."""
+    title_lower = title.lower()
+    for category, keywords in utils.CATEGORY_RULES:
+        if any(x in title_lower for x in keywords):
+            return category
+    return 'Outros'
+
+
+def test_category_rules():
+    print("=" * 60)
+    print("TESTE DO CATEGORIZADOR COMPILADO")
+    print("=" * 60)
+
+    fixed = {
+        'UBER *TRIP': 'Transporte (Uber/99)',
+        'Supermercado Extra': 'Alimentação (Mercado/Sacolão)',
+        'Barbearia do Zé': 'Pessoal/Vestuário',    # 'bar ' (Lazer) exige espaço
+        'Estorno Netflix': 'Pagamento/Crédito',
+        'PG *LOJINHA': 'Outros',
+        '': 'Outros',
+    }
+    for title, expected in fixed.items():
+        assert utils.categorize_transaction(title) == expected, title
+    print(f"\n1. {len(fixed)} casos fixos OK")
+
+    # Títulos aleatórios combinando palavras de regras diferentes (conflitos de prioridade)
+    random.seed(42)
+    words = [kw for _, kws in utils.CATEGORY_RULES for kw in kws] + ['pg *', 'loja', 'xyz']
+    titles = [" ".join(random.choice(words).upper() if random.random() < 0.3 else random.choice(words)
+                       for _ in range(random.randint(0, 4)))
+              for _ in range(10_000)]
+    expected = [reference_categorize(t) for t in titles]
+
+    start = time.perf_counter()
+    result = utils.categorize_series(pd.Series(titles))
+    elapsed = time.perf_counter() - start
+    print(f"2. {len(titles)} títulos em {elapsed * 1000:.0f} ms")
+    assert result.tolist() == expected
+    assert [utils.categorize_transaction(t) for t in titles[:500]] == expected[:500]
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_category_rules()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
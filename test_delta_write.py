@@ -0,0 +1,103 @@
+"""
+Teste da escrita incremental (delta) do gsheets.write_dataframe_to_sheet
+"""
+import pandas as pd
+import sys
+
+import gsheets
+
+
+def apply_requests(grid, requests):
+    """Aplica os requests do batch_update em uma grade simples (lista de linhas)."""
+    for req in requests:
+        if "deleteDimension" in req:
+            r = req["deleteDimension"]["range"]
+            del grid[r["startIndex"]:r["endIndex"]]
+        elif "updateCells" in req:
+            start = req["updateCells"]["range"]["startRowIndex"]
+            for i, row in enumerate(req["updateCells"]["rows"]):
+                grid[start + i] = [c.get("userEnteredValue", {}).get("stringValue", "") for c in row["values"]]
+        elif "appendCells" in req:
+            for row in req["appendCells"]["rows"]:
+                grid.append([c.get("userEnteredValue", {}).get("stringValue", "") for c in row["values"]])
+    return grid
+
+
+def test_delta_plan():
+    print("=" * 60)
+    print("TESTE DE ESCRITA INCREMENTAL (DELTA)")
+    print("=" * 60)
+
+    old_df = pd.DataFrame({
+        'id': ['id1', 'id2', 'id3', 'id4', 'id5'],
+        'title': ['A', 'B', 'C', 'D', 'E'],
+        'amount': [10.0, 20.0, 30.0, 40.0, 50.0],
+        'category': ['Outros', 'Outros', 'Pets', 'Outros', 'Moradia'],
+    })
+    header, rows = gsheets._dataframe_to_values(old_df)
+    gsheets._remember_sheet_state("planilha_teste", 0, 123, header, rows)
+    state = gsheets._sheet_state[("planilha_teste", 0)]
+
+    # Edição: muda categoria de id2, remove id3 e id4, adiciona id6
+    new_df = old_df.copy()
+    new_df.loc[new_df['id'] == 'id2', 'category'] = 'Lazer/Restaurantes'
+    new_df = new_df[~new_df['id'].isin(['id3', 'id4'])]
+    new_df = pd.concat([new_df, pd.DataFrame([{'id': 'id6', 'title': 'F', 'amount': 60.0, 'category': 'Pets'}])], ignore_index=True)
+
+    new_header, new_rows = gsheets._dataframe_to_values(new_df)
+    plan = gsheets._plan_delta(state, new_header, new_rows)
+    print(f"\n1. Plano: delete={plan['delete']} update={len(plan['update'])} append={len(plan['append'])}")
+
+    assert plan['delete'] == [(2, 4)]
+    assert len(plan['update']) == 1
+    assert len(plan['append']) == 1
+
+    requests = gsheets._build_delta_requests(123, plan, len(new_header))
+    grid = apply_requests([header] + [list(r) for r in rows], requests)
+    print("\n2. Grade após aplicar o batch_update:")
+    for line in grid:
+        print("  ", line)
+
+    expected = sorted([header] + new_rows)
+    assert sorted(grid) == expected
+    assert [r[0] for r in grid[1:]] == plan['ids']
+
+    # Sem mudanças -> nenhum request
+    gsheets._sheet_state[("planilha_teste", 0)] = {
+        "sheet_id": 123, "header": new_header, "ids": plan["ids"], "digests": plan["digests"],
+    }
+    same_plan = gsheets._plan_delta(gsheets._sheet_state[("planilha_teste", 0)], new_header, new_rows)
+    assert gsheets._build_delta_requests(123, same_plan, len(new_header)) == []
+
+    # Header diferente ou ids duplicados -> escrita completa
+    assert gsheets._plan_delta(state, new_header[:-1], [r[:-1] for r in new_rows]) is None
+    assert gsheets._plan_delta(state, new_header, new_rows + [new_rows[0]]) is None
+
+    # Aba sem id (receitas): chave = conteúdo; linha alterada vira remoção + inserção
+    inc = pd.DataFrame({
+        'source': ['Salario', 'Salario', 'Bonus'],
+        'amount': [100.0, 100.0, 50.0],
+        'owner': ['Pamela', 'Pamela', 'Renato'],
+    })
+    inc_header, inc_rows = gsheets._dataframe_to_values(inc)
+    gsheets._remember_sheet_state("planilha_teste", 1, 456, inc_header, inc_rows)
+    inc_new = inc.copy()
+    inc_new.loc[2, 'amount'] = 75.0
+    _, inc_new_rows = gsheets._dataframe_to_values(inc_new)
+    inc_plan = gsheets._plan_delta(gsheets._sheet_state[("planilha_teste", 1)], inc_header, inc_new_rows)
+    print(f"\n3. Aba sem id: delete={inc_plan['delete']} update={len(inc_plan['update'])} append={len(inc_plan['append'])}")
+    assert inc_plan['delete'] == [(2, 3)] and not inc_plan['update'] and len(inc_plan['append']) == 1
+    grid = apply_requests([inc_header] + [list(r) for r in inc_rows],
+                          gsheets._build_delta_requests(456, inc_plan, len(inc_header)))
+    assert grid == [inc_header] + inc_new_rows
+
+    gsheets._forget_sheet_state("planilha_teste")
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_delta_plan()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
@@ -0,0 +1,247 @@
+"""
+Teste do Google Sheets falso (fake_gspread): fluxos completos do gsheets
+(escrita completa e incremental, leitura, configurações em lote) sem rede,
+latência por chamada e cota simulada com erro 429.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+
+import fake_gspread
+import gsheets
+import local_mirror
+from rate_limiter import TokenBucket
+from write_behind import WriteBehindQueue
+
+
+def _use_fake(client, workdir):
+    """
+    Aponta o gsheets para `client` via GSHEETS_BACKEND=fake, tira o rate limiter
+    do caminho e usa espelho local e fila de escrita (journal) próprios em `workdir`.
+    """
+    os.environ["GSHEETS_BACKEND"] = "fake"
+    os.environ["GSHEETS_RATE_LIMITER"] = "local"
+    fake_gspread._shared_client = client
+    gsheets.get_gspread_client.clear()
+    gsheets._invalidate_spreadsheet_cache()
+    gsheets._buckets.update({kind: TokenBucket(1_000_000, per=60, capacity=1_000_000)
+                             for kind in gsheets._rate_limits})
+    local_mirror.MIRROR_DIR = os.path.join(workdir, "sheets")
+    queue = WriteBehindQueue(gsheets.write_dataframe_to_sheet, journal_dir=os.path.join(workdir, "journal"),
+                             on_failure=gsheets._notify_write_failure)
+    with gsheets._write_queue_lock:
+        gsheets._write_queue = queue
+    return queue
+
+
+def test_fake_gspread_flows():
+    print("=" * 60)
+    print("TESTE DO GOOGLE SHEETS FALSO (FLUXOS DE LEITURA/ESCRITA)")
+    print("=" * 60)
+
+    original_buckets = dict(gsheets._buckets)
+    original_queue = gsheets._write_queue
+    original_mirror_dir = local_mirror.MIRROR_DIR
+    original_fresh = gsheets._REVISION_FRESH_SECONDS
+    original_env = {k: os.environ.get(k) for k in ("GSHEETS_BACKEND", "GSHEETS_RATE_LIMITER")}
+    client = fake_gspread.FakeClient(latency=0.002)
+    workdir = tempfile.mkdtemp()
+    queue = _use_fake(client, workdir)
+    try:
+        assert gsheets.get_gspread_client() is client
+        sid = f"fake-{uuid.uuid4().hex}"
+
+        # 1. Escrita completa e leitura de volta
+        df = pd.DataFrame({
+            'id': ['id1', 'id2', 'id3'],
+            'title': ['Uber', 'Padaria', 'Netflix'],
+            'amount': [25.5, 12.0, 39.9],
+            'category': ['Transporte', 'Outros', 'Assinaturas'],
+        })
+        gsheets.write_dataframe_to_sheet(df, sid)
+        back = gsheets.read_sheet_as_dataframe(sid)
+        print(f"\n1. Lido após escrita completa:\n{back}")
+        assert back.to_dict("records") == df.to_dict("records")
+
+        # 2. Edição: só o delta vai em um único batch_update
+        client.reset_stats()
+        edited = df.copy()
+        edited.loc[edited['id'] == 'id2', 'category'] = 'Alimentação'
+        edited = edited[edited['id'] != 'id3']
+        edited = pd.concat([edited, pd.DataFrame([{'id': 'id4', 'title': 'Farmacia', 'amount': 8.0,
+                                                   'category': 'Saúde'}])], ignore_index=True)
+        gsheets.write_dataframe_to_sheet(edited, sid)
+        print(f"2. Chamadas da escrita incremental: {client.stats}")
+        assert client.stats["write"] == 1
+        assert gsheets.read_sheet_as_dataframe(sid).to_dict("records") == edited.to_dict("records")
+
+        # 3. Revisão muda a cada escrita (espelho local é invalidado); a consulta
+        # conta no balde do Drive, não no de leitura do Sheets
+        before = gsheets.get_throttle_stats()
+        rev = gsheets.get_sheet_revision(sid)
+        after = gsheets.get_throttle_stats()
+        assert after["drive"]["calls"] == before["drive"]["calls"] + 1
+        assert after["read"]["calls"] == before["read"]["calls"]
+        gsheets.write_dataframe_to_sheet(df, sid)
+        assert gsheets.get_sheet_revision(sid) > rev
+
+        # 3b. Gravação logo após a leitura: a revisão acabou de ser confirmada,
+        # só a consulta depois do batch_update vai ao Drive
+        gsheets.read_sheet_as_dataframe(sid)
+        before = gsheets.get_throttle_stats()["drive"]["calls"]
+        gsheets.write_dataframe_to_sheet(edited, sid)
+        assert gsheets.get_throttle_stats()["drive"]["calls"] == before + 1
+
+        # 3c. Planilha alterada por fora (outro processo / edição manual) depois
+        # da última confirmação da revisão: sem delta
+        gsheets.read_sheet_as_dataframe(sid)
+        ws = client.open_by_key(sid).get_worksheet(0)
+        ws.update([["id0", "Manual", "1.0", "Outros"]], "A2")
+        client.reset_stats()
+        gsheets._REVISION_FRESH_SECONDS = 0
+        try:
+            gsheets.write_dataframe_to_sheet(df, sid)
+        finally:
+            gsheets._REVISION_FRESH_SECONDS = original_fresh
+        print(f"3. Após edição externa: {client.stats}")
+        assert client.stats["write"] == 2    # clear + update
+        assert gsheets.read_sheet_as_dataframe(sid).to_dict("records") == df.to_dict("records")
+
+        # 3d. Estado registrado com os valores normalizados pelo loader: salvar
+        # o que acabou de ser carregado não envia nada
+        raw_id = f"fake-{uuid.uuid4().hex}"
+        client.create(raw_id, {"Receitas": [["source", "amount", "owner"], ["Salario", "100", "Pamela"],
+                                            ["Bonus", "", "Renato"]]})
+
+        def fetch():
+            loaded = gsheets.read_sheet_as_dataframe(raw_id)
+            loaded['amount'] = pd.to_numeric(loaded['amount'], errors='coerce').fillna(0.0)
+            return loaded
+        before = gsheets.get_throttle_stats()["drive"]["calls"]
+        loaded = gsheets.read_mirrored(raw_id, "receitas_teste", fetch, sheet_index=0)
+        # A revisão consultada por read_mirrored vale para a leitura do fetch
+        assert gsheets.get_throttle_stats()["drive"]["calls"] == before + 1
+        client.reset_stats()
+        gsheets.write_dataframe_to_sheet(loaded, raw_id)
+        print(f"   Save logo após load: {client.stats}")
+        assert client.stats["write"] == 0
+
+        # 3e. Espelho local devolve o mesmo DataFrame da leitura da nuvem: valores
+        # de tipos misturados (get_all_records: 100 e "") e o índice das linhas filtradas
+        def fetch_raw():
+            raw = gsheets.read_sheet_as_dataframe(raw_id)
+            return raw[raw['source'] != "Salario"]
+        fresh = gsheets.read_mirrored(raw_id, "receitas_cru", fetch_raw, sheet_index=0)
+        mirrored = gsheets.read_mirrored(raw_id, "receitas_cru", fetch_raw, sheet_index=0)
+        print(f"   Espelho: {mirrored.to_dict('index')}")
+        pd.testing.assert_frame_equal(mirrored, fresh)
+        assert mirrored.index.tolist() == [1]
+        raw_types = [type(v) for v in gsheets.read_sheet_as_dataframe(raw_id)['amount']]
+        assert len(set(raw_types)) == 2
+
+        # 4. Configurações: abas criadas sob demanda e lidas com um único batchGet
+        settings_id = f"fake-{uuid.uuid4().hex}"
+        gsheets.write_settings_to_sheet({"tema": "escuro"}, settings_id)
+        gsheets.save_categories(["Transporte", "Outros", "Pets"], settings_id)
+        gsheets.save_budgets(pd.DataFrame([{"Categoria": "Pets", "Valor": 150.0, "Mes": 1, "Ano": 2025,
+                                            "Tipo": "Orçamento"}]), settings_id)
+        client.reset_stats()
+        legacy, categories, budgets = gsheets._fetch_settings_tabs(settings_id)
+        print(f"4. {legacy} | {categories} | {budgets.to_dict('records')} | {client.stats}")
+        assert legacy == {"tema": "escuro"}
+        assert categories == ["Outros", "Pets", "Transporte"]
+        assert budgets["Valor"].tolist() == [150.0] and client.stats["read"] == 1
+        assert gsheets.read_settings_from_sheet(settings_id) == {"tema": "escuro"}
+        assert gsheets.read_categories(settings_id) == categories
+
+        # 5. append_rows de classificações
+        class_id = f"fake-{uuid.uuid4().hex}"
+        gsheets.append_classifications([("Uber", "Transporte"), ("Padaria", "Outros")], class_id)
+        ws = client.open_by_key(class_id).worksheet("classificacao_categoria")
+        print(f"5. Aba de classificações: {ws.get_all_values()}")
+        assert len(ws.get_all_records()) == 2
+
+        # 6. Gravação em segundo plano passa pela fila (e journal) do teste
+        queued_id = f"fake-{uuid.uuid4().hex}"
+        gsheets.enqueue_write(df, queued_id)
+        assert gsheets._write_queue is queue and os.listdir(os.path.join(workdir, "journal"))
+        assert gsheets.flush_writes(timeout=10)
+        assert gsheets.read_sheet_as_dataframe(queued_id).to_dict("records") == df.to_dict("records")
+    finally:
+        queue.flush(timeout=30)
+        queue.close()
+        with gsheets._write_queue_lock:
+            gsheets._write_queue = original_queue
+        local_mirror.MIRROR_DIR = original_mirror_dir
+        shutil.rmtree(workdir, ignore_errors=True)
+        gsheets._buckets.clear()
+        gsheets._buckets.update(original_buckets)
+        for key, value in original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        gsheets.get_gspread_client.clear()
+        gsheets._invalidate_spreadsheet_cache()
+        gsheets._forget_sheet_state()
+        fake_gspread._shared_client = None
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_fake_gspread_quota():
+    print("=" * 60)
+    print("TESTE DA COTA SIMULADA (429)")
+    print("=" * 60)
+
+    # 1. Acima da cota de leitura: APIError 429, reconhecido pelo retry_on_quota
+    client = fake_gspread.FakeClient(reads_per_minute=3)
+    ws = client.open_by_key("cota").get_worksheet(0)
+    ws.row_values(1)
+    try:
+        ws.row_values(1)
+        raise AssertionError("Esperava APIError 429")
+    except gsheets.APIError as e:
+        print(f"\n1. {e}")
+        assert e.response.status_code == 429 and e.code == 429
+    # Escritas têm cota separada
+    ws.update([["a", "b"]])
+    assert client.stats == {"read": 3, "write": 1, "rate_limited": 1}
+
+    # 2. Janela curta: o retry espera e a chamada passa
+    client.quota.window = 0.05
+
+    @gsheets.retry_on_quota(max_retries=4, initial_delay=0.02)
+    def read_header():
+        return ws.row_values(1)
+
+    for _ in range(5):
+        assert read_header() == ["a", "b"]
+    print(f"2. Com retry: {client.stats}")
+    assert client.stats["rate_limited"] > 1
+
+    # 3. Latência com jitter: mesma semente, mesmos atrasos
+    delays = []
+    for _ in range(2):
+        fake = fake_gspread.FakeClient(latency=0.001, jitter=0.002, seed=7)
+        start = time.perf_counter()
+        fake.open_by_key("x").get_worksheet(0).get_all_values()
+        delays.append(fake._random.random())
+        assert time.perf_counter() - start >= 0.003
+    assert delays[0] == delays[1]
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_fake_gspread_flows()
+        test_fake_gspread_quota()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
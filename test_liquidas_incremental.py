@@ -0,0 +1,103 @@
+"""
+Teste do recálculo incremental das líquidas (utils.refresh_liquidas):
+o resultado parcial (só partições sujas) deve ser idêntico ao cálculo completo.
+"""
+import pandas as pd
+import sys
+
+import gsheets
+import utils
+
+SETTINGS = {"budgets_df": pd.DataFrame([{"Categoria": "Viagem", "Tipo": "Meta", "Valor": 500.0}])}
+
+
+def _sorted(df):
+    cols = sorted(df.columns)
+    return df[cols].astype(str).sort_values(cols).reset_index(drop=True)
+
+
+def _assert_same(incremental, full):
+    assert _sorted(incremental).equals(_sorted(full))
+
+
+def _full(trans, income):
+    return (utils.compute_transacoes_liquidas(trans, SETTINGS),
+            utils.compute_receitas_liquidas(income, trans, SETTINGS))
+
+
+def test_refresh_liquidas_incremental():
+    print("=" * 60)
+    print("TESTE DO RECÁLCULO INCREMENTAL DAS LÍQUIDAS")
+    print("=" * 60)
+
+    trans = pd.DataFrame({
+        'id': [f"t{i}" for i in range(8)],
+        'date': pd.to_datetime(['2024-01-05', '2024-01-20', '2024-02-03', '2024-02-15',
+                                '2024-03-01', '2024-03-10', '2024-04-02', '2024-04-09']),
+        'title': ['Mercado', 'Aplicação RDB', 'Uber', 'Aplicação RDB',
+                  'Passagem', 'Netflix', 'Padaria', 'Aplicação RDB'],
+        'amount': [100.0, 500.0, 30.0, 200.0, 900.0, 40.0, 15.0, 300.0],
+        'category': ['Mercado', 'Outros', 'Transporte', 'Outros', 'Viagem', 'Assinaturas', 'Lazer', 'Outros'],
+        'owner': ['Pamela', 'Família', 'Renato', 'Família', 'Pamela', 'Renato', 'Pamela', 'Família'],
+    })
+    trans['reference_date'] = trans['date']
+    income = pd.DataFrame({
+        'date': pd.to_datetime(['2024-01-05', '2024-01-25', '2024-02-05', '2024-03-05', '2024-04-05']),
+        'source': ['Salario', 'Resgate RDB', 'Salario', 'Salario', 'Resgate RDB'],
+        'amount': [5000.0, 120.0, 5000.0, 5000.0, 50.0],
+        'type': ['Fixa', 'Extra', 'Fixa', 'Fixa', 'Extra'],
+        'recurrence': ['Mensal', 'Única', 'Mensal', 'Mensal', 'Única'],
+        'owner': ['Pamela', 'Família', 'Pamela', 'Pamela', 'Família'],
+    })
+    income['reference_date'] = income['date']
+
+    # 1. Sem estado anterior: cálculo completo
+    utils._liquidas_state = None
+    trans_liq, rec_liq = utils.refresh_liquidas(trans, income, SETTINGS, save=False)
+    full_t, full_r = _full(trans, income)
+    _assert_same(trans_liq, full_t)
+    _assert_same(rec_liq, full_r)
+    print(f"\n1. Completo: {len(trans_liq)} transações líquidas, {len(rec_liq)} receitas líquidas")
+
+    # 2. Edições: categoria vira Meta, aplicação muda de valor, transação nova, receita removida
+    trans2 = trans.copy()
+    trans2.loc[trans2['id'] == 't2', 'category'] = 'Viagem'
+    trans2.loc[trans2['id'] == 't3', 'amount'] = 250.0
+    new_row = {'id': 't8', 'date': pd.Timestamp('2024-05-02'), 'reference_date': pd.Timestamp('2024-05-02'),
+               'title': 'Aplicação RDB', 'amount': 80.0, 'category': 'Outros', 'owner': 'Família'}
+    trans2 = pd.concat([trans2, pd.DataFrame([new_row])], ignore_index=True)
+    income2 = income.drop(index=1)
+
+    dirty = utils._dirty_partitions(utils._row_meta(trans), utils._row_meta(trans2))
+    print(f"2. Partições sujas (transações): {sorted(dirty)}")
+    assert dirty == {(2024, 2, 'Renato'), (2024, 2, 'Família'), (2024, 5, 'Família')}
+
+    trans_liq, rec_liq = utils.refresh_liquidas(trans2, income2, SETTINGS, save=False)
+    full_t, full_r = _full(trans2, income2)
+    _assert_same(trans_liq, full_t)
+    _assert_same(rec_liq, full_r)
+    print(f"3. Incremental == completo: {len(trans_liq)} transações, {len(rec_liq)} receitas")
+
+    # 3. Metas alteradas -> recálculo completo
+    settings2 = {"budgets_df": pd.DataFrame()}
+    trans_liq, _ = utils.refresh_liquidas(trans2, income2, settings2, save=False)
+    _assert_same(trans_liq, utils.compute_transacoes_liquidas(trans2, settings2))
+    assert utils._liquidas_state['meta_cats'] == ()
+
+    # 4. Envio das líquidas falhou na fila em segundo plano: estado descartado
+    gsheets._notify_write_failure("outra_planilha", 0, RuntimeError("429"))
+    assert utils._liquidas_state is not None
+    gsheets._notify_write_failure(gsheets.TRANSACOES_LIQUIDAS_ID, 0, RuntimeError("429"))
+    print("4. Falha ao gravar as líquidas -> próximo cálculo completo")
+    assert utils._liquidas_state is None
+
+    utils._liquidas_state = None
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_refresh_liquidas_incremental()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
@@ -0,0 +1,164 @@
+"""
+Teste da deduplicação vetorizada (row_fingerprints / índice persistente / merge_and_save)
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import fingerprint_index
+import utils
+
+
+def _reference_new_rows(current, new):
+    """Referência linha a linha: chave normalizada (dia, título, centavos, dono) em um set."""
+    def keys(df):
+        for date, title, amount, owner in df[['date', 'title', 'amount', 'owner']].itertuples(index=False):
+            yield (pd.Timestamp(date).strftime('%Y-%m-%d'), str(title), int(round(float(amount) * 100)), str(owner))
+    seen = set(keys(current))
+    keep = []
+    for k in keys(new):
+        keep.append(k not in seen)
+        seen.add(k)
+    return new[keep]
+
+
+def test_merge_dedup():
+    print("=" * 60)
+    print("TESTE DE DEDUPLICAÇÃO POR FINGERPRINT")
+    print("=" * 60)
+
+    # Gravação falsa: guarda o DataFrame e o callback, chamado só no "envio"
+    saved, on_saved_calls = [], []
+    revision = {"value": "rev-1"}
+
+    def fake_save(df, on_saved=None):
+        saved.append(df)
+        on_saved_calls.append(on_saved)
+
+    def flush():
+        while on_saved_calls:
+            callback = on_saved_calls.pop(0)
+            if callback is not None:
+                callback()
+
+    original_save = utils.save_data
+    original_revision = utils.gsheets.known_revision
+    original_fingerprints = fingerprint_index.row_fingerprints
+    hashed = []
+
+    def counting_fingerprints(df, columns):
+        hashed.append(len(df))
+        return original_fingerprints(df, columns)
+
+    utils.save_data = fake_save
+    utils.gsheets.known_revision = lambda spreadsheet_id, sheet_index=0: revision["value"]
+    fingerprint_index.row_fingerprints = counting_fingerprints
+    original_index_path = fingerprint_index.INDEX_PATH
+    fingerprint_index.INDEX_PATH = os.path.join(tempfile.mkdtemp(), "fingerprints.sqlite3")
+    try:
+        current = pd.DataFrame({
+            'id': ['a', 'b'],
+            'date': pd.to_datetime(['2024-01-05', '2024-01-06']),
+            'title': ['Mercado', 'Uber'],
+            'amount': [100.0, 25.5],
+            'category': ['Mercado', 'Transporte'],
+            'owner': ['Pamela', 'Renato'],
+        })
+        # Mesma transação com data em texto e valor com ruído de float -> duplicata
+        new = pd.DataFrame({
+            'date': ['2024-01-05', '2024-01-07', '2024-01-07'],
+            'title': ['Mercado', 'Padaria', 'Padaria'],
+            'amount': [100.0000001, 12.0, 12.0],
+            'category': ['Mercado', 'Lazer', 'Lazer'],
+            'owner': ['Pamela', 'Pamela', 'Pamela'],
+        })
+
+        combined, duplicates = utils.merge_and_save(current, new)
+        flush()
+        print(f"\n1. {len(combined)} linhas após mesclar, {duplicates} duplicatas")
+        assert duplicates == 2
+        assert combined['title'].tolist() == ['Mercado', 'Uber', 'Padaria']
+        assert combined['id'].notna().all() and len(saved) == 1
+
+        # Fingerprint estável: mesmo conteúdo -> mesmo valor
+        fp1 = utils.row_fingerprints(current, utils.TRANSACTION_KEY_COLUMNS)
+        fp2 = utils.row_fingerprints(current.copy(), utils.TRANSACTION_KEY_COLUMNS)
+        assert fp1.dtype == np.uint64 and fp1.equals(fp2)
+
+        # 2. Desempenho: extrato de 5k linhas contra base de 50k
+        rng = np.random.default_rng(0)
+        base = pd.DataFrame({
+            'id': [str(i) for i in range(50_000)],
+            'date': pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, 50_000), unit='D'),
+            'title': [f"LOJA {i % 997}" for i in range(50_000)],
+            'amount': rng.integers(100, 100_000, 50_000) / 100,
+            'owner': 'Família',
+        })
+        statement = pd.concat([base.sample(2_500, random_state=1).drop(columns='id'),
+                               base.sample(2_500, random_state=2).drop(columns='id').assign(title='NOVA')])
+        start = time.perf_counter()
+        merged, duplicates = utils.merge_and_save(base, statement)
+        flush()
+        elapsed = time.perf_counter() - start
+        print(f"2. 5k contra 50k: {elapsed * 1000:.0f} ms, {duplicates} duplicatas")
+        # Mesmo resultado da comparação linha a linha
+        expected = _reference_new_rows(base, statement)
+        added = merged.iloc[len(base):].drop(columns='id')
+        assert duplicates == len(statement) - len(expected) and duplicates >= 2_500
+        pd.testing.assert_frame_equal(added.reset_index(drop=True), expected.reset_index(drop=True))
+
+        # 3. Índice persistente: depois da gravação continua válido (sem rehash da base)
+        index = fingerprint_index.FingerprintIndex(utils.gsheets.BASE_FINANCEIRA_ID)
+        combined = saved[-1]
+        assert index.is_valid(len(combined), "rev-1")
+        hashed.clear()
+        start = time.perf_counter()
+        _, duplicates = utils.merge_and_save(combined, statement)
+        elapsed = time.perf_counter() - start
+        print(f"3. Reimportação pelo índice: {elapsed * 1000:.0f} ms, {duplicates} duplicatas")
+        assert duplicates == len(statement)
+        assert hashed == [len(statement)]   # só o extrato foi hasheado
+        first_fp = utils.row_fingerprints(combined.iloc[:1], utils.TRANSACTION_KEY_COLUMNS).iloc[0]
+        assert combined['id'].iloc[0] in index.row_ids(first_fp)
+
+        # Edição fora da importação -> índice desatualizado
+        index.mark_stale()
+        assert not index.is_valid(len(combined))
+
+        # 4. Gravação ainda não enviada: o índice só é atualizado no envio
+        utils.merge_and_save(combined, statement)   # reconstrói (estava marcado)
+        grown, _ = utils.merge_and_save(combined, statement.assign(title='OUTRA'))
+        assert not index.is_valid(len(grown), "rev-1")
+        revision["value"] = "rev-2"   # revisão da planilha depois da gravação
+        flush()
+        assert index.is_valid(len(grown), "rev-2")
+
+        # 5. Planilha editada por fora (mesmo nº de linhas, índice não marcado):
+        # a revisão muda e o índice é reconstruído
+        edited = grown.copy()
+        edited.loc[0, 'title'] = 'EDITADA POR FORA'
+        revision["value"] = "rev-3"
+        assert index.is_valid(len(edited)) and not index.is_valid(len(edited), "rev-3")
+        reimport = grown.iloc[:1].drop(columns='id')
+        _, duplicates = utils.merge_and_save(edited, reimport)
+        print(f"4. Após edição externa: {duplicates} duplicata(s)")
+        assert duplicates == 0
+    finally:
+        utils.save_data = original_save
+        utils.gsheets.known_revision = original_revision
+        fingerprint_index.row_fingerprints = original_fingerprints
+        fingerprint_index.INDEX_PATH = original_index_path
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_merge_dedup()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
@@ -0,0 +1,424 @@
+"""
+Teste do aprendizado vetorizado (ml_patterns.learn_patterns_from_data):
+mesmo resultado do laço linha a linha (pesos 5x/1x, limiares e desempates).
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import ml_patterns
+
+
+def reference_learn(df, history_df):
+    """Aprendizado linha a linha (implementação original com iterrows)."""
+    patterns = defaultdict(lambda: defaultdict(int))
+    amounts = defaultdict(lambda: defaultdict(int))
+    for _, row in history_df.iterrows():
+        if not row['Categoria']:
+            continue
+        try:
+            val = float(str(row['Valor']).replace(',', '.'))
+            if row['Valor'] and val > 0:
+                amounts[val][row['Categoria']] += 5
+        except ValueError:
+            pass
+        for word in ml_patterns.tokenize(str(row['Descricao'])):
+            patterns[word][row['Categoria']] += 5
+    for _, row in df[~df['category'].isin(['Outros', 'Pagamento/Crédito', '', None])].iterrows():
+        try:
+            val = float(row['amount'])
+            if val > 0:
+                amounts[val][row['category']] += 1
+        except ValueError:
+            pass
+        for word in ml_patterns.tokenize(str(row['title'])):
+            patterns[word][row['category']] += 1
+
+    def winners(table, min_points):
+        out = {}
+        for key, counts in table.items():
+            cat, points = max(counts.items(), key=lambda x: x[1])
+            if points >= min_points:
+                out[key] = cat
+        return out
+    return {"words": winners(patterns, 2), "amounts": winners(amounts, 3)}
+
+
+def test_learn_patterns():
+    print("=" * 60)
+    print("TESTE DO APRENDIZADO VETORIZADO")
+    print("=" * 60)
+
+    # 1. Empate: 'padaria' tem 2 pontos em Lazer e 2 em Mercado -> vence a primeira vista
+    df = pd.DataFrame({
+        'title': ['Padaria Sol', 'PADARIA lua', 'Padaria/Mar', 'Padaria-Ceu', 'Compra de 123'],
+        'category': ['Lazer', 'Mercado', 'Lazer', 'Mercado', 'Lazer'],
+        'amount': [10.0, 10.0, 10.0, 5.0, 0.0],
+    })
+    learned = ml_patterns.learn_patterns_from_data(df, None)
+    print(f"\n1. Padrões: {learned}")
+    assert learned == reference_learn(df, pd.DataFrame(columns=['Descricao', 'Categoria', 'Valor']))
+    assert learned['words']['padaria'] == 'Lazer'
+    assert learned['amounts'] == {}  # 10.0 só tem 2 pontos (mínimo 3)
+
+    # 2. Equivalência e desempenho em 100k transações + histórico
+    random.seed(3)
+    words = ['ifood', 'uber', 'Pet/Shop', 'mercado-livre', 'compra', 'de', '123', 'farmacia.x', 'padaria', 'cinema']
+    cats = ['Lazer', 'Pets', 'Outros', 'Transporte', 'Saúde', '', 'Pagamento/Crédito']
+
+    def title():
+        return " ".join(random.choices(words, k=random.randint(0, 5)))
+
+    big = pd.DataFrame({
+        'title': [title() for _ in range(100_000)],
+        'category': random.choices(cats, k=100_000),
+        'amount': random.choices([10.0, 20.5, -3.0, 0.0, 99.9], k=100_000),
+    })
+    history = pd.DataFrame({
+        'Descricao': [title() for _ in range(2_000)],
+        'Categoria': random.choices(cats[:5] + [''], k=2_000),
+        'Valor': random.choices(['10,0', '20.5', '', '99,9', 'x'], k=2_000),
+    })
+    start = time.perf_counter()
+    learned = ml_patterns.learn_patterns_from_data(big, history)
+    elapsed = time.perf_counter() - start
+    print(f"2. 100k transações em {elapsed * 1000:.0f} ms: {len(learned['words'])} palavras, {len(learned['amounts'])} valores")
+    assert ml_patterns.learn_patterns_from_data(big.head(20_000), history) == reference_learn(big.head(20_000), history)
+    # Toda palavra útil e todo valor positivo aparecem milhares de vezes: todos aprendidos,
+    # sempre com categorias que entram no treino
+    learnable = {'Lazer', 'Pets', 'Transporte', 'Saúde'}
+    assert set(learned['words']) == {t for w in words for t in ml_patterns.tokenize(w)}
+    assert set(learned['amounts']) == {10.0, 20.5, 99.9}
+    assert set(learned['words'].values()) | set(learned['amounts'].values()) <= learnable
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_model_cache():
+    print("=" * 60)
+    print("TESTE DO MODELO CACHEADO, VERSIONADO E INCREMENTAL")
+    print("=" * 60)
+
+    original_dir = ml_patterns.MODEL_DIR
+    ml_patterns.MODEL_DIR = tempfile.mkdtemp()
+    ml_patterns._model_cache.clear()
+    calls = []
+    original_build = ml_patterns.build_model
+
+    def counting_build(df, history_df=None):
+        calls.append(1)
+        return original_build(df, history_df)
+
+    ml_patterns.build_model = counting_build
+    try:
+        df = pd.DataFrame({
+            'title': ['Padaria Sol', 'Padaria Lua', 'Uber Centro', 'Loja X', 'Cinema Lux'],
+            'category': ['Lazer', 'Lazer', 'Transporte', 'Outros', 'Outros'],
+            'amount': [10.0, 12.0, 30.0, 5.0, 40.0],
+        })
+        history = pd.DataFrame({'Descricao': ['Cinema Shopping'], 'Categoria': ['Lazer'], 'Valor': ['40,0']})
+
+        model = ml_patterns.get_learned_patterns(df, history)
+        assert model['format'] == ml_patterns.MODEL_FORMAT and len(calls) == 1
+
+        # Rerun sem mudanças e mudança em transação 'Outros' (não entra no treino): sem retreino
+        edited = df.copy()
+        edited.loc[3, 'title'] = 'Loja Y'
+        assert ml_patterns.get_learned_patterns(edited, history) is model
+        assert len(calls) == 1
+        print(f"\n1. Versão estável: {model['version']}")
+
+        # Novo processo (memória vazia): lê do disco
+        ml_patterns._model_cache.clear()
+        from_disk = ml_patterns.get_learned_patterns(df, history)
+        assert len(calls) == 1 and from_disk['words'] == model['words'] and from_disk['amounts'] == model['amounts']
+        assert os.path.exists(os.path.join(ml_patterns.MODEL_DIR, "learned_patterns.json"))
+        print("2. Modelo recarregado do disco sem retreino")
+
+        # 3. Mágico aplica categoria + feedback no histórico: ajuste incremental, sem retreino
+        # (em uma cópia: quem já tem o modelo anterior não o vê mudar)
+        previous = {k: from_disk[k] if k == 'version' else dict(from_disk[k]) for k in ('version', 'words', 'amounts')}
+        edited.loc[4, 'category'] = 'Lazer'
+        history2 = pd.concat([history, pd.DataFrame([{'Descricao': 'Cinema Lux', 'Categoria': 'Lazer', 'Valor': '40,0'}])],
+                             ignore_index=True)
+        updated = ml_patterns.get_learned_patterns(edited, history2)
+        fresh = original_build(edited, history2)
+        print(f"3. Incremental: {updated['words']} | {updated['amounts']}")
+        assert len(calls) == 1 and updated['version'] != model['version']
+        assert updated['words'] == fresh['words'] and updated['amounts'] == fresh['amounts']
+        assert updated['amounts'] == {40.0: 'Lazer'}
+        assert updated is not from_disk
+        assert {k: from_disk[k] for k in previous} == previous
+
+        # 4. update() direto: feedback disponível na hora (e remoção com peso negativo)
+        ml_patterns.update(updated, [("Academia Forte", "Saúde", 99.0, "2024-01-01")])
+        assert updated['words']['academia'] == 'Saúde' and updated['words']['forte'] == 'Saúde'
+        assert updated['amount_index'].lookup([99.0])[0] == 'Saúde'
+        assert from_disk['amount_index'].lookup([99.0])[0] is None
+
+        # O índice de valores vem no modelo: as sugestões não o reconstroem
+        built = []
+        original_index = ml_patterns.AmountIndex
+        ml_patterns.AmountIndex = lambda *args: built.append(1) or original_index(*args)
+        try:
+            assert ml_patterns.suggest_category_from_learned('Academia', updated, amount=99.0) == 'Saúde'
+            assert ml_patterns.suggest_batch(['Academia'], [99.0], updated)['category_1'].iloc[0] == 'Saúde'
+        finally:
+            ml_patterns.AmountIndex = original_index
+        assert built == []
+
+        ml_patterns.update(updated, [("Academia Forte", "Saúde", 99.0)], weight=-5)
+        assert 'academia' not in updated['words'] and 'academia' not in updated['word_counts']
+        assert updated['amount_index'].lookup([99.0])[0] is None
+        print("4. update(): palavra e valor aprendidos e desfeitos em O(lote)")
+    finally:
+        ml_patterns.build_model = original_build
+        ml_patterns.MODEL_DIR = original_dir
+        ml_patterns._model_cache.clear()
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_naive_bayes_engine():
+    print("=" * 60)
+    print("TESTE DO MOTOR NAIVE BAYES (TF-IDF)")
+    print("=" * 60)
+
+    df = pd.DataFrame({
+        'title': ['Padaria Sol', 'Padaria Lua', 'Cinema Lux', 'Cinema Shopping Lux', 'Posto Shell', 'Posto Ipiranga'],
+        'category': ['Mercado', 'Mercado', 'Lazer', 'Lazer', 'Transporte', 'Transporte'],
+        'amount': [10.0, 12.0, 40.0, 45.0, 200.0, 180.0],
+    })
+    history = pd.DataFrame({'Descricao': ['Shopping Center Norte'], 'Categoria': ['Lazer'], 'Valor': ['99,9']})
+    model = ml_patterns.get_learned_patterns(df, history, engine=ml_patterns.ENGINE_NAIVE_BAYES)
+    assert model['engine'] == ml_patterns.ENGINE_NAIVE_BAYES
+    assert ml_patterns.get_learned_patterns(df, history, engine=ml_patterns.ENGINE_NAIVE_BAYES) is model
+
+    # 1. Palavras que o motor de padrões descarta (1 ponto) ainda contam como evidência
+    titles = pd.Series(['PADARIA NOVA', 'Lux Filmes', 'Posto Lua', 'xyz abc', 'Shopping'])
+    result = ml_patterns.suggest_from_learned_frame(titles, None, model)
+    print(f"\n1. Sugestões:\n{pd.concat([titles, result], axis=1).to_string()}")
+    assert result['category'].tolist()[:3] == ['Mercado', 'Lazer', 'Transporte']
+    assert pd.isna(result['category'].iloc[3]) and pd.isna(result['source'].iloc[3])
+    assert result['category'].iloc[4] == 'Lazer'
+    # Confiança calibrada: probabilidade, menor quando há palavras de categorias diferentes
+    conf = result['confidence']
+    assert ((conf >= 0) & (conf <= 1)).all() and conf.iloc[2] < conf.iloc[0]
+
+    # Mesma interface do motor de padrões (valor exato primeiro: 99,9 no histórico = 5 pontos)
+    assert ml_patterns.suggest_category_from_learned('Padaria', model, amount=99.9) == 'Lazer'
+    assert ml_patterns.suggest_category_from_learned('Cinema', model) == 'Lazer'
+
+    # 2. Lote grande: um produto de matrizes por chamada
+    random.seed(11)
+    words = ['padaria', 'cinema', 'posto', 'shopping', 'lux', 'sol', 'xyz']
+    big = pd.Series([" ".join(random.choices(words, k=random.randint(1, 4))) for _ in range(50_000)])
+    start = time.perf_counter()
+    result = ml_patterns.suggest_from_learned_frame(big, None, model)
+    elapsed = time.perf_counter() - start
+    print(f"2. 50k títulos em {elapsed * 1000:.0f} ms")
+    probs, known = ml_patterns.naive_bayes_scores(model, big)
+    assert np.allclose(probs.sum(axis=1), 1.0) and known.sum() == result['category'].notna().sum()
+    # Cada linha recebe a mesma sugestão que o seu título teria sozinho
+    unique = big.drop_duplicates()
+    alone = ml_patterns.suggest_from_learned_frame(unique, None, model).set_axis(unique.tolist())
+    expected = alone.loc[big.tolist()]
+    assert result['category'].tolist() == expected['category'].tolist()
+    assert np.allclose(result['confidence'].to_numpy(dtype=float), expected['confidence'].to_numpy(dtype=float))
+    assert result['category'][big.str.fullmatch('(xyz ?)+')].isna().all()
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_suggest_batch():
+    print("=" * 60)
+    print("TESTE DO SUGGEST_BATCH (TOP-K)")
+    print("=" * 60)
+
+    learned = {
+        "words": {"kumon": "Educação", "livraria": "Educação", "cultura": "Lazer", "cinema": "Lazer", "uber": "Transporte"},
+        "amounts": {99.9: "Assinaturas", 20.0: "Lazer"},
+    }
+    titles = pd.Series(['Kumon Livraria Cultura', 'Cinema Uber', 'Cultura', 'xyz', None, 'Cinema Uber'], index=list('abcdef'))
+    amounts = pd.Series([10.0, 99.9, 20.0, 99.9, 20.0, 5.0], index=titles.index)
+    result = ml_patterns.suggest_batch(titles, amounts, learned, k=3)
+    print(f"\n1. Top-3:\n{result.to_string()}")
+    assert list(result.columns) == ['category_1', 'score_1', 'category_2', 'score_2', 'category_3', 'score_3', 'source']
+    assert result.loc['a', ['category_1', 'category_2']].tolist() == ['Educação', 'Lazer']
+    assert abs(result.loc['a', 'score_1'] - 2 / 3) < 1e-9 and pd.isna(result.loc['a', 'category_3'])
+    # Valor exato na frente, palavras depois (sem repetir a categoria)
+    assert result.loc['b', ['category_1', 'category_2', 'category_3']].tolist() == ['Assinaturas', 'Lazer', 'Transporte']
+    assert result.loc['c', 'category_1'] == 'Lazer' and pd.isna(result.loc['c', 'category_2'])
+    assert result.loc['d', 'source'] == 'valor' and result.loc['e', 'category_1'] == 'Lazer'
+    assert result.loc['f', 'source'] == 'palavras' and result.loc['f', 'category_1'] == 'Lazer'
+
+    # Top-1 = sugestão por linha
+    for key in titles.index:
+        single = ml_patterns.suggest_category_from_learned(titles[key], learned, amount=amounts[key])
+        assert (single is None and pd.isna(result.loc[key, 'category_1'])) or single == result.loc[key, 'category_1']
+
+    # 2. Muitas linhas, poucos títulos distintos: tokeniza cada título uma vez
+    random.seed(5)
+    big = pd.Series(random.choices(titles.dropna().tolist() + ['Uber Kumon', 'Loja 123'], k=50_000))
+    calls = []
+    original_tokenize = ml_patterns.tokenize_ids
+    ml_patterns.tokenize_ids = lambda texts: calls.append(len(texts)) or original_tokenize(texts)
+    big_amounts = pd.Series(random.choices([1.0, 99.9], k=50_000))
+    try:
+        start = time.perf_counter()
+        result = ml_patterns.suggest_batch(big, big_amounts, learned, k=3)
+        elapsed = time.perf_counter() - start
+    finally:
+        ml_patterns.tokenize_ids = original_tokenize
+    print(f"2. 50k linhas em {elapsed * 1000:.0f} ms (tokenizados: {calls})")
+    assert calls == [big.nunique()]
+    # Valor aprendido na frente; nas demais linhas, a sugestão do título sozinho
+    by_value = (big_amounts == 99.9).to_numpy()
+    assert (result['category_1'][by_value] == 'Assinaturas').all()
+    alone = {t: ml_patterns.suggest_category_from_learned(t, learned) for t in big.unique()}
+    assert result['category_1'][~by_value].tolist() == [alone[t] for t in big[~by_value]]
+
+    # 3. Motor Naive Bayes: mesmas colunas, probabilidades decrescentes
+    df = pd.DataFrame({'title': ['Cinema Lux', 'Cinema Sol', 'Uber Lux', 'Kumon Sol'],
+                       'category': ['Lazer', 'Lazer', 'Transporte', 'Educação'], 'amount': [1.0, 2.0, 3.0, 4.0]})
+    model = ml_patterns.build_naive_bayes(df)
+    result = ml_patterns.suggest_batch(pd.Series(['Cinema Lux', 'Sol']), None, model, k=3)
+    print(f"3. Naive Bayes:\n{result.to_string()}")
+    assert result['category_1'].tolist() == ['Lazer', 'Lazer']
+    assert (result['score_1'] >= result['score_2']).all() and (result['score_2'] >= result['score_3']).all()
+    assert np.allclose(result[['score_1', 'score_2', 'score_3']].sum(axis=1), 1.0)
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_tokenize_cache():
+    print("=" * 60)
+    print("TESTE DO CACHE DE TOKENIZAÇÃO E VOCABULÁRIO INTERNADO")
+    print("=" * 60)
+
+    def reference_tokenize(text):
+        if not text: return []
+        text = str(text).lower().replace('/', ' ').replace('-', ' ').replace('.', ' ')
+        words = [w.strip() for w in text.split() if len(w.strip()) > 2]
+        return [w for w in words if w not in ml_patterns.STOPWORDS and not w.isdigit()]
+
+    titles = ['Uber *Trip', 'IFOOD *Restaurante', 'Amazon - Parcela 3/5', 'Compra de 123', '', 'uber *trip', 'Uber *Trip']
+    assert [ml_patterns.tokenize(t) for t in titles] == [reference_tokenize(t) for t in titles]
+
+    # Mesmo token -> mesmo id; ids viram tokens de volta
+    ids = ml_patterns.title_token_ids('Uber *Trip')
+    assert ml_patterns.title_token_ids('uber *trip').tolist() == ids.tolist()
+    assert ml_patterns.VOCABULARY.tokens(ids).tolist() == ['uber', '*trip']
+    assert not ids.flags.writeable
+
+    # Cache LRU: título repetido não é tokenizado de novo
+    ml_patterns.title_token_ids.cache_clear()
+    statement = pd.Series(titles * 10_000 + [None])
+    rows, token_ids = ml_patterns.tokenize_ids(statement)
+    info = ml_patterns.title_token_ids.cache_info()
+    print(f"\n1. {len(statement)} títulos -> {info.misses} tokenizações, vocabulário com {len(ml_patterns.VOCABULARY)} tokens")
+    assert info.misses == statement.nunique()
+    assert token_ids.dtype == np.int32
+
+    # tokenize_series (a partir dos ids) = tokenize linha a linha
+    series = ml_patterns.tokenize_series(statement)
+    expected = [(i, w) for i, t in enumerate(statement) if pd.notna(t) for w in reference_tokenize(t)]
+    assert list(zip(series.index, series)) == expected
+
+    # Coluna de títulos toda vazia (NaN/None): nenhuma palavra, sem erro
+    rows, token_ids = ml_patterns.tokenize_ids(pd.Series([np.nan, None]))
+    assert len(rows) == len(token_ids) == 0
+    learned = ml_patterns.learn_patterns_from_data(pd.DataFrame({'title': [np.nan], 'category': ['Pets'],
+                                                                 'amount': [1.0]}))
+    assert learned['words'] == {}
+
+    # Vocabulário cresce sem recopiar tudo e recomeça (com o cache) ao passar do limite
+    original_limit = ml_patterns.MAX_VOCABULARY_SIZE
+    ml_patterns.MAX_VOCABULARY_SIZE = len(ml_patterns.VOCABULARY) + 100
+    try:
+        distinct = [f"loja{i} filial{i}" for i in range(200)]
+        assert [ml_patterns.tokenize(t) for t in distinct] == [reference_tokenize(t) for t in distinct]
+        assert ml_patterns.tokenize('Uber *Trip') == ['uber', '*trip']
+        print(f"2. 400 tokens novos, limite {ml_patterns.MAX_VOCABULARY_SIZE}: vocabulário com "
+              f"{len(ml_patterns.VOCABULARY)} tokens, {ml_patterns.title_token_ids.cache_info().currsize} títulos em cache")
+        assert len(ml_patterns.VOCABULARY) <= ml_patterns.MAX_VOCABULARY_SIZE + 2
+        assert ml_patterns.title_token_ids.cache_info().currsize <= 200
+    finally:
+        ml_patterns.MAX_VOCABULARY_SIZE = original_limit
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_amount_index():
+    print("=" * 60)
+    print("TESTE DO ÍNDICE DE VALORES EM CENTAVOS")
+    print("=" * 60)
+
+    # 1. "48,83" da planilha e 48.83 com ruído de float são o mesmo valor
+    history = pd.DataFrame({'Descricao': ['Conta A'], 'Categoria': ['Casa'], 'Valor': ['48,83']})
+    df = pd.DataFrame({'title': ['Conta B'], 'category': ['Casa'], 'amount': [48.830000001]})
+    learned = ml_patterns.learn_patterns_from_data(df, history)
+    print(f"\n1. Valores aprendidos: {learned['amounts']}")
+    assert learned['amounts'] == {48.83: 'Casa'}
+    assert ml_patterns.suggest_category_from_learned('', learned, amount=0.1 + 48.73) == 'Casa'
+    assert ml_patterns.to_cents(['48,83'.replace(',', '.'), 48.83, None]).tolist() == [4883, 4883, 0]
+
+    # 2. Tolerância de ±N centavos (o mais próximo vence; empate -> o menor)
+    index = ml_patterns.AmountIndex({99.9: 'Internet', 100.1: 'Academia', 10.0: 'Café'})
+    found = index.lookup([99.9, 99.95, 100.0, 100.05, 10.04, 50.0], tolerance=5)
+    print(f"2. Com tolerância de 5 centavos: {found.tolist()}")
+    assert found.tolist() == ['Internet', 'Internet', None, 'Academia', 'Café', None]
+    assert index.lookup([99.95]).tolist() == [None]
+
+    # 3. Valores por dono: a conta de uma pessoa não vale para a outra
+    df = pd.DataFrame({
+        'title': ['Vivo'] * 3 + ['Smart Fit'] * 3 + ['Net'] * 3,
+        'category': ['Celular'] * 3 + ['Academia'] * 3 + ['Internet'] * 3,
+        'amount': [89.9] * 6 + [120.0] * 3,
+        'owner': ['Renato'] * 3 + ['Pamela'] * 3 + ['Família'] * 3,
+    })
+    model = ml_patterns.build_model(df)
+    print(f"3. Por dono: {model['owner_amounts']} | geral: {model['amounts']}")
+    assert model['owner_amounts']['Renato'] == {89.9: 'Celular'} and model['owner_amounts']['Pamela'] == {89.9: 'Academia'}
+    batch = ml_patterns.suggest_batch(pd.Series(['x', 'x', 'x', 'x']), pd.Series([89.9, 89.9, 120.0, 120.0]), model, k=1,
+                                      owners=pd.Series(['Renato', 'Pamela', 'Renato', None]))
+    assert batch['category_1'].tolist() == ['Celular', 'Academia', 'Internet', 'Internet']
+    assert ml_patterns.suggest_category_from_learned('x', model, amount=89.9, owner='Pamela') == 'Academia'
+
+    # Incremental por dono = treino do zero; modelo sobrevive ao disco
+    more = pd.concat([df, df.iloc[3:6].assign(category='Saúde'), df.iloc[3:6].assign(category='Saúde')], ignore_index=True)
+    original_dir = ml_patterns.MODEL_DIR
+    ml_patterns.MODEL_DIR = tempfile.mkdtemp()
+    ml_patterns._model_cache.clear()
+    try:
+        ml_patterns.get_learned_patterns(df)
+        updated = ml_patterns.get_learned_patterns(more)
+        fresh = ml_patterns.build_model(more)
+        assert updated['owner_amounts'] == fresh['owner_amounts'] == {'Renato': {89.9: 'Celular'}, 'Pamela': {89.9: 'Saúde'},
+                                                                      'Família': {120.0: 'Internet'}}
+        ml_patterns._model_cache.clear()
+        assert ml_patterns.get_learned_patterns(more)['owner_amounts'] == fresh['owner_amounts']
+    finally:
+        ml_patterns.MODEL_DIR = original_dir
+        ml_patterns._model_cache.clear()
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_learn_patterns()
+        test_model_cache()
+        test_naive_bayes_engine()
+        test_suggest_batch()
+        test_tokenize_cache()
+        test_amount_index()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
@@ -0,0 +1,137 @@
+"""
+Teste do rate limiter (token bucket) usado pelo gsheets
+"""
+import os
+import sys
+import tempfile
+import threading
+
+from rate_limiter import TokenBucket, SharedTokenBucket, split_quota
+
+
+def test_token_bucket():
+    print("=" * 60)
+    print("TESTE DO TOKEN BUCKET")
+    print("=" * 60)
+
+    # 5 tokens de rajada, 50 tokens/s de reposição
+    bucket = TokenBucket(5, per=0.1, capacity=5)
+
+    waits = [bucket.reserve() for _ in range(5)]
+    print(f"\n1. Rajada de 5: esperas = {waits}")
+    assert waits == [0.0] * 5
+
+    # O 6º token só existe daqui a ~1/50 s; o 7º daqui a ~2/50 s
+    w6 = bucket.reserve()
+    w7 = bucket.reserve()
+    print(f"2. Sem saldo: espera 6º = {w6:.3f}s, 7º = {w7:.3f}s")
+    assert 0 < w6 < w7 <= 0.05
+
+    # Threads esperam em paralelo (sleep fora do lock): relógio parado, cada
+    # thread dorme só até o SEU token, nunca com o lock preso
+    slept, locked = [], []
+
+    def fake_sleep(seconds):
+        locked.append(bucket._lock.locked())
+        slept.append(round(seconds, 6))
+
+    bucket = TokenBucket(2, per=0.2, capacity=2, clock=lambda: 100.0, sleep=fake_sleep)
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"3. 6 threads, 2 de rajada + 10 tokens/s: esperas = {sorted(slept)}")
+    assert sorted(slept) == [0.1, 0.2, 0.3, 0.4] and not any(locked)
+
+    # Cota "55 por minuto": reposição na cota cheia, rajada só como capacidade.
+    # Nenhuma janela de 60s passa de 55 + 5 (a cota real do Google é 60) e a
+    # vazão sustentada continua 55/min
+    rate, capacity = split_quota(55)
+    assert (rate, capacity) == (55, 5)
+    bucket = TokenBucket(rate, per=60, capacity=capacity, clock=lambda: 0.0)
+    # (reserve devolve quando, a partir de agora, cada chamada pode sair)
+    moments = [bucket.reserve() for _ in range(200)]
+    in_window = max(sum(1 for m in moments if start <= m < start + 60) for start in moments)
+    print(f"4. split_quota(55) = {(rate, capacity)}: máximo em 60s = {in_window}, "
+          f"200 chamadas em {moments[-1]:.0f}s")
+    assert in_window <= 60 and abs(moments[-1] - (200 - 5) * 60 / 55) < 1e-6
+
+    # strict: nenhuma janela passa da própria cota (rajada sai da reposição)
+    rate, capacity = split_quota(55, strict=True)
+    assert (rate, capacity) == (50, 5)
+    bucket = TokenBucket(rate, per=60, capacity=capacity, clock=lambda: 0.0)
+    moments = [bucket.reserve() for _ in range(200)]
+    assert max(sum(1 for m in moments if start <= m < start + 60) for start in moments) <= 55
+
+    # Sem capacity explícita, não há rajada
+    assert TokenBucket(60, per=60).reserve() == 0.0
+    bucket = TokenBucket(60, per=60)
+    bucket.reserve()
+    assert bucket.reserve() > 0.9
+
+    # Reconfigurar mantém as reservas já feitas (saldo negativo)
+    bucket = TokenBucket(4, per=60, capacity=1)
+    bucket.reserve()
+    bucket.reserve()
+    bucket.reconfigure(4, per=60, capacity=10)
+    wait = bucket.reserve()
+    print(f"5. Após reconfigurar, a próxima ainda espera {wait:.1f}s")
+    assert 29 < wait <= 30
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_shared_token_bucket():
+    print("=" * 60)
+    print("TESTE DO TOKEN BUCKET COMPARTILHADO (SQLITE)")
+    print("=" * 60)
+
+    path = os.path.join(tempfile.mkdtemp(), "limiter.sqlite3")
+
+    # Duas instâncias no mesmo arquivo = dois processos dividindo a cota
+    proc_a = SharedTokenBucket(path, "gsheets_read", 4, per=60, capacity=4)
+    proc_b = SharedTokenBucket(path, "gsheets_read", 4, per=60, capacity=4)
+
+    waits = [proc_a.reserve(), proc_b.reserve(), proc_a.reserve(), proc_b.reserve()]
+    print(f"\n1. 4 chamadas alternadas (cota total 4): esperas = {waits}")
+    assert waits == [0.0] * 4
+
+    # A cota acabou para os DOIS processos (15s por token a 4/min)
+    wait_b = proc_b.reserve()
+    print(f"2. 5ª chamada (outro processo): espera {wait_b:.1f}s")
+    assert 14 < wait_b <= 15
+
+    # Baldes com nomes diferentes (leitura x escrita) são independentes
+    writes = SharedTokenBucket(path, "gsheets_write", 4, per=60, capacity=4)
+    assert writes.reserve() == 0.0
+
+    # No gsheets o balde compartilhado é opt-in, com caminho configurável
+    import gsheets
+    saved_env = {k: os.environ.get(k) for k in ("GSHEETS_RATE_LIMITER", "GSHEETS_RATE_LIMITER_DB")}
+    try:
+        os.environ.pop("GSHEETS_RATE_LIMITER", None)
+        assert type(gsheets._make_bucket("read", 55)) is TokenBucket
+        custom = os.path.join(os.path.dirname(path), "outro.sqlite3")
+        os.environ["GSHEETS_RATE_LIMITER"] = "shared"
+        os.environ["GSHEETS_RATE_LIMITER_DB"] = custom
+        shared = gsheets._make_bucket("read", 55)
+        print(f"3. GSHEETS_RATE_LIMITER=shared: {type(shared).__name__} em {shared.path}")
+        assert isinstance(shared, SharedTokenBucket) and shared.path == custom
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_token_bucket()
+        test_shared_token_bucket()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
@@ -0,0 +1,138 @@
+"""
+Teste da fila de escrita em segundo plano (write_behind.WriteBehindQueue)
+"""
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from write_behind import WriteBehindQueue, FAILED_SUBDIR
+
+
+def test_write_behind_queue():
+    print("=" * 60)
+    print("TESTE DA FILA DE ESCRITA EM SEGUNDO PLANO")
+    print("=" * 60)
+
+    journal = tempfile.mkdtemp()
+    written = []
+    gate = threading.Event()
+    fail_once = {"planilha_b": True}
+
+    def writer(df, spreadsheet_id, sheet_index):
+        gate.wait()
+        if fail_once.pop(spreadsheet_id, False):
+            raise RuntimeError("429 simulado")
+        written.append((spreadsheet_id, df['v'].tolist()))
+
+    failures = []
+    queue = WriteBehindQueue(writer, journal_dir=journal, retry_delay=0.01,
+                             on_failure=lambda sid, idx, e: failures.append((sid, idx, str(e))))
+
+    # 1. Gravações enfileiradas; a segunda na mesma aba substitui a primeira
+    sent = []
+    queue.enqueue(pd.DataFrame({'v': [1]}), "planilha_a", on_success=lambda: sent.append(1))
+    queue.enqueue(pd.DataFrame({'v': [2]}), "planilha_b", on_success=lambda: sent.append(2))
+    queue.enqueue(pd.DataFrame({'v': [3]}), "planilha_b", on_success=lambda: sent.append(3))
+    pending_b = queue.pending("planilha_b")
+    print(f"\n1. Status antes do envio: {queue.status()}")
+    assert pending_b['v'].tolist() == [3]
+
+    # 2. Outro processo iniciando ao mesmo tempo NÃO reenvia o journal de um dono vivo
+    other = WriteBehindQueue(lambda *a: None, journal_dir=journal)
+    assert other.status()["pending"] == 0
+    print("2. Journal de uma fila viva não é reenviado por outra")
+
+    # 3. Libera o envio: planilha_b falha uma vez e é re-tentada
+    gate.set()
+    assert queue.flush(timeout=5)
+    print(f"3. Gravado: {written}")
+    assert sorted(written) == [("planilha_a", [1]), ("planilha_b", [3])]
+    assert queue.pending("planilha_b") is None
+    assert queue.status()["pending"] == 0 and queue.status()["last_error"] is None
+    assert failures == [("planilha_b", 0, "429 simulado")]
+    # on_success só das gravações enviadas (a substituída nunca chegou à planilha)
+    assert sorted(sent) == [1, 3]
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_write_behind_orphan_replay():
+    print("=" * 60)
+    print("TESTE DO REENVIO DE JOURNAL ÓRFÃO")
+    print("=" * 60)
+
+    journal = tempfile.mkdtemp()
+    never = threading.Event()
+    crashed = WriteBehindQueue(lambda *a: never.wait(), journal_dir=journal)
+
+    # Coluna de datas misturando datetime.date (extrato importado) e Timestamp (base)
+    mixed = pd.DataFrame({'id': ['a', 'b'],
+                          'date': pd.Series([pd.Timestamp('2024-01-02'), datetime.date(2024, 1, 5)], dtype=object)})
+    crashed.enqueue(mixed, "planilha_c")
+    crashed._owner_lock.close()   # processo "caiu": o SO libera o lock
+
+    replayed = []
+    survivor = WriteBehindQueue(lambda df, sid, idx: replayed.append((sid, df)), journal_dir=journal)
+    assert survivor.flush(timeout=5)
+    sid, df = replayed[0]
+    print(f"\n1. Reenviado do journal órfão: {sid}\n{df}")
+    assert sid == "planilha_c" and df['date'].tolist() == ['2024-01-02 00:00:00', '2024-01-05']
+    assert not os.path.exists(crashed._owner_dir)
+
+    print("\n✅ TESTE PASSOU!")
+
+
+def test_write_behind_poison():
+    print("=" * 60)
+    print("TESTE DE GRAVAÇÃO QUE SEMPRE FALHA")
+    print("=" * 60)
+
+    journal = tempfile.mkdtemp()
+    written = []
+    broken = {"planilha_ruim"}
+
+    def writer(df, spreadsheet_id, sheet_index):
+        if spreadsheet_id in broken:
+            raise RuntimeError("400 Bad Request")
+        written.append(spreadsheet_id)
+
+    queue = WriteBehindQueue(writer, journal_dir=journal, retry_delay=0.05, max_attempts=3)
+    queue.enqueue(pd.DataFrame({'v': [1]}), "planilha_ruim")
+    queue.enqueue(pd.DataFrame({'v': [2]}), "planilha_ok")
+
+    # A aba com problema espera o backoff sem bloquear a outra
+    deadline = time.monotonic() + 5
+    while not written and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert written == ["planilha_ok"] and queue.pending("planilha_ruim") is not None
+
+    # Depois de max_attempts a gravação sai da fila e o journal vai para failed/
+    assert queue.flush(timeout=5)
+    status = queue.status()
+    print(f"\n1. Status: {status}")
+    assert status["failed"] == ["planilha_ruim"] and status["pending"] == 0
+    assert sorted(os.listdir(os.path.join(journal, FAILED_SUBDIR))) == ["planilha_ruim__0.json",
+                                                                         "planilha_ruim__0.parquet"]
+
+    # Uma gravação nova da mesma aba volta para a fila
+    broken.clear()
+    queue.enqueue(pd.DataFrame({'v': [3]}), "planilha_ruim")
+    assert queue.status()["failed"] == []
+    assert queue.flush(timeout=5) and written == ["planilha_ok", "planilha_ruim"]
+
+    print("\n✅ TESTE PASSOU!")
+
+
+if __name__ == "__main__":
+    try:
+        test_write_behind_queue()
+        test_write_behind_orphan_replay()
+        test_write_behind_poison()
+    except AssertionError as e:
+        print(f"\n❌ TESTE FALHOU! {e}")
+        sys.exit(1)
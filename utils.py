@@ -1,13 +1,20 @@
 import pandas as pd
+import numpy as np
 import os
 import re
 import subprocess
 import json
 import uuid
+import threading
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
+from typing import NamedTuple
 
 import gsheets
+import ml_patterns
 import streamlit as st
+from fingerprint_index import FingerprintIndex, dedup_against_index, row_fingerprints
 
 SETTINGS_FILE = "settings.json"  # Fallback local apenas
 
@@ -52,16 +59,100 @@ DEFAULT_SETTINGS = {
     }
 }
 
+def _run_concurrently(tasks):
+    """
+    Executa funções independentes (leituras de rede) em paralelo.
+    tasks: {nome: função sem argumentos}
+    Retorna (resultados, erros), dois dicts indexados pelo nome da tarefa.
+    O rate limiter do gsheets é thread-safe, então a cota continua respeitada.
+    """
+    # Propagar o contexto do Streamlit para as threads (st.toast/st.error no retry_on_quota)
+    ctx = None
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except Exception:
+        pass
+    
+    def run(fn):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return fn()
+    
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, len(tasks))) as pool:
+        futures = {name: pool.submit(run, fn) for name, fn in tasks.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+    return results, errors
+
+
+class StartupBundle(NamedTuple):
+    """Tudo que o app precisa no primeiro carregamento da sessão."""
+    df: pd.DataFrame
+    income_df: pd.DataFrame
+    settings: dict
+
+
+def load_startup_bundle():
+    """
+    Carrega transações, receitas e configurações em paralelo.
+    O tempo total fica próximo da leitura mais lenta, e não da soma de todas.
+    """
+    # Criar o client na thread principal (cache_resource do Streamlit)
+    try:
+        gsheets.get_gspread_client()
+    except Exception as e:
+        print(f"Aviso: client do Google Sheets indisponível: {e}")
+    
+    results, errors = _run_concurrently({
+        "df": load_data,
+        "income_df": load_income_data,
+        "settings": load_settings,
+    })
+    for name, e in errors.items():
+        print(f"Erro ao carregar '{name}' na inicialização: {e}")
+    
+    # Os loaders já tratam seus próprios erros; aqui é só uma rede de segurança
+    return StartupBundle(
+        df=results["df"] if "df" in results else create_empty_dataframe(),
+        income_df=results["income_df"] if "income_df" in results else _create_empty_income_df(),
+        settings=results["settings"] if "settings" in results else _default_settings(),
+    )
+
+
+def _default_settings():
+    """Configurações padrão, sem rede (mesmos fallbacks do load_settings quando as leituras falham)."""
+    return {
+        "income_sources": DEFAULT_SETTINGS["income_sources"],
+        "categories": DEFAULT_SETTINGS["categories"],
+        "budgets_df": pd.DataFrame(columns=["Categoria", "Valor", "Mes", "Ano"]),
+    }
+
+
 def load_settings():
     """Carrega configurações: Categorias e Metas (Tabular), Outros (JSON legacy)."""
     settings = {}
     
-    # 1. Carregar Legacy/Defaults (para income_sources e backup)
-    legacy = {}
+    # Caminho rápido: as três abas em um único batchGet (ou do espelho local)
     try:
-        legacy = gsheets.read_settings_from_sheet() or {}
-    except:
-        pass
+        legacy_tab, cats_tab, budgets_tab = gsheets.read_settings_tabs()
+        reads = {"legacy": legacy_tab, "categories": cats_tab, "budgets": budgets_tab}
+        read_errors = {}
+    except Exception as e:
+        # Ex: aba inexistente. As leituras individuais criam as abas que faltam.
+        print(f"Aviso: leitura em lote das configurações falhou ({e}). Lendo abas separadamente.")
+        reads, read_errors = _run_concurrently({
+            "legacy": gsheets.read_settings_from_sheet,
+            "categories": gsheets.read_categories,
+            "budgets": gsheets.read_budgets,
+        })
+    
+    # 1. Carregar Legacy/Defaults (para income_sources e backup)
+    legacy = reads.get("legacy") or {}
         
     if not legacy and os.path.exists(SETTINGS_FILE):
         try:
@@ -77,7 +168,9 @@ def load_settings():
     
     # 2. Carregar Categorias (Tabular)
     try:
-        cats = gsheets.read_categories()
+        if "categories" in read_errors:
+            raise read_errors["categories"]
+        cats = reads["categories"]
         if not cats: # Migração ou Falha na Leitura
             print("--- Aviso: Tabela de Categorias vazia ou erro na leitura. Usando Legacy/Default. ---")
             cats = legacy.get("categories", DEFAULT_SETTINGS["categories"])
@@ -96,7 +189,9 @@ def load_settings():
         
     # 3. Carregar Metas (Tabular)
     try:
-        budgets_df = gsheets.read_budgets()
+        if "budgets" in read_errors:
+            raise read_errors["budgets"]
+        budgets_df = reads["budgets"]
         if budgets_df.empty: # Migração
             print("--- Migrando Metas para Tabela ---")
             # Converte dict 'default' para DF
@@ -212,42 +307,46 @@ def get_meta_categories(settings):
     # GARANTIR que não haja espaços em branco extras atrapalhando a comparação
     return [c.strip() for c in raw_cats if isinstance(c, str)]
 
-def load_data():
-    """Carrega os dados da planilha Google Sheets ou cria um DataFrame vazio."""
-    try:
-        df = gsheets.read_sheet_as_dataframe(gsheets.BASE_FINANCEIRA_ID)
-        
-        if df.empty:
-            return create_empty_dataframe()
-        
-        # Converter colunas de data - SEMPRE manter como Timestamp (nunca usar .dt.date)
+def _fetch_data():
+    """Lê e normaliza as transações direto do Google Sheets."""
+    df = gsheets.read_sheet_as_dataframe(gsheets.BASE_FINANCEIRA_ID)
+    
+    if df.empty:
+        return create_empty_dataframe()
+    
+    # Converter colunas de data - SEMPRE manter como Timestamp (nunca usar .dt.date)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
+    
+    # Garantir coluna reference_date
+    if 'reference_date' not in df.columns:
         if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
-        
-        # Garantir coluna reference_date
-        if 'reference_date' not in df.columns:
-            if 'date' in df.columns:
-                 df['reference_date'] = df['date']
-        else:
-             df['reference_date'] = pd.to_datetime(df['reference_date'], format='mixed', errors='coerce')
+             df['reference_date'] = df['date']
+    else:
+         df['reference_date'] = pd.to_datetime(df['reference_date'], format='mixed', errors='coerce')
 
-        # Garantir coluna ID
-        if 'id' not in df.columns:
-            # df['id'] = df.apply(generate_id, axis=1) # Lento
-            df['id'] = [str(uuid.uuid4()) for _ in range(len(df))]
-                
-        # Garantir coluna owner
-        if 'owner' not in df.columns:
-            df['owner'] = "Família"
-        
-        # Converter amount para numérico
-        if 'amount' in df.columns:
-            df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
-                
-        if 'installment_info' in df.columns:
-            df = df.drop(columns=['installment_info'])
+    # Garantir coluna ID
+    if 'id' not in df.columns:
+        # df['id'] = df.apply(generate_id, axis=1) # Lento
+        df['id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+            
+    # Garantir coluna owner
+    if 'owner' not in df.columns:
+        df['owner'] = "Família"
+    
+    # Converter amount para numérico
+    if 'amount' in df.columns:
+        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
             
-        return df
+    if 'installment_info' in df.columns:
+        df = df.drop(columns=['installment_info'])
+        
+    return df
+
+def load_data():
+    """Carrega os dados da planilha Google Sheets (ou do espelho local) ou cria um DataFrame vazio."""
+    try:
+        return gsheets.read_mirrored(gsheets.BASE_FINANCEIRA_ID, "base_financeira", _fetch_data, sheet_index=0)
     except Exception as e:
         print(f"Erro ao carregar dados do Google Sheets: {e}")
         return create_empty_dataframe()
@@ -261,9 +360,12 @@ def create_empty_dataframe():
     return pd.DataFrame(columns=['id', 'date', 'reference_date', 'title', 'amount', 'category', 'owner'])
 
 
-def save_data(df):
-    """Salva o DataFrame na planilha Google Sheets."""
-    gsheets.write_dataframe_to_sheet(df, gsheets.BASE_FINANCEIRA_ID)
+def save_data(df, on_saved=None):
+    """
+    Agenda a gravação do DataFrame na planilha Google Sheets (em segundo plano).
+    on_saved: chamada quando a gravação chegar à planilha.
+    """
+    gsheets.enqueue_write(df, gsheets.BASE_FINANCEIRA_ID, on_success=on_saved)
 
 
 def save_data_and_refresh_liquidas(transactions_df, income_df=None, settings=None):
@@ -279,54 +381,54 @@ def save_data_and_refresh_liquidas(transactions_df, income_df=None, settings=Non
         if settings is None:
             settings = load_settings()
         
-        # Recalcular transações líquidas
-        trans_liq = compute_transacoes_liquidas(transactions_df, settings)
-        save_transacoes_liquidas(trans_liq)
-        
-        # Recalcular receitas líquidas (aplicações vêm das transações!)
-        rec_liq = compute_receitas_liquidas(income_df, transactions_df, settings)
-        save_receitas_liquidas(rec_liq)
+        # Recalcular (só os meses alterados) transações e receitas líquidas
+        # (aplicações vêm das transações!)
+        refresh_liquidas(transactions_df, income_df, settings)
     except Exception as e:
         print(f"Aviso: não foi possível atualizar dados líquidos: {e}")
 
-def load_income_data():
-    """Carrega dados de receitas do Google Sheets ou cria vazio."""
-    try:
-        df = gsheets.read_sheet_as_dataframe(gsheets.RECEITAS_ID)
-        
-        if df.empty:
-            return _create_empty_income_df()
-        
-        # Converter datas - SEMPRE manter como Timestamp
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
-
-        # Garante coluna reference_date
-        if 'reference_date' not in df.columns:
-             if 'date' in df.columns:
-                 df['reference_date'] = df['date']
-        else:
-             df['reference_date'] = pd.to_datetime(df['reference_date'], format='mixed', errors='coerce')
-        
-        # Garante coluna owner
-        if 'owner' not in df.columns:
-            df['owner'] = "Família"
-                
-        # Forçar tipos string para evitar erro do Streamlit (TextColumn vs Float/Nan)
-        text_cols = ['source', 'type', 'recurrence', 'owner']
-        for col in text_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str).replace('nan', '').replace('None', '')
-        
-        # Converter amount para numérico
-        if 'amount' in df.columns:
-            df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
+def _fetch_income_data():
+    """Lê e normaliza as receitas direto do Google Sheets."""
+    df = gsheets.read_sheet_as_dataframe(gsheets.RECEITAS_ID)
+    
+    if df.empty:
+        return _create_empty_income_df()
+    
+    # Converter datas - SEMPRE manter como Timestamp
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
+
+    # Garante coluna reference_date
+    if 'reference_date' not in df.columns:
+         if 'date' in df.columns:
+             df['reference_date'] = df['date']
+    else:
+         df['reference_date'] = pd.to_datetime(df['reference_date'], format='mixed', errors='coerce')
+    
+    # Garante coluna owner
+    if 'owner' not in df.columns:
+        df['owner'] = "Família"
             
-        # Varrer dados corrompidos: Remover linhas sintéticas salvas indevidamente
-        if 'source' in df.columns:
-            df = df[df['source'] != "Aplicação RDB - Resgate RDB"]
+    # Forçar tipos string para evitar erro do Streamlit (TextColumn vs Float/Nan)
+    text_cols = ['source', 'type', 'recurrence', 'owner']
+    for col in text_cols:
+        if col in df.columns:
+            df[col] = df[col].astype(str).replace('nan', '').replace('None', '')
+    
+    # Converter amount para numérico
+    if 'amount' in df.columns:
+        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
         
-        return df
+    # Varrer dados corrompidos: Remover linhas sintéticas salvas indevidamente
+    if 'source' in df.columns:
+        df = df[df['source'] != "Aplicação RDB - Resgate RDB"]
+    
+    return df
+
+def load_income_data():
+    """Carrega dados de receitas do Google Sheets (ou do espelho local) ou cria vazio."""
+    try:
+        return gsheets.read_mirrored(gsheets.RECEITAS_ID, "receitas", _fetch_income_data, sheet_index=0)
     except Exception as e:
         print(f"Erro ao carregar receitas do Google Sheets: {e}")
         return _create_empty_income_df()
@@ -343,9 +445,12 @@ def _create_empty_income_df():
     return df
 
 
-def save_income_data(df):
-    """Salva dados de receitas no Google Sheets."""
-    gsheets.write_dataframe_to_sheet(df, gsheets.RECEITAS_ID)
+def save_income_data(df, on_saved=None):
+    """
+    Agenda a gravação das receitas no Google Sheets (em segundo plano).
+    on_saved: chamada quando a gravação chegar à planilha.
+    """
+    gsheets.enqueue_write(df, gsheets.RECEITAS_ID, on_success=on_saved)
 
 
 def save_income_and_refresh_liquidas(income_df, transactions_df=None, settings=None):
@@ -362,8 +467,7 @@ def save_income_and_refresh_liquidas(income_df, transactions_df=None, settings=N
         if settings is None:
             settings = load_settings()
         
-        rec_liq = compute_receitas_liquidas(income_df, transactions_df, settings)
-        save_receitas_liquidas(rec_liq)
+        refresh_liquidas(transactions_df, income_df, settings)
     except Exception as e:
         print(f"Aviso: não foi possível atualizar receitas líquidas: {e}")
 
@@ -372,71 +476,62 @@ def save_income_and_refresh_liquidas(income_df, transactions_df=None, settings=N
 # RECEITAS LÍQUIDAS E TRANSAÇÕES LÍQUIDAS
 # ============================================================
 
-def compute_receitas_liquidas(income_df, transactions_df, settings):
+def _to_datetime_cols(df):
+    """Garante datetime nas colunas de data (cópia)."""
+    out = df.copy()
+    for col in ['date', 'reference_date']:
+        if col in out.columns:
+            out[col] = pd.to_datetime(out[col], format='mixed', errors='coerce')
+    return out
+
+
+def _ref_col(df):
+    """Coluna usada para agrupar por mês: reference_date (fallback: date)."""
+    return 'reference_date' if 'reference_date' in df.columns else 'date'
+
+
+def _resgate_mask(income_df):
+    return income_df['source'].astype(str).str.contains('resgate', case=False, na=False)
+
+
+def _aplicacao_rdb_mask(transactions_df):
+    # Filtro ESTRITO: "Aplicação RDB"
+    return transactions_df['title'].astype(str).str.contains(
+        r'aplica[çc][ãa]o\s+rdb', case=False, na=False, regex=True
+    )
+
+
+def _synthetic_rdb_rows(income_df, transactions_df):
     """
-    Calcula as receitas líquidas a partir dos dados brutos.
-    - Exclui resgates individuais
-    - Adiciona linhas sintéticas 'Aplicação RDB - Resgate RDB' POR MÊS
-      com o rendimento líquido calculado a partir das datas reais.
-    
-    Returns:
-        DataFrame com receitas líquidas
+    Linhas sintéticas 'Aplicação RDB - Resgate RDB' (uma por mês) com o rendimento
+    líquido do mês. Recebe dados já com datetime; só os meses presentes nos dados
+    entram no resultado (usado também no recálculo parcial por mês).
     """
-    if income_df.empty:
-        return income_df
-    
-    result = income_df.copy()
-    
-    # Garantir datetime nas colunas de data
-    for col in ['date', 'reference_date']:
-        if col in result.columns:
-            result[col] = pd.to_datetime(result[col], format='mixed', errors='coerce')
-    
-    # Usar reference_date para agrupamento (fallback: date)
-    ref_col = 'reference_date' if 'reference_date' in result.columns else 'date'
-    
-    # 1. Separar resgates e agrupar por ano-mês
-    mask_resgate = result['source'].astype(str).str.contains('resgate', case=False, na=False)
-    resgates_df = result[mask_resgate].copy()
-    
-    # Remover resgates individuais do resultado
-    result = result[~mask_resgate].copy()
-    
-    # Agrupar resgates por ano-mês
+    # 1. Resgates por ano-mês
     resgates_por_mes = {}
+    resgates_df = income_df[_resgate_mask(income_df)] if not income_df.empty else income_df
     if not resgates_df.empty:
-        resgates_df['_ym'] = resgates_df[ref_col].dt.to_period('M')
-        resgates_por_mes = resgates_df.groupby('_ym')['amount'].sum().to_dict()
-    
-    # 2. Calcular aplicações por mês (filtro ESTRITO: "Aplicação RDB")
+        ym = resgates_df[_ref_col(resgates_df)].dt.to_period('M')
+        resgates_por_mes = resgates_df['amount'].groupby(ym).sum().to_dict()
+
+    # 2. Aplicações por ano-mês
     aplicacoes_por_mes = {}
     if not transactions_df.empty:
-        trans = transactions_df.copy()
-        for col in ['date', 'reference_date']:
-            if col in trans.columns:
-                trans[col] = pd.to_datetime(trans[col], format='mixed', errors='coerce')
-        
-        ref_col_trans = 'reference_date' if 'reference_date' in trans.columns else 'date'
-        
-        cond_title = trans['title'].astype(str).str.contains(
-            r'aplica[çc][ãa]o\s+rdb', case=False, na=False, regex=True
-        )
-        aplic_df = trans[cond_title].copy()
-        
+        aplic_df = transactions_df[_aplicacao_rdb_mask(transactions_df)]
         if not aplic_df.empty:
-            aplic_df['_ym'] = aplic_df[ref_col_trans].dt.to_period('M')
-            aplicacoes_por_mes = aplic_df.groupby('_ym')['amount'].sum().to_dict()
-    
-    # 3. Calcular rendimento líquido POR MÊS e criar linhas sintéticas
+            ym = aplic_df[_ref_col(aplic_df)].dt.to_period('M')
+            aplicacoes_por_mes = aplic_df['amount'].groupby(ym).sum().to_dict()
+
+    # 3. Rendimento líquido POR MÊS
     all_months = set(list(resgates_por_mes.keys()) + list(aplicacoes_por_mes.keys()))
-    
+
     synth_rows = []
     for ym in sorted(all_months):
         aplic_m = aplicacoes_por_mes.get(ym, 0)
         resgat_m = resgates_por_mes.get(ym, 0)
         rendimento_receita = abs(aplic_m - resgat_m)    # Receitas: sempre positivo
         investimento_meta = aplic_m - resgat_m           # Metas: assinado
-        
+
         if rendimento_receita > 0 or aplic_m > 0 or resgat_m > 0:
             month_date = ym.to_timestamp()
             synth_rows.append({
@@ -449,19 +544,44 @@ def compute_receitas_liquidas(income_df, transactions_df, settings):
                 "recurrence": "Única",
                 "owner": "Família"
             })
-    
+    return synth_rows
+
+
+def _assemble_receitas_liquidas(synth_rows, income_kept):
+    """Sintéticas primeiro, depois as receitas mantidas; investimento_meta = 0 nas não-sintéticas."""
+    result = income_kept
     if synth_rows:
-        synth_df = pd.DataFrame(synth_rows)
-        result = pd.concat([synth_df, result], ignore_index=True)
-    
-    # Garantir coluna investimento_meta em todas as linhas (0 para não-sintéticas)
+        result = pd.concat([pd.DataFrame(synth_rows), result], ignore_index=True)
     if 'investimento_meta' not in result.columns:
         result['investimento_meta'] = 0.0
     result['investimento_meta'] = result['investimento_meta'].fillna(0.0)
-    
     return result
 
 
+def compute_receitas_liquidas(income_df, transactions_df, settings):
+    """
+    Calcula as receitas líquidas a partir dos dados brutos.
+    - Exclui resgates individuais
+    - Adiciona linhas sintéticas 'Aplicação RDB - Resgate RDB' POR MÊS
+      com o rendimento líquido calculado a partir das datas reais.
+    
+    Returns:
+        DataFrame com receitas líquidas
+    """
+    if income_df.empty:
+        return income_df
+    
+    result = _to_datetime_cols(income_df)
+    trans = _to_datetime_cols(transactions_df) if not transactions_df.empty else transactions_df
+    
+    synth_rows = _synthetic_rdb_rows(result, trans)
+    
+    # Remover resgates individuais do resultado
+    income_kept = result[~_resgate_mask(result)].copy()
+    
+    return _assemble_receitas_liquidas(synth_rows, income_kept)
+
+
 def compute_investimento_mensal(income_df, transactions_df, month, year, view_mode="date"):
     """
     Calcula o investimento líquido ASSINADO para um mês específico.
@@ -517,141 +637,403 @@ def compute_transacoes_liquidas(transactions_df, settings):
     
     result = transactions_df.copy()
     
+    # Manter apenas as que NÃO são Meta nem Aplicação
+    result = result[_transacoes_liquidas_mask(result, get_meta_categories(settings))].copy()
+    
+    return result
+
+
+def _transacoes_liquidas_mask(transactions_df, meta_cats):
+    """True para as transações que entram nas líquidas (nem Meta nem Aplicação)."""
     # Excluir categorias Meta
-    meta_cats = get_meta_categories(settings)
-    cond_meta = result['category'].isin(meta_cats) if meta_cats else pd.Series(False, index=result.index)
+    cond_meta = transactions_df['category'].isin(meta_cats) if meta_cats else pd.Series(False, index=transactions_df.index)
     
     # Excluir transações com título "Aplicação RDB" (investimento, não despesa)
-    cond_title = result['title'].astype(str).str.contains('aplica', case=False, na=False)
+    cond_title = transactions_df['title'].astype(str).str.contains('aplica', case=False, na=False)
     
-    # Manter apenas as que NÃO são Meta nem Aplicação
-    result = result[~(cond_meta | cond_title)].copy()
+    return ~(cond_meta | cond_title)
+
+
+# ------------------------------------------------------------
+# Recálculo incremental das líquidas por partição (ano, mês, owner)
+# ------------------------------------------------------------
+# Guarda, da última vez que as líquidas foram calculadas neste processo:
+# - metadados por linha das transações/receitas brutas (chave, digest, partição)
+# - quais linhas brutas foram mantidas nas líquidas (por chave)
+# - as linhas sintéticas de RDB por mês
+# Numa nova gravação, só as partições que mudaram são recalculadas; o resto é
+# reaproveitado. A escrita delta do gsheets então só envia as linhas afetadas.
+_liquidas_state = None
+_liquidas_lock = threading.Lock()
+
+
+def _invalidate_liquidas_on_failure(spreadsheet_id, sheet_index, error):
+    """
+    As gravações das líquidas vão para a fila em segundo plano: se uma delas
+    falhar, o estado não reflete mais a planilha e o próximo cálculo é completo.
+    """
+    global _liquidas_state
+    if spreadsheet_id in (gsheets.RECEITAS_LIQUIDAS_ID, gsheets.TRANSACOES_LIQUIDAS_ID):
+        with _liquidas_lock:
+            _liquidas_state = None
+
+
+gsheets.add_write_failure_listener(_invalidate_liquidas_on_failure)
+
+
+def _row_meta(df):
+    """
+    Metadados por linha: key (id, se único; senão conteúdo + ocorrência), digest do
+    conteúdo e partição (year, month, owner) pela coluna de referência. Datas
+    inválidas caem na partição (0, 0).
+    """
+    if df.empty:
+        return pd.DataFrame({'key': pd.Series(dtype=object), 'digest': pd.Series(dtype='uint64'),
+                             'year': pd.Series(dtype=int), 'month': pd.Series(dtype=int),
+                             'owner': pd.Series(dtype=object)})
+    digest = pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+    if 'id' in df.columns and df['id'].is_unique:
+        key = df['id'].astype(str).to_numpy()
+    else:
+        occurrence = pd.Series(digest).groupby(digest).cumcount().to_numpy()
+        key = pd.Series(digest).astype(str).str.cat(pd.Series(occurrence).astype(str), sep='#').to_numpy()
+    ref = df[_ref_col(df)] if _ref_col(df) in df.columns else pd.Series(pd.NaT, index=df.index)
+    ref = pd.to_datetime(ref, format='mixed', errors='coerce')
+    owner = df['owner'].astype(str) if 'owner' in df.columns else pd.Series("Família", index=df.index)
+    return pd.DataFrame({
+        'key': key,
+        'digest': digest,
+        'year': ref.dt.year.fillna(0).astype(int).to_numpy(),
+        'month': ref.dt.month.fillna(0).astype(int).to_numpy(),
+        'owner': owner.to_numpy(),
+    })
+
+
+def _dirty_partitions(old_meta, new_meta):
+    """Partições (year, month, owner) com linhas adicionadas, removidas ou alteradas."""
+    merged = old_meta.merge(new_meta, on='key', how='outer', suffixes=('_old', '_new'), indicator=True)
+    changed = (merged['_merge'] != 'both') | (merged['digest_old'] != merged['digest_new'])
+    merged = merged[changed]
+    dirty = set()
+    for side in ('_old', '_new'):
+        part = merged[['year' + side, 'month' + side, 'owner' + side]].dropna()
+        dirty.update((int(y), int(m), str(o)) for y, m, o in part.itertuples(index=False))
+    return dirty
+
+
+def _in_partitions(meta, partitions):
+    """Máscara (numpy) das linhas de `meta` que pertencem a `partitions`."""
+    if not partitions or meta.empty:
+        return np.zeros(len(meta), dtype=bool)
+    index = pd.MultiIndex.from_arrays([meta['year'], meta['month'], meta['owner']])
+    return index.isin(list(partitions))
+
+
+def _splice_keep(meta, prev_keep, dirty, compute_mask):
+    """
+    Máscara de linhas mantidas: partições limpas reaproveitam a decisão anterior
+    (por chave); só as linhas das partições sujas passam por `compute_mask`.
+    """
+    dirty_rows = _in_partitions(meta, dirty)
+    keep = pd.Series(meta['key'].to_numpy()).map(prev_keep).fillna(False).astype(bool).to_numpy().copy()
+    if dirty_rows.any():
+        keep[dirty_rows] = compute_mask(dirty_rows)
+    return keep
+
+
+def _month_periods(partitions):
+    return {pd.Period(year=y, month=m, freq='M') for y, m, _ in partitions if y > 0}
+
+
+def refresh_liquidas(transactions_df, income_df, settings, save=True, full=False):
+    """
+    Recalcula transações e receitas líquidas só nas partições (ano, mês, owner)
+    alteradas desde o último cálculo, e grava (se `save`) apenas as planilhas que
+    mudaram — a escrita delta do gsheets envia só as linhas afetadas.
+    Sem estado anterior, com metas alteradas ou com `full=True`, recalcula tudo.
     
-    return result
+    Returns:
+        (transacoes_liquidas, receitas_liquidas)
+    """
+    global _liquidas_state
+    meta_cats = tuple(sorted(get_meta_categories(settings)))
+    trans_meta = _row_meta(transactions_df)
+    inc_meta = _row_meta(income_df)
+    
+    with _liquidas_lock:
+        prev = _liquidas_state
+    if full or prev is None or prev['meta_cats'] != meta_cats:
+        prev = None
+    
+    # --- Transações líquidas (filtro linha a linha) ---
+    if prev is None:
+        trans_dirty = None
+        trans_keep = (_transacoes_liquidas_mask(transactions_df, list(meta_cats)).to_numpy()
+                      if not transactions_df.empty else np.zeros(0, dtype=bool))
+    else:
+        trans_dirty = _dirty_partitions(prev['trans_meta'], trans_meta)
+        trans_keep = _splice_keep(
+            trans_meta, prev['trans_keep'], trans_dirty,
+            lambda rows: _transacoes_liquidas_mask(transactions_df[rows], list(meta_cats)).to_numpy())
+    trans_liq = transactions_df.copy() if transactions_df.empty else transactions_df[trans_keep].copy()
+    
+    # --- Receitas líquidas (resgates removidos + sintéticas por mês) ---
+    if income_df.empty:
+        inc_dirty = None if prev is None else _dirty_partitions(prev['inc_meta'], inc_meta)
+        inc_keep, synth_by_month = np.zeros(0, dtype=bool), {}
+        rec_liq = income_df
+    else:
+        income = _to_datetime_cols(income_df)
+        trans = _to_datetime_cols(transactions_df) if not transactions_df.empty else transactions_df
+        if prev is None:
+            inc_dirty = None
+            inc_keep = (~_resgate_mask(income)).to_numpy()
+            synth_rows = _synthetic_rdb_rows(income, trans)
+            synth_by_month = {pd.Period(r['date'], freq='M'): r for r in synth_rows}
+        else:
+            inc_dirty = _dirty_partitions(prev['inc_meta'], inc_meta)
+            inc_keep = _splice_keep(inc_meta, prev['inc_keep'], inc_dirty,
+                                    lambda rows: (~_resgate_mask(income[rows])).to_numpy())
+            # Sintéticas dependem de resgates (receitas) e aplicações (transações) do mês
+            months = _month_periods(inc_dirty | trans_dirty)
+            synth_by_month = {ym: r for ym, r in prev['synth_by_month'].items() if ym not in months}
+            if months:
+                inc_month = income[_ref_col(income)].dt.to_period('M').isin(months).to_numpy()
+                trans_month = (trans[_ref_col(trans)].dt.to_period('M').isin(months).to_numpy()
+                               if not trans.empty else np.zeros(0, dtype=bool))
+                for r in _synthetic_rdb_rows(income[inc_month], trans[trans_month] if not trans.empty else trans):
+                    synth_by_month[pd.Period(r['date'], freq='M')] = r
+        synth_rows = [synth_by_month[ym] for ym in sorted(synth_by_month)]
+        rec_liq = _assemble_receitas_liquidas(synth_rows, income[inc_keep].copy())
+    
+    if save:
+        if trans_dirty is None or trans_dirty:
+            save_transacoes_liquidas(trans_liq)
+        if inc_dirty is None or inc_dirty or _month_periods(trans_dirty or set()):
+            save_receitas_liquidas(rec_liq)
+    
+    # As gravações só foram agendadas: se o envio falhar, _invalidate_liquidas_on_failure
+    # descarta este estado e o próximo cálculo é completo
+    with _liquidas_lock:
+        _liquidas_state = {
+            'meta_cats': meta_cats,
+            'trans_meta': trans_meta,
+            'trans_keep': dict(zip(trans_meta['key'], trans_keep)),
+            'inc_meta': inc_meta,
+            'inc_keep': dict(zip(inc_meta['key'], inc_keep)),
+            'synth_by_month': synth_by_month,
+        }
+    
+    return trans_liq, rec_liq
 
 
 def save_receitas_liquidas(df):
-    """Salva receitas líquidas na planilha Google Sheets."""
-    gsheets.write_dataframe_to_sheet(df, gsheets.RECEITAS_LIQUIDAS_ID)
+    """Agenda a gravação das receitas líquidas (em segundo plano)."""
+    gsheets.enqueue_write(df, gsheets.RECEITAS_LIQUIDAS_ID)
 
 
 def save_transacoes_liquidas(df):
-    """Salva transações líquidas na planilha Google Sheets."""
-    gsheets.write_dataframe_to_sheet(df, gsheets.TRANSACOES_LIQUIDAS_ID)
+    """Agenda a gravação das transações líquidas (em segundo plano)."""
+    gsheets.enqueue_write(df, gsheets.TRANSACOES_LIQUIDAS_ID)
+
 
+def _fetch_receitas_liquidas():
+    """Lê e normaliza as receitas líquidas direto do Google Sheets."""
+    df = gsheets.read_sheet_as_dataframe(gsheets.RECEITAS_LIQUIDAS_ID)
+    if df.empty:
+        return _create_empty_income_df()
+    
+    # Manter como Timestamp (não converter para .date) para compatibilidade com Projeções
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
+    if 'reference_date' in df.columns:
+        df['reference_date'] = pd.to_datetime(df['reference_date'], format='mixed', errors='coerce')
+    if 'owner' not in df.columns:
+        df['owner'] = "Família"
+    if 'amount' in df.columns:
+        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
+    if 'investimento_meta' in df.columns:
+        df['investimento_meta'] = pd.to_numeric(df['investimento_meta'], errors='coerce').fillna(0.0)
+    else:
+        df['investimento_meta'] = 0.0
+    
+    text_cols = ['source', 'type', 'recurrence', 'owner']
+    for col in text_cols:
+        if col in df.columns:
+            df[col] = df[col].astype(str).replace('nan', '').replace('None', '')
+    
+    return df
 
 def load_receitas_liquidas():
-    """Carrega receitas líquidas do Google Sheets."""
+    """Carrega receitas líquidas do Google Sheets (ou do espelho local)."""
     try:
-        df = gsheets.read_sheet_as_dataframe(gsheets.RECEITAS_LIQUIDAS_ID)
-        if df.empty:
-            return _create_empty_income_df()
-        
-        # Manter como Timestamp (não converter para .date) para compatibilidade com Projeções
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
-        if 'reference_date' in df.columns:
-            df['reference_date'] = pd.to_datetime(df['reference_date'], format='mixed', errors='coerce')
-        if 'owner' not in df.columns:
-            df['owner'] = "Família"
-        if 'amount' in df.columns:
-            df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
-        if 'investimento_meta' in df.columns:
-            df['investimento_meta'] = pd.to_numeric(df['investimento_meta'], errors='coerce').fillna(0.0)
-        else:
-            df['investimento_meta'] = 0.0
-        
-        text_cols = ['source', 'type', 'recurrence', 'owner']
-        for col in text_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str).replace('nan', '').replace('None', '')
-        
-        return df
+        return gsheets.read_mirrored(gsheets.RECEITAS_LIQUIDAS_ID, "receitas_liquidas", _fetch_receitas_liquidas, sheet_index=0)
     except Exception as e:
         print(f"Erro ao carregar receitas líquidas: {e}")
         return _create_empty_income_df()
 
 
+def _fetch_transacoes_liquidas():
+    """Lê e normaliza as transações líquidas direto do Google Sheets."""
+    df = gsheets.read_sheet_as_dataframe(gsheets.TRANSACOES_LIQUIDAS_ID)
+    if df.empty:
+        return create_empty_dataframe()
+    
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
+    if 'reference_date' in df.columns:
+        df['reference_date'] = pd.to_datetime(df['reference_date'], format='mixed', errors='coerce')
+    if 'amount' in df.columns:
+        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
+    
+    return df
+
 def load_transacoes_liquidas():
-    """Carrega transações líquidas do Google Sheets."""
+    """Carrega transações líquidas do Google Sheets (ou do espelho local)."""
     try:
-        df = gsheets.read_sheet_as_dataframe(gsheets.TRANSACOES_LIQUIDAS_ID)
-        if df.empty:
-            return create_empty_dataframe()
-        
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
-        if 'reference_date' in df.columns:
-            df['reference_date'] = pd.to_datetime(df['reference_date'], format='mixed', errors='coerce')
-        if 'amount' in df.columns:
-            df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
-        
-        return df
+        return gsheets.read_mirrored(gsheets.TRANSACOES_LIQUIDAS_ID, "transacoes_liquidas", _fetch_transacoes_liquidas, sheet_index=0)
     except Exception as e:
         print(f"Erro ao carregar transações líquidas: {e}")
         return create_empty_dataframe()
 
-def categorize_transaction(title):
-    """Categoriza a transação com base no título, usando regras refinadas."""
-    title_lower = title.lower()
-    
-    # Regras de Negócio (Ordem importa: regras mais específicas primeiro)
-    
+# Regras de Negócio (Ordem importa: regras mais específicas primeiro).
+# A posição na lista é a prioridade: se o título contém palavras de várias
+# regras, vence a que aparece primeiro.
+CATEGORY_RULES = [
     # 1. Receitas / Pagamentos
-    if any(x in title_lower for x in ['pagamento recebido', 'ajuste a crédito', 'estorno']):
-        return 'Pagamento/Crédito'
-        
+    ('Pagamento/Crédito', ['pagamento recebido', 'ajuste a crédito', 'estorno']),
     # 2. Moradia (Fixo)
-    if any(x in title_lower for x in ['claro', 'vivo', 'tim', 'oi', 'net', 'enel', 'sabesp', 'condominio', 'aluguel', 'iptu', 'luz', 'agua', 'gas', 'imobiliaria']):
-        return 'Moradia'
-
+    ('Moradia', ['claro', 'vivo', 'tim', 'oi', 'net', 'enel', 'sabesp', 'condominio', 'aluguel', 'iptu', 'luz', 'agua', 'gas', 'imobiliaria']),
     # 3. Mercado / Alimentação Essencial
-    if any(x in title_lower for x in ['mercado', 'supermercado', 'assai', 'carrefour', 'pão de açúcar', 'extra', 'chama', 'açougue', 'sacolão', 'hortifruti', 'atacadista', 'hirota', 'aneto']):
-        return 'Alimentação (Mercado/Sacolão)'
-        
+    ('Alimentação (Mercado/Sacolão)', ['mercado', 'supermercado', 'assai', 'carrefour', 'pão de açúcar', 'extra', 'chama', 'açougue', 'sacolão', 'hortifruti', 'atacadista', 'hirota', 'aneto']),
     # 4. Transporte (Carro / Combustível / Estacionamento)
-    if any(x in title_lower for x in ['posto', 'abastece', 'estacionamento', 'sem par', 'veloe', 'w r car', 'ipva', 'seguro auto', 'mecanica', 'auto posto', 'gasolina', 'park']):
-        return 'Transporte (Combustível/Estacionamento/Manutenção)'
-
+    ('Transporte (Combustível/Estacionamento/Manutenção)', ['posto', 'abastece', 'estacionamento', 'sem par', 'veloe', 'w r car', 'ipva', 'seguro auto', 'mecanica', 'auto posto', 'gasolina', 'park']),
     # 5. Transporte (Uber / 99)
-    if any(x in title_lower for x in ['uber', '99app', '99*', 'taxi', 'pop']):
-        return 'Transporte (Uber/99)'
-
+    ('Transporte (Uber/99)', ['uber', '99app', '99*', 'taxi', 'pop']),
     # 6. Saúde (Farmácia / Convênio)
-    if any(x in title_lower for x in ['farmacia', 'drogasil', 'drogaria', 'drugstore', 'saude', 'hospital', 'clinica', 'medico', 'laboratorio', 'genera', 'promofarma']):
-        return 'Saúde/Farmácia'
-        
+    ('Saúde/Farmácia', ['farmacia', 'drogasil', 'drogaria', 'drugstore', 'saude', 'hospital', 'clinica', 'medico', 'laboratorio', 'genera', 'promofarma']),
     # 7. Pets based on 'Cobasi', 'Petz', 'Bichosdomato'
-    if any(x in title_lower for x in ['pet', 'cobasi', 'bichos', 'veterinario', 'banho e tosa']):
-        return 'Pets'
-        
+    ('Pets', ['pet', 'cobasi', 'bichos', 'veterinario', 'banho e tosa']),
     # 8. Assinaturas / Serviços Digitais
-    if any(x in title_lower for x in ['spotify', 'netflix', 'youtube', 'prime', 'hbo', 'disney', 'nubank', 'anuidade', 'tarifa', 'google', 'apple']):
-        return 'Assinaturas/Serviços'
-        
+    ('Assinaturas/Serviços', ['spotify', 'netflix', 'youtube', 'prime', 'hbo', 'disney', 'nubank', 'anuidade', 'tarifa', 'google', 'apple']),
     # 9. Lazer / Restaurantes
-    if any(x in title_lower for x in ['ifood', 'ifd*', 'delivery', 'restaurante', 'choperia', 'padaria', 'burger', 'pizza', 'mcdonald', 'bk ', 'food', 'lanches', 'bar ', 'gastrobar', 'pizzaria', 'sorvetes', 'loteria', 'jogos', 'steam', 'cinema', 'ingresso']):
-        return 'Lazer/Restaurantes'
-
+    ('Lazer/Restaurantes', ['ifood', 'ifd*', 'delivery', 'restaurante', 'choperia', 'padaria', 'burger', 'pizza', 'mcdonald', 'bk ', 'food', 'lanches', 'bar ', 'gastrobar', 'pizzaria', 'sorvetes', 'loteria', 'jogos', 'steam', 'cinema', 'ingresso']),
     # 10. Pessoal / Vestuário
-    if any(x in title_lower for x in ['shopee', 'aliexpress', 'amazon', 'mercadolivre', 'magalu', 'shein', 'bravium', 'confeccoes', 'magazine', 'lojas', 'store', 'roupas', 'calcados', 'perfumaria', 'cosmetico', 'cabelo', 'barbearia']):
-        return 'Pessoal/Vestuário'
-        
+    ('Pessoal/Vestuário', ['shopee', 'aliexpress', 'amazon', 'mercadolivre', 'magalu', 'shein', 'bravium', 'confeccoes', 'magazine', 'lojas', 'store', 'roupas', 'calcados', 'perfumaria', 'cosmetico', 'cabelo', 'barbearia']),
     # 11. Educação / Cursos
-    if any(x in title_lower for x in ['curso', 'escola', 'faculdade', 'udemy', 'alura', 'hotmart', 'educacao']):
-        return 'Educação/Cursos'
-        
+    ('Educação/Cursos', ['curso', 'escola', 'faculdade', 'udemy', 'alura', 'hotmart', 'educacao']),
     # 12. Manutenção Casa
-    if any(x in title_lower for x in ['leroy', 'cec', 'telhanorte', 'ferragens', 'construcao', 'telha']):
-        return 'Manutenção Casa'
-        
-    # Default
-    if 'pg *' in title_lower or 'mp *' in title_lower:
-        return 'Outros' # Tenta pegar casos genéricos de maquininha
-        
-    return 'Outros'
+    ('Manutenção Casa', ['leroy', 'cec', 'telhanorte', 'ferragens', 'construcao', 'telha']),
+]
+DEFAULT_CATEGORY = 'Outros'
+
+
+def _compile_category_rules(rules):
+    """
+    Compila todas as palavras-chave em uma única regex de alternação dentro de um
+    lookahead: em cada posição do título, a alternativa que casa primeiro é a de
+    maior prioridade (as palavras vão em ordem de prioridade). O menor índice
+    entre todas as posições é exatamente a primeira regra que o if/any encadeado
+    escolheria.
+    """
+    priority = {}
+    for i, (_, keywords) in enumerate(rules):
+        for kw in keywords:
+            priority.setdefault(kw, i)
+    ordered = sorted(priority, key=lambda kw: priority[kw])
+    pattern = re.compile("(?=(" + "|".join(re.escape(kw) for kw in ordered) + "))")
+    return pattern, priority
+
+
+_CATEGORY_PATTERN, _KEYWORD_PRIORITY = _compile_category_rules(CATEGORY_RULES)
 
 
+def _rule_priority(title_lower):
+    """Índice da regra vencedora para um título já em minúsculas (None se nenhuma)."""
+    best = None
+    for m in _CATEGORY_PATTERN.finditer(title_lower):
+        p = _KEYWORD_PRIORITY[m.group(1)]
+        if best is None or p < best:
+            best = p
+            if p == 0:
+                break
+    return best
+
+
+def categorize_transaction(title):
+    """Categoriza a transação com base no título, usando regras refinadas."""
+    best = _rule_priority(title.lower())
+    return CATEGORY_RULES[best][0] if best is not None else DEFAULT_CATEGORY
+
+
+def categorize_series(titles):
+    """
+    Categoriza uma Series de títulos de uma vez (mesmo resultado de
+    categorize_transaction linha a linha). Cada título distinto passa pela
+    regex compilada uma única vez.
+    """
+    titles = pd.Series(titles)
+    lowered = titles.astype(str).str.lower()
+    by_title = {}
+    for t in pd.unique(lowered):
+        best = _rule_priority(t)
+        by_title[t] = CATEGORY_RULES[best][0] if best is not None else DEFAULT_CATEGORY
+    return lowered.map(by_title).rename(titles.name)
+
+
+def categorize_frame(df, learned_patterns=None, k=1):
+    """
+    Sugere categorias para todas as transações de `df` de uma vez:
+    1. Regras fixas (CATEGORY_RULES)
+    2. Se as regras não resolverem ('Outros'): valor exato aprendido (do
+       dono, depois geral), depois votos das palavras-chave aprendidas
+       (ml_patterns.suggest_batch)
+    
+    k > 1: também traz as outras k-1 melhores sugestões aprendidas.
+    
+    Returns:
+        DataFrame com o mesmo índice de `df` e colunas:
+        - suggested: categoria sugerida ('Outros' quando nada resolveu)
+        - source: "regra", "valor", "palavras" ou "padrão"
+        - confidence: 0.0 a 1.0 (regra = 1.0, padrão = 0.0)
+        - alternatives (só com k > 1): texto "Categoria (NN%), ..." ou ""
+    """
+    if df.empty:
+        result = pd.DataFrame({'suggested': pd.Series(dtype=object), 'source': pd.Series(dtype=object),
+                               'confidence': pd.Series(dtype=float)}, index=df.index)
+        if k > 1:
+            result['alternatives'] = pd.Series(dtype=object)
+        return result
+    
+    rules = categorize_series(df['title']).set_axis(df.index)
+    result = pd.DataFrame({'suggested': rules, 'source': "regra", 'confidence': 1.0}, index=df.index)
+    if k > 1:
+        result['alternatives'] = ""
+    
+    unresolved = rules == DEFAULT_CATEGORY
+    if unresolved.any() and learned_patterns:
+        amounts = df.loc[unresolved, 'amount'] if 'amount' in df.columns else None
+        owners = df.loc[unresolved, 'owner'] if 'owner' in df.columns else None
+        learned = ml_patterns.suggest_batch(df.loc[unresolved, 'title'], amounts, learned_patterns, k=k, owners=owners)
+        hit = learned['category_1'].notna()
+        idx = learned.index[hit]
+        result.loc[idx, 'suggested'] = learned.loc[hit, 'category_1']
+        result.loc[idx, 'source'] = learned.loc[hit, 'source']
+        result.loc[idx, 'confidence'] = learned.loc[hit, 'score_1']
+        if k > 1:
+            alternatives = pd.Series("", index=learned.index)
+            for i in range(2, k + 1):
+                cat = learned[f'category_{i}']
+                label = cat + " (" + (learned[f'score_{i}'] * 100).round().astype(int).astype(str) + "%)"
+                label = label.where(cat.notna(), "")
+                alternatives = alternatives.str.cat(label, sep=", ").str.strip(", ")
+            result.loc[learned.index, 'alternatives'] = alternatives
+    
+    fallback = unresolved & (result['source'] == "regra")
+    result.loc[fallback, 'source'] = "padrão"
+    result.loc[fallback, 'confidence'] = 0.0
+    return result
+
 
 import re
 
@@ -912,7 +1294,7 @@ def process_uploaded_file(uploaded_file, reference_date=None, owner="Família"):
         # --- Enriquecer Despesas ---
         final_expenses = pd.DataFrame()
         if hasattr(expenses_data, 'empty') and not expenses_data.empty:
-            expenses_data['category'] = expenses_data['title'].apply(categorize_transaction)
+            expenses_data['category'] = categorize_frame(expenses_data)['suggested']
 
             if reference_date:
                 expenses_data['reference_date'] = reference_date
@@ -936,6 +1318,52 @@ def process_uploaded_file(uploaded_file, reference_date=None, owner="Família"):
     except Exception as e:
         return None, f"Erro ao processar CSV: {str(e)}"
 
+TRANSACTION_KEY_COLUMNS = ['date', 'title', 'amount', 'owner']
+INCOME_KEY_COLUMNS = ['date', 'source', 'amount', 'owner', 'reference_date']
+
+
+def _dedup_new_rows(current_df, new_df, columns, name, id_column=None):
+    """
+    Linhas de `new_df` que ainda não existem em `current_df` (nem repetidas no
+    próprio lote), pelo índice persistente de fingerprints da base `name`.
+    O índice vale para a revisão da planilha em que a base foi lida; se há
+    gravação pendente, a base local está à frente da planilha e ele é refeito.
+    Se o índice (SQLite) falhar, compara em memória.
+    Retorna (linhas_novas, quantidade_de_duplicatas, (índice, fingerprints_novos, nº de linhas da base) ou None).
+    """
+    try:
+        index = FingerprintIndex(name)
+        if gsheets.has_pending_write(name):
+            index.mark_stale()
+        new_rows, duplicates, new_fp = dedup_against_index(
+            index, current_df, new_df, columns, id_column, gsheets.known_revision(name))
+        return new_rows, duplicates, (index, new_fp, len(current_df))
+    except (sqlite3.Error, OSError) as e:
+        print(f"Aviso: índice de fingerprints indisponível ({e}). Comparando em memória.")
+    new_fp = row_fingerprints(new_df, columns)
+    is_dup = new_fp.duplicated()
+    if not current_df.empty:
+        is_dup |= new_fp.isin(row_fingerprints(current_df, columns))
+    return new_df[~is_dup.to_numpy()], int(is_dup.sum()), None
+
+
+def _index_added_rows(indexed, row_ids=None):
+    """
+    Callback (on_saved) que registra no índice as linhas importadas quando a
+    gravação chegar à planilha, na revisão em que ela ficou depois disso.
+    """
+    if indexed is None:
+        return None
+    index, new_fp, base_count = indexed
+
+    def on_saved():
+        try:
+            index.add(new_fp, row_ids, gsheets.known_revision(index.name), base_count)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Aviso: não foi possível atualizar o índice de fingerprints: {e}")
+    return on_saved
+
+
 def merge_and_save(current_df, new_df):
     """Mescla novos dados de DESPESAS com os atuais."""
     if new_df.empty: return current_df, 0
@@ -944,34 +1372,18 @@ def merge_and_save(current_df, new_df):
     if not current_df.empty and 'id' not in current_df.columns:
         current_df['id'] = current_df.apply(generate_id, axis=1)
         
-    # Usar HASH baseado em conteúdo para deduplicação robusta
-    def get_hash(row):
-        return hash((str(row.get('date', '')), str(row.get('title', '')), str(row.get('amount', '')), str(row.get('owner', ''))))
-        
-    if not current_df.empty:
-        current_hashes = set(current_df.apply(get_hash, axis=1))
-    else:
-        current_hashes = set()
-        
-    to_add = []
-    duplicates = 0
-    
-    for _, row in new_df.iterrows():
-        h = get_hash(row)
-        if h not in current_hashes:
-            to_add.append(row)
-            current_hashes.add(h) # Previne duplicação dentro do próprio arquivo
-        else:
-            duplicates += 1
+    # Usar fingerprint de conteúdo (date, title, amount, owner) para deduplicação robusta
+    new_rows_df, duplicates, indexed = _dedup_new_rows(
+        current_df, new_df, TRANSACTION_KEY_COLUMNS, gsheets.BASE_FINANCEIRA_ID, id_column='id')
             
-    if to_add:
+    if not new_rows_df.empty:
         # Se os itens a adicionar não tiverem UUID gerado ainda
-        new_rows_df = pd.DataFrame(to_add)
+        new_rows_df = new_rows_df.copy()
         if 'id' not in new_rows_df.columns:
             new_rows_df['id'] = [str(uuid.uuid4()) for _ in range(len(new_rows_df))]
             
         combined = pd.concat([current_df, new_rows_df], ignore_index=True)
-        save_data(combined)
+        save_data(combined, on_saved=_index_added_rows(indexed, new_rows_df['id']))
         return combined, duplicates
         
     return current_df, duplicates
@@ -980,33 +1392,13 @@ def merge_and_save_income(current_income, new_income):
     """Mescla novos dados de RECEITAS com os atuais."""
     if new_income.empty: return current_income, 0
 
-    # Gerar ID temporário para deduplicação (hash de campos chave)
-    def get_hash(row):
-        # Hash inclui reference_date se existir, senão usa date como proxy
-        ref = str(row.get('reference_date', ''))
-        return hash((str(row['date']), str(row['source']), str(row['amount']), str(row['owner']), ref))
-    
-    if not current_income.empty:
-        current_hashes = set(current_income.apply(get_hash, axis=1))
-    else:
-        current_hashes = set()
-        
-    # Filtrar novas
-    to_add = []
-    duplicates = 0
-    
-    for _, row in new_income.iterrows():
-        h = get_hash(row)
-        if h not in current_hashes:
-            to_add.append(row)
-            current_hashes.add(h) # Evitar duplicar no próprio lote
-        else:
-            duplicates += 1
+    # Fingerprint inclui reference_date (vazio se não existir)
+    new_rows_df, duplicates, indexed = _dedup_new_rows(
+        current_income, new_income, INCOME_KEY_COLUMNS, gsheets.RECEITAS_ID)
             
-    if to_add:
-        new_rows_df = pd.DataFrame(to_add)
+    if not new_rows_df.empty:
         combined = pd.concat([current_income, new_rows_df], ignore_index=True)
-        save_income_data(combined)
+        save_income_data(combined, on_saved=_index_added_rows(indexed))
         return combined, duplicates
         
     return current_income, duplicates
@@ -1054,3 +1446,15 @@ def load_ml_history_cached():
     except Exception as e:
         print(f"Erro ao carregar memória do Mágico (utils): {e}")
         return pd.DataFrame()
+
+
+def _refresh_ml_history(spreadsheet_id, count):
+    """
+    Novos exemplos gravados (wizard, edição em massa): descarta o histórico em
+    cache para o próximo get_learned_patterns incorporá-los (ajuste incremental).
+    """
+    if spreadsheet_id == gsheets.CLASSIFICATION_ID:
+        load_ml_history_cached.clear()
+
+
+gsheets.add_classification_listener(_refresh_ml_history)
@@ -0,0 +1,349 @@
+"""
+Fila de escrita em segundo plano (write-behind) para o Google Sheets.
+
+A UI grava o DataFrame no session_state e chama `enqueue`: o DataFrame vai para
+um journal local (Parquet em .cache/journal) e uma thread worker envia para a
+planilha com retry. Uma gravação nova na mesma aba SUBSTITUI a anterior que
+ainda não foi enviada (só o último estado importa).
+
+Cada fila tem o seu subdiretório no journal, travado (lock de arquivo) enquanto
+o processo vive. Ao iniciar, uma fila só reenvia os journals ÓRFÃOS (de
+processos que caíram antes do envio); os de processos vivos não são tocados.
+Gravações que falham `max_attempts` vezes seguidas saem da fila e o journal
+vai para .cache/journal/failed, para não travar as demais abas.
+"""
+import os
+import json
+import shutil
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+import local_mirror
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "journal")
+FAILED_SUBDIR = "failed"
+MAX_ATTEMPTS = 8
+
+
+def _lock_file(path, wait=False):
+    """
+    Abre e trava `path` com lock exclusivo (liberado pelo SO se o processo cair).
+    Retorna o arquivo aberto, ou None se outro dono já detém o lock.
+    """
+    f = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class WriteBehindQueue:
+    """
+    Fila de gravações coalescidas por aba (spreadsheet_id, sheet_index).
+    - writer(df, spreadsheet_id, sheet_index): função que grava de fato.
+    - Falhas são re-tentadas com backoff exponencial POR ABA (retry_delay, 2x,
+      ... até max_delay); enquanto uma aba espera, as outras continuam sendo
+      enviadas. Depois de `max_attempts` falhas seguidas a gravação é descartada
+      da fila (journal guardado em failed/ e listada em status()["failed"]).
+    - on_failure(spreadsheet_id, sheet_index, error): chamada a cada envio que
+      falha (ex: para descartar caches que supunham a gravação feita).
+    - enqueue(..., on_success=f): f() é chamada (na thread da fila) depois que
+      AQUELA gravação chegou à planilha; se ela for substituída por uma mais
+      nova antes do envio, ou descartada, f nunca é chamada.
+    """
+
+    def __init__(self, writer, journal_dir=JOURNAL_DIR, retry_delay=5.0, max_delay=60.0, on_failure=None,
+                 max_attempts=MAX_ATTEMPTS):
+        self.writer = writer
+        self.on_failure = on_failure
+        self.journal_dir = journal_dir
+        self.retry_delay = retry_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        # (spreadsheet_id, sheet_index) -> {"seq", "df", "enqueued_at", "attempts", "next_try"}
+        self._pending = {}
+        self._failed = {}      # (spreadsheet_id, sheet_index) -> último erro
+        self._seq = 0
+        self._in_flight = None
+        self._last_flush = None
+        self._last_error = None
+        self._flushed = 0
+        self._cond = threading.Condition()
+        # Serializa o I/O do journal (nunca adquirido com _cond já preso)
+        self._journal_lock = threading.Lock()
+        self._thread = None
+        self._owner_dir = None
+        self._owner_lock = None
+        self._claim_journal()
+
+    # --- journal ---------------------------------------------------------
+
+    def _journal_paths(self, key, directory=None):
+        name = f"{key[0]}__{key[1]}"
+        directory = directory or self._owner_dir
+        return (
+            os.path.join(directory, f"{name}.parquet"),
+            os.path.join(directory, f"{name}.json"),
+        )
+
+    def _claim_journal(self):
+        """Cria e trava o subdiretório desta fila e adota os journals órfãos."""
+        try:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            owner_dir = os.path.join(self.journal_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+            os.makedirs(owner_dir)
+            self._owner_lock = _lock_file(os.path.join(owner_dir, "owner.lock"))
+            self._owner_dir = owner_dir
+        except OSError as e:
+            print(f"Aviso: journal da fila de escrita indisponível (gravações só em memória): {e}")
+            return
+        self._replay_orphans()
+
+    def _replay_orphans(self):
+        """Recarrega gravações de processos encerrados que não chegaram à planilha."""
+        adopt_lock = _lock_file(os.path.join(self.journal_dir, "adopt.lock"), wait=True)
+        try:
+            for name in sorted(os.listdir(self.journal_dir)):
+                path = os.path.join(self.journal_dir, name)
+                if path == self._owner_dir or name == FAILED_SUBDIR or not os.path.isdir(path):
+                    continue
+                owner_lock = _lock_file(os.path.join(path, "owner.lock"))
+                if owner_lock is None:
+                    continue  # dono vivo
+                try:
+                    self._adopt_entries(path)
+                finally:
+                    owner_lock.close()
+                shutil.rmtree(path, ignore_errors=True)
+            # Journal no formato antigo (arquivos soltos na raiz, sem dono)
+            self._adopt_entries(self.journal_dir)
+            for name in os.listdir(self.journal_dir):
+                if name.endswith((".json", ".parquet")):
+                    os.remove(os.path.join(self.journal_dir, name))
+        except OSError as e:
+            print(f"Aviso: não foi possível ler o journal da fila de escrita: {e}")
+        finally:
+            if adopt_lock is not None:
+                adopt_lock.close()
+        if self._pending:
+            print(f"Reenviando {len(self._pending)} gravação(ões) pendente(s) do journal.")
+            self._ensure_worker()
+
+    def _adopt_entries(self, directory):
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                key = (meta["spreadsheet_id"], int(meta["sheet_index"]))
+                df = pd.read_parquet(self._journal_paths(key, directory)[0])
+            except Exception as e:
+                print(f"Aviso: journal '{name}' ilegível, ignorando: {e}")
+                continue
+            self._seq += 1
+            self._pending[key] = self._entry(self._seq, df)
+            # Passa a ser desta fila antes de o diretório órfão ser apagado
+            self._journal_write(key, self._seq, df)
+
+    def _journal_write(self, key, seq, df):
+        if self._owner_dir is None:
+            return
+        parquet_path, meta_path = self._journal_paths(key)
+        with self._journal_lock:
+            with self._cond:
+                current = self._pending.get(key)
+                if current is None or current["seq"] != seq:
+                    return  # já enviada ou substituída por uma mais nova
+            try:
+                local_mirror._arrow_safe(df).to_parquet(parquet_path + ".tmp", index=False)
+                with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump({"spreadsheet_id": key[0], "sheet_index": key[1], "seq": seq}, f)
+                os.replace(parquet_path + ".tmp", parquet_path)
+                os.replace(meta_path + ".tmp", meta_path)
+            except Exception as e:
+                print(f"Aviso: não foi possível gravar o journal de '{key[0]}': {e}")
+
+    def _journal_remove(self, key, seq, failed_error=None):
+        """Apaga o journal da aba (ou move para failed/), se não chegou gravação mais nova que `seq`."""
+        if self._owner_dir is None:
+            return
+        with self._journal_lock:
+            with self._cond:
+                current = self._pending.get(key)
+                if current is not None and current["seq"] != seq:
+                    return
+            paths = self._journal_paths(key)
+            try:
+                if failed_error is not None:
+                    failed_dir = os.path.join(self.journal_dir, FAILED_SUBDIR)
+                    os.makedirs(failed_dir, exist_ok=True)
+                    failed_paths = self._journal_paths(key, failed_dir)
+                    os.replace(paths[0], failed_paths[0])
+                    with open(failed_paths[1], "w", encoding="utf-8") as f:
+                        json.dump({"spreadsheet_id": key[0], "sheet_index": key[1],
+                                   "error": str(failed_error), "failed_at": time.time()}, f)
+            except OSError as e:
+                print(f"Aviso: não foi possível guardar o journal de '{key[0]}' em {FAILED_SUBDIR}/: {e}")
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # --- API -------------------------------------------------------------
+
+    @staticmethod
+    def _entry(seq, df, on_success=None):
+        return {"seq": seq, "df": df, "enqueued_at": time.time(), "attempts": 0, "next_try": 0.0,
+                "on_success": on_success}
+
+    def enqueue(self, df, spreadsheet_id, sheet_index=0, on_success=None):
+        """
+        Agenda a gravação (substitui a pendente da mesma aba). Retorna assim que
+        o journal foi gravado; o lock da fila não fica preso durante o I/O.
+        on_success: chamada sem argumentos depois que esta gravação for enviada.
+        """
+        key = (spreadsheet_id, sheet_index)
+        df = df.copy()
+        with self._cond:
+            self._seq += 1
+            seq = self._seq
+            self._pending[key] = self._entry(seq, df, on_success)
+            self._failed.pop(key, None)
+            self._cond.notify_all()
+        self._journal_write(key, seq, df)
+        self._ensure_worker()
+
+    def pending(self, spreadsheet_id, sheet_index=0):
+        """DataFrame ainda não enviado para a aba (leitura das próprias escritas) ou None."""
+        with self._cond:
+            entry = self._pending.get((spreadsheet_id, sheet_index))
+            return entry["df"].copy() if entry is not None else None
+
+    def status(self):
+        """Resumo para a UI: pendentes, enviando agora, último envio, último erro e descartadas."""
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "in_flight": self._in_flight is not None,
+                "flushed": self._flushed,
+                "last_flush": self._last_flush,
+                "last_error": self._last_error,
+                "failed": sorted(key[0] for key in self._failed),
+            }
+
+    def flush(self, timeout=None):
+        """
+        Espera a fila esvaziar (gravações enviadas ou descartadas após
+        max_attempts). Retorna True se esvaziou dentro do timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """Libera o journal desta fila (apagado se não restou nada pendente)."""
+        with self._cond:
+            empty = not self._pending
+        if self._owner_lock is not None:
+            self._owner_lock.close()
+            self._owner_lock = None
+        if empty and self._owner_dir is not None:
+            shutil.rmtree(self._owner_dir, ignore_errors=True)
+
+    # --- worker ----------------------------------------------------------
+
+    def _ensure_worker(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="gsheets-write-behind", daemon=True)
+                self._thread.start()
+
+    def _next_ready(self):
+        """(key, entry) mais antiga cujo backoff já passou; espera (com _cond preso) se não houver."""
+        while True:
+            now = time.monotonic()
+            ready = [(entry["seq"], key) for key, entry in self._pending.items() if entry["next_try"] <= now]
+            if ready:
+                key = min(ready)[1]
+                return key, self._pending[key]
+            wait = min((entry["next_try"] for entry in self._pending.values()), default=None)
+            self._cond.wait(None if wait is None else wait - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                key, entry = self._next_ready()
+                self._in_flight = key
+            try:
+                self.writer(entry["df"], key[0], key[1])
+            except Exception as e:
+                self._handle_failure(key, entry, e)
+                continue
+            # Journal apagado e on_success chamado antes de a aba sair da fila:
+            # flush() só retorna depois
+            self._journal_remove(key, entry["seq"])
+            if entry["on_success"] is not None:
+                try:
+                    entry["on_success"]()
+                except Exception as cb_error:
+                    print(f"Aviso: on_success da gravação de '{key[0]}' falhou: {cb_error}")
+            with self._cond:
+                self._in_flight = None
+                self._flushed += 1
+                self._last_flush = time.time()
+                self._last_error = None
+                # Só remove se não chegou uma gravação mais nova enquanto enviávamos
+                if self._pending.get(key) is entry:
+                    del self._pending[key]
+                self._cond.notify_all()
+
+    def _handle_failure(self, key, entry, error):
+        """Agenda a nova tentativa da aba (backoff) ou desiste após max_attempts."""
+        with self._cond:
+            # Se chegou uma gravação mais nova, ela recomeça a contagem
+            current = self._pending.get(key) is entry
+            if current:
+                entry["attempts"] += 1
+            gave_up = current and entry["attempts"] >= self.max_attempts
+        if gave_up:
+            print(f"Erro ao gravar '{key[0]}' em segundo plano: desistindo após "
+                  f"{self.max_attempts} tentativas: {error}")
+            self._journal_remove(key, entry["seq"], failed_error=error)
+        with self._cond:
+            self._in_flight = None
+            self._last_error = f"{key[0]}: {error}"
+            if gave_up and self._pending.get(key) is entry:
+                del self._pending[key]
+                self._failed[key] = str(error)
+            elif current and not gave_up:
+                delay = min(self.retry_delay * 2 ** (entry["attempts"] - 1), self.max_delay)
+                entry["next_try"] = time.monotonic() + delay
+                print(f"Erro ao gravar '{key[0]}' em segundo plano (nova tentativa em {delay:.0f}s): {error}")
+            self._cond.notify_all()
+        if self.on_failure is not None:
+            try:
+                self.on_failure(key[0], key[1], error)
+            except Exception as cb_error:
+                print(f"Aviso: on_failure da fila falhou: {cb_error}")